@@ -31,6 +31,7 @@ __version__ = '2.0'
 #  annToMask  - Convert segmentation in an annotation to binary mask.
 #  showAnns   - Display the specified annotations.
 #  loadRes    - Load algorithm results and create API for accessing them.
+#  loadResArrays - Load bbox results given as arrays, without json or dicts.
 #  download   - Download COCO images from mscoco.org server.
 # Throughout the API "ann"=annotation, "cat"=category, and "img"=image.
 # Help on each functions can be accessed by: "help COCO>function".
@@ -78,6 +79,8 @@ class COCO:
         self.dataset, self.anns, self.cats, self.imgs = dict(), dict(), dict(
         ), dict()
         self.imgToAnns, self.catToImgs = defaultdict(list), defaultdict(list)
+        # columnar detections of loadResArrays
+        self.resArrays = None
         if annotation_file is not None:
             print('loading annotations into memory...')
             tic = time.time()
@@ -433,6 +436,13 @@ class COCO:
         res.createIndex()
         return res
 
+    def loadResArrays(self, imageIds, categoryIds, bboxes, scores):
+        """
+        Load bbox results given as arrays and return a result api object,
+        see loadResArrays of the module.
+        """
+        return loadResArrays(self, imageIds, categoryIds, bboxes, scores)
+
     def download(self, tarDir=None, imgIds=[]):
         '''
         Download COCO images from mscoco.org server.
@@ -517,3 +527,64 @@ class COCO:
         return m
 
     ann_to_mask = annToMask
+
+
+def makeResArrays(cocoGt, imageIds, categoryIds, bboxes, scores):
+    """
+    Check bbox results given as arrays and complete them with the columns
+    read by COCOeval. The ids of the detections follow their order as in
+    loadRes. Only cocoGt.getImgIds is used, so cocoGt may be any COCO api
+    object, e.g. of pycocotools.
+    :param   cocoGt (obj)            : api object of the ground truth
+    :param   imageIds (int array)    : image id of each detection [N]
+    :param   categoryIds (int array) : category id of each detection [N]
+    :param   bboxes (float array)    : [x, y, w, h] of each detection [Nx4]
+    :param   scores (float array)    : score of each detection [N]
+    :return: resArrays (dict)        : columns of the detections
+    """
+    imageIds = np.asarray(imageIds, dtype=np.int64).reshape(-1)
+    categoryIds = np.asarray(categoryIds, dtype=np.int64).reshape(-1)
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+    N = len(imageIds)
+    assert len(categoryIds) == N and len(bboxes) == N and \
+        len(scores) == N, 'results of different lengths'
+    assert np.isin(imageIds, cocoGt.getImgIds()).all(), \
+           'Results do not correspond to current coco set'
+    return {
+        'image_id': imageIds,
+        'category_id': categoryIds,
+        'bbox': bboxes,
+        'score': scores,
+        'area': bboxes[:, 2] * bboxes[:, 3],
+        'id': np.arange(1, N + 1),
+    }
+
+
+def loadResArrays(cocoGt, imageIds, categoryIds, bboxes, scores):
+    """
+    Load bbox results given as arrays and return a result api object.
+    No annotation is created per detection, the arrays are kept in
+    res.resArrays and evaluated as such by COCOeval. Only the images and
+    categories of cocoGt are used, so cocoGt may be any COCO api object,
+    e.g. of pycocotools.
+    :param   cocoGt (obj)            : api object of the ground truth
+    :param   imageIds (int array)    : image id of each detection [N]
+    :param   categoryIds (int array) : category id of each detection [N]
+    :param   bboxes (float array)    : [x, y, w, h] of each detection [Nx4]
+    :param   scores (float array)    : score of each detection [N]
+    :return: res (obj)               : result api object
+    """
+    res = COCO()
+    res.dataset['images'] = [img for img in cocoGt.dataset['images']]
+    res.dataset['categories'] = copy.deepcopy(cocoGt.dataset['categories'])
+    res.dataset['annotations'] = []
+
+    print('Loading and preparing results...')
+    tic = time.time()
+    res.resArrays = makeResArrays(cocoGt, imageIds, categoryIds, bboxes,
+                                  scores)
+    print('DONE (t={:0.2f}s)'.format(time.time() - tic))
+
+    res.createIndex()
+    return res
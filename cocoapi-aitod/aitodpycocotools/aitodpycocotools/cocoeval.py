@@ -4,6 +4,7 @@ import copy
 import datetime
 import time
 from collections import defaultdict
+from multiprocessing import Pool
 
 import numpy as np
 
@@ -96,14 +97,18 @@ class COCOeval:
                 ann['segmentation'] = rle
 
         p = self.params
+        useArrays = getattr(self.cocoDt, 'resArrays', None) is not None
+        if useArrays and p.iouType != 'bbox':
+            raise Exception('columnar results only support bbox evaluation')
         if p.useCats:
             gts = self.cocoGt.loadAnns(
                 self.cocoGt.getAnnIds(imgIds=p.imgIds, catIds=p.catIds))
-            dts = self.cocoDt.loadAnns(
+            dts = [] if useArrays else self.cocoDt.loadAnns(
                 self.cocoDt.getAnnIds(imgIds=p.imgIds, catIds=p.catIds))
         else:
             gts = self.cocoGt.loadAnns(self.cocoGt.getAnnIds(imgIds=p.imgIds))
-            dts = self.cocoDt.loadAnns(self.cocoDt.getAnnIds(imgIds=p.imgIds))
+            dts = [] if useArrays else self.cocoDt.loadAnns(
+                self.cocoDt.getAnnIds(imgIds=p.imgIds))
 
         # convert ground truth to mask if iouType == 'segm'
         if p.iouType == 'segm':
@@ -121,14 +126,63 @@ class COCOeval:
             self._gts[gt['image_id'], gt['category_id']].append(gt)
         for dt in dts:
             self._dts[dt['image_id'], dt['category_id']].append(dt)
+        if useArrays:
+            self._dts.update(self._groupResArrays())
         self.evalImgs = defaultdict(
             list)  # per-image per-category evaluation results
         self.eval = {}  # accumulated evaluation results
 
-    def evaluate(self):
+    def _groupResArrays(self):
+        '''
+        group the columnar results of cocoDt.resArrays by image and category
+        without creating a dict per detection
+        :return: dict of DtColumns keyed by (imgId, catId)
+        '''
+        p = self.params
+        res = self.cocoDt.resArrays
+        keep = np.isin(res['image_id'], p.imgIds)
+        if p.useCats:
+            keep &= np.isin(res['category_id'], p.catIds)
+        inds = np.flatnonzero(keep)
+        # a stable sort keeps the dts of a group in the order of loadRes
+        inds = inds[np.lexsort(
+            (res['category_id'][inds], res['image_id'][inds]))]
+        imgIds = res['image_id'][inds]
+        catIds = res['category_id'][inds]
+        columns = {key: res[key][inds] for key in DtColumns.keys}
+        isStart = np.ones(len(inds), dtype=bool)
+        isStart[1:] = (imgIds[1:] != imgIds[:-1]) | (catIds[1:] != catIds[:-1])
+        starts = np.flatnonzero(isStart)
+        ends = np.append(starts[1:], len(inds))
+        dts = {}
+        for start, end, imgId, catId in zip(starts.tolist(), ends.tolist(),
+                                            imgIds[starts].tolist(),
+                                            catIds[starts].tolist()):
+            dts[imgId, catId] = DtColumns(
+                {key: col[start:end]
+                 for key, col in columns.items()})
+        return dts
+
+    def _loadDts(self, imgId, catId):
+        '''
+        dts of an image and category, of all the categories if not useCats
+        :return: list of dicts or DtColumns
+        '''
+        p = self.params
+        if p.useCats:
+            return self._dts[imgId, catId]
+        dts = [self._dts[imgId, cId] for cId in p.catIds]
+        columns = [dt for dt in dts if isinstance(dt, DtColumns)]
+        if columns:
+            return DtColumns.concatenate(columns)
+        return [_ for dt in dts for _ in dt]
+
+    def evaluate(self, num_workers=1):
         '''
         Run per image evaluation on given images and store results
          (a list of dict) in self.evalImgs
+        :param num_workers: number of processes, the images are split into
+         shards evaluated in parallel if more than 1
         :return: None
         '''
         tic = time.time()
@@ -147,6 +201,21 @@ class COCOeval:
         self.params = p
 
         self._prepare()
+        if num_workers > 1 and len(p.imgIds) > 1:
+            self.ious, self.evalImgs = self._evaluateParallel(num_workers)
+        else:
+            self.ious, self.evalImgs = self._evaluateImgs()
+        self._paramsEval = copy.deepcopy(self.params)
+        toc = time.time()
+        print('DONE (t={:0.2f}s).'.format(toc - tic))
+
+    def _evaluateImgs(self):
+        '''
+        compute the ious and evaluate every image of params.imgIds
+        :return: ious (dict) and evalImgs (list ordered by category, area
+         range and image)
+        '''
+        p = self.params
         # loop through images, area range, max detection number
         catIds = p.catIds if p.useCats else [-1]
 
@@ -159,35 +228,82 @@ class COCOeval:
 
         evaluateImg = self.evaluateImg
         maxDet = p.maxDets[-1]
-        self.evalImgs = [
+        evalImgs = [
             evaluateImg(imgId, catId, areaRng, maxDet) for catId in catIds
             for areaRng in p.areaRng for imgId in p.imgIds
         ]
-        self._paramsEval = copy.deepcopy(self.params)
-        toc = time.time()
-        print('DONE (t={:0.2f}s).'.format(toc - tic))
+        return self.ious, evalImgs
+
+    def _evaluateParallel(self, num_workers):
+        '''
+        evaluate contiguous shards of params.imgIds in a process pool, each
+        worker only receives the gts and dts of its images
+        :return: ious and evalImgs merged as in _evaluateImgs
+        '''
+        p = self.params
+        # a few shards per worker to balance the images of different sizes
+        numShards = min(len(p.imgIds), num_workers * 4)
+        bounds = np.linspace(0, len(p.imgIds), numShards + 1).astype(int)
+        shardImgIds = [
+            p.imgIds[start:end] for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        shardOfImg = {
+            imgId: s
+            for s, imgIds in enumerate(shardImgIds) for imgId in imgIds
+        }
+        shardGts = [defaultdict(list) for _ in range(numShards)]
+        shardDts = [defaultdict(list) for _ in range(numShards)]
+        for anns, shards in ((self._gts, shardGts), (self._dts, shardDts)):
+            for (imgId, catId), imgAnns in anns.items():
+                if imgId in shardOfImg:
+                    shards[shardOfImg[imgId]][imgId, catId] = imgAnns
+        shardArgs = []
+        for imgIds, gts, dts in zip(shardImgIds, shardGts, shardDts):
+            params = copy.copy(p)
+            params.imgIds = imgIds
+            shardArgs.append((params, gts, dts))
+        with Pool(min(num_workers, numShards)) as pool:
+            results = pool.starmap(_evaluateShard, shardArgs)
+
+        ious = {}
+        for shardIous, _ in results:
+            ious.update(shardIous)
+        # evalImgs are ordered by category, area range then image
+        catIds = p.catIds if p.useCats else [-1]
+        evalImgs = []
+        for n in range(len(catIds) * len(p.areaRng)):
+            for imgIds, (_, shardEvalImgs) in zip(shardImgIds, results):
+                numImgs = len(imgIds)
+                evalImgs.extend(shardEvalImgs[n * numImgs:(n + 1) * numImgs])
+        return ious, evalImgs
 
     def computeIoU(self, imgId, catId):
         p = self.params
         if p.useCats:
             gt = self._gts[imgId, catId]
-            dt = self._dts[imgId, catId]
         else:
             gt = [_ for cId in p.catIds for _ in self._gts[imgId, cId]]
-            dt = [_ for cId in p.catIds for _ in self._dts[imgId, cId]]
+        dt = self._loadDts(imgId, catId)
         if len(gt) == 0 and len(dt) == 0:
             return []
-        inds = np.argsort([-d['score'] for d in dt], kind='mergesort')
-        dt = [dt[i] for i in inds]
-        if len(dt) > p.maxDets[-1]:
-            dt = dt[0:p.maxDets[-1]]
+        if isinstance(dt, DtColumns):
+            inds = np.argsort(-dt['score'], kind='mergesort')
+            dt = dt.take(inds[0:p.maxDets[-1]])
+        else:
+            inds = np.argsort([-d['score'] for d in dt], kind='mergesort')
+            dt = [dt[i] for i in inds]
+            if len(dt) > p.maxDets[-1]:
+                dt = dt[0:p.maxDets[-1]]
 
         if p.iouType == 'segm':
             g = [g['segmentation'] for g in gt]
             d = [d['segmentation'] for d in dt]
         elif p.iouType == 'bbox':
             g = [g['bbox'] for g in gt]
-            d = [d['bbox'] for d in dt]
+            if isinstance(dt, DtColumns):
+                d = dt['bbox']
+            else:
+                d = [d['bbox'] for d in dt]
         else:
             raise Exception('unknown iouType for iou computation')
 
@@ -255,10 +371,9 @@ class COCOeval:
         p = self.params
         if p.useCats:
             gt = self._gts[imgId, catId]
-            dt = self._dts[imgId, catId]
         else:
             gt = [_ for cId in p.catIds for _ in self._gts[imgId, cId]]
-            dt = [_ for cId in p.catIds for _ in self._dts[imgId, cId]]
+        dt = self._loadDts(imgId, catId)
         if len(gt) == 0 and len(dt) == 0:
             return None
 
@@ -271,28 +386,73 @@ class COCOeval:
         # sort dt highest score first, sort gt ignore last
         gtind = np.argsort([g['_ignore'] for g in gt], kind='mergesort')
         gt = [gt[i] for i in gtind]
-        dtind = np.argsort([-d['score'] for d in dt], kind='mergesort')
-        dt = [dt[i] for i in dtind[0:maxDet]]
+        if isinstance(dt, DtColumns):
+            dtind = np.argsort(-dt['score'], kind='mergesort')
+            dt = dt.take(dtind[0:maxDet])
+            dtIds = dt['id'].tolist()
+            dtScores = dt['score'].tolist()
+            dtArea = dt['area']
+        else:
+            dtind = np.argsort([-d['score'] for d in dt], kind='mergesort')
+            dt = [dt[i] for i in dtind[0:maxDet]]
+            dtIds = [d['id'] for d in dt]
+            dtScores = [d['score'] for d in dt]
+            dtArea = np.array([d['area'] for d in dt])
         iscrowd = [int(o['iscrowd']) for o in gt]
         # load computed ious
         ious = self.ious[imgId, catId][:, gtind] if len(
             self.ious[imgId, catId]) > 0 else self.ious[imgId, catId]
 
         T = len(p.iouThrs)
-        G = len(gt)
-        D = len(dt)
+        gtIg = np.array([g['_ignore'] for g in gt])
+        gtIds = [g['id'] for g in gt]
+        if p.useFastMatch:
+            gtm, dtm, dtIg, dtIoU = self._matchGreedy(ious, gtIg, iscrowd,
+                                                      gtIds, dtIds)
+        else:
+            gtm, dtm, dtIg, dtIoU = self._matchGreedyLoop(
+                ious, gtIg, iscrowd, gtIds, dtIds)
+        # set unmatched detections outside of area range to ignore
+        a = ((dtArea < aRng[0]) | (dtArea > aRng[1])).reshape((1, len(dt)))
+        dtIg = np.logical_or(dtIg, np.logical_and(dtm == 0, np.repeat(a, T,
+                                                                      0)))
+        # store results for given image and category
+        return {
+            'image_id': imgId,
+            'category_id': catId,
+            'aRng': aRng,
+            'maxDet': maxDet,
+            'dtIds': dtIds,
+            'gtIds': gtIds,
+            'dtMatches': dtm,
+            'gtMatches': gtm,
+            'dtScores': dtScores,
+            'gtIgnore': gtIg,
+            'dtIgnore': dtIg,
+            'dtIoUs': dtIoU,
+        }
+
+    def _matchGreedyLoop(self, ious, gtIg, iscrowd, gtIds, dtIds):
+        '''
+        greedily match the dts (sorted by score) to the gts (sorted
+        ignore last) at each IoU threshold, reference implementation
+        :return: gtm [TxG], dtm [TxD], dtIg [TxD] and dtIoU [TxD]
+        '''
+        p = self.params
+        T = len(p.iouThrs)
+        G = len(gtIds)
+        D = len(dtIds)
         gtm = np.zeros((T, G))
         dtm = np.zeros((T, D))
-        gtIg = np.array([g['_ignore'] for g in gt])
         dtIg = np.zeros((T, D))
         dtIoU = np.zeros((T, D))
         if not len(ious) == 0:
             for tind, t in enumerate(p.iouThrs):
-                for dind, d in enumerate(dt):
+                for dind in range(D):
                     # information about best match so far (m=-1 -> unmatched)
                     iou = min([t, 1 - 1e-10])
                     m = -1
-                    for gind, g in enumerate(gt):
+                    for gind in range(G):
                         # if this gt already matched, and not a crowd, continue
                         if gtm[tind, gind] > 0 and not iscrowd[gind]:
                             continue
@@ -310,29 +470,60 @@ class COCOeval:
                     if m == -1:
                         continue
                     dtIg[tind, dind] = gtIg[m]
-                    dtm[tind, dind] = gt[m]['id']
-                    gtm[tind, m] = d['id']
+                    dtm[tind, dind] = gtIds[m]
+                    gtm[tind, m] = dtIds[dind]
                     dtIoU[tind, dind] = iou
-        # set unmatched detections outside of area range to ignore
-        a = np.array([d['area'] < aRng[0] or d['area'] > aRng[1]
-                      for d in dt]).reshape((1, len(dt)))
-        dtIg = np.logical_or(dtIg, np.logical_and(dtm == 0, np.repeat(a, T,
-                                                                      0)))
-        # store results for given image and category
-        return {
-            'image_id': imgId,
-            'category_id': catId,
-            'aRng': aRng,
-            'maxDet': maxDet,
-            'dtIds': [d['id'] for d in dt],
-            'gtIds': [g['id'] for g in gt],
-            'dtMatches': dtm,
-            'gtMatches': gtm,
-            'dtScores': [d['score'] for d in dt],
-            'gtIgnore': gtIg,
-            'dtIgnore': dtIg,
-            'dtIoUs': dtIoU,
-        }
+        return gtm, dtm, dtIg, dtIoU
+
+    def _matchGreedy(self, ious, gtIg, iscrowd, gtIds, dtIds):
+        '''
+        same matching as _matchGreedyLoop with all the IoU thresholds at
+        once, only the dts with an IoU above the lowest threshold are visited
+        :return: gtm [TxG], dtm [TxD], dtIg [TxD] and dtIoU [TxD]
+        '''
+        p = self.params
+        thrs = np.minimum(p.iouThrs, 1 - 1e-10)
+        T = len(thrs)
+        G = len(gtIds)
+        D = len(dtIds)
+        gtm = np.zeros((T, G))
+        dtm = np.zeros((T, D))
+        dtIg = np.zeros((T, D))
+        dtIoU = np.zeros((T, D))
+        if len(ious) == 0:
+            return gtm, dtm, dtIg, dtIoU
+        # the (dt, gt) pairs above the lowest threshold, grouped by dt
+        dinds, ginds = np.nonzero(ious >= thrs.min())
+        if len(dinds) == 0:
+            return gtm, dtm, dtIg, dtIoU
+        gtIds = np.asarray(gtIds)
+        pairIoU = ious[dinds, ginds]
+        pairAbove = pairIoU >= thrs[:, None]
+        pairReg = gtIg[ginds] == 0
+        pairCrowd = np.asarray(iscrowd, dtype=bool)[ginds]
+        bounds = np.flatnonzero(np.diff(dinds)) + 1
+        starts = [0] + bounds.tolist()
+        ends = bounds.tolist() + [len(dinds)]
+        for start, end in zip(starts, ends):
+            dind = dinds[start]
+            g = ginds[start:end]
+            # gts above the threshold, not matched yet or crowd
+            valid = pairAbove[:, start:end] & (
+                (gtm[:, g] <= 0) | pairCrowd[start:end])
+            # the ignored gts only if no regular gt is valid
+            reg = valid & pairReg[start:end]
+            valid = np.where(reg.any(axis=1, keepdims=True), reg, valid)
+            # the last gt of the best IoU as in the loop
+            best = np.where(valid, pairIoU[start:end], -1)
+            best = end - start - 1 - best[:, ::-1].argmax(axis=1)
+            tinds = np.flatnonzero(valid.any(axis=1))
+            best = best[tinds]
+            m = g[best]
+            dtIg[tinds, dind] = gtIg[m]
+            dtm[tinds, dind] = gtIds[m]
+            gtm[tinds, m] = dtIds[dind]
+            dtIoU[tinds, dind] = pairIoU[start + best]
+        return gtm, dtm, dtIg, dtIoU
 
     def accumulate(self, p=None, with_lrp=True):
         '''
@@ -349,6 +540,169 @@ class COCOeval:
         # allows input customized parameters
         if p is None:
             p = self.params
+        if p.useFastAccumulate:
+            self._accumulate(p, with_lrp)
+        else:
+            self._accumulateLoop(p, with_lrp)
+        toc = time.time()
+        print('DONE (t={:0.2f}s).'.format(toc - tic))
+
+    def _accumulate(self, p, with_lrp=True):
+        '''
+        same results as _accumulateLoop, the dts of a category and area range
+        are sorted once for all the maxDets and the precision envelope and
+        the recall thresholds are computed with numpy for all the IoU
+        thresholds at once
+        :return: None
+        '''
+        p.catIds = p.catIds if p.useCats == 1 else [-1]
+        T = len(p.iouThrs)
+        R = len(p.recThrs)
+        K = len(p.catIds) if p.useCats else 1
+        A = len(p.areaRng)
+        M = len(p.maxDets)
+        precision = -np.ones(
+            (T, R, K, A, M))  # -1 for the precision of absent categories
+        recall = -np.ones((T, K, A, M))
+        scores = -np.ones((T, R, K, A, M))
+        olrp_loc = -np.ones((K, A, M))
+        olrp_fp = -np.ones((K, A, M))
+        olrp_fn = -np.ones((K, A, M))
+        olrp = -np.ones((K, A, M))
+        lrp_opt_thr = -np.ones((K, A, M))
+
+        # create dictionary for future indexing
+        _pe = self._paramsEval
+        catIds = _pe.catIds if _pe.useCats else [-1]
+        setK = set(catIds)
+        setA = set(map(tuple, _pe.areaRng))
+        setM = set(_pe.maxDets)
+        setI = set(_pe.imgIds)
+        # get inds to evaluate
+        k_list = [n for n, k in enumerate(p.catIds) if k in setK]
+        m_list = [m for n, m in enumerate(p.maxDets) if m in setM]
+        a_list = [
+            n for n, a in enumerate(map(lambda x: tuple(x), p.areaRng))
+            if a in setA
+        ]
+        i_list = [n for n, i in enumerate(p.imgIds) if i in setI]
+        I0 = len(_pe.imgIds)
+        A0 = len(_pe.areaRng)
+        maxDetAll = max(m_list) if m_list else 0
+        # retrieve E at each category, area range, and max number of detections
+        for k, k0 in enumerate(k_list):
+            Nk = k0 * A0 * I0
+            for a, a0 in enumerate(a_list):
+                Na = a0 * I0
+                E = [self.evalImgs[Nk + Na + i] for i in i_list]
+                E = [e for e in E if e is not None]
+                if len(E) == 0:
+                    continue
+                gtIg = np.concatenate([e['gtIgnore'] for e in E])
+                npig = np.count_nonzero(gtIg == 0)
+                if npig == 0:
+                    continue
+                # mergesort is stable, the sorted dts of a lower maxDets are
+                # the sorted dts of all the maxDets filtered by their rank in
+                # their image
+                dtScores = np.concatenate(
+                    [e['dtScores'][0:maxDetAll] for e in E])
+                dtRanks = np.concatenate([
+                    np.arange(len(e['dtScores'][0:maxDetAll])) for e in E
+                ])
+                inds = np.argsort(-dtScores, kind='mergesort')
+                dtScoresAll = dtScores[inds]
+                dtRanks = dtRanks[inds]
+                dtm = np.concatenate(
+                    [e['dtMatches'][:, 0:maxDetAll] for e in E],
+                    axis=1)[:, inds]
+                dtIg = np.concatenate(
+                    [e['dtIgnore'][:, 0:maxDetAll] for e in E],
+                    axis=1)[:, inds]
+                tpsAll = np.logical_and(dtm, np.logical_not(dtIg))
+                fpsAll = np.logical_and(np.logical_not(dtm),
+                                        np.logical_not(dtIg))
+                # only the first IoU threshold is used by oLRP
+                dtIoUAll = np.concatenate(
+                    [e['dtIoUs'][0, 0:maxDetAll] for e in E])[inds]
+                dtIoUAll = np.multiply(dtIoUAll, tpsAll[0])
+
+                for m, maxDet in enumerate(m_list):
+                    if maxDet < maxDetAll:
+                        keep = dtRanks < maxDet
+                        dtScoresSorted = dtScoresAll[keep]
+                        tps = tpsAll[:, keep]
+                        fps = fpsAll[:, keep]
+                        dtIoU = dtIoUAll[keep]
+                    else:
+                        dtScoresSorted = dtScoresAll
+                        tps = tpsAll
+                        fps = fpsAll
+                        dtIoU = dtIoUAll
+
+                    tp_sum = np.cumsum(tps, axis=1, dtype=float)
+                    fp_sum = np.cumsum(fps, axis=1, dtype=float)
+                    nd = tp_sum.shape[1]
+                    rc = tp_sum / npig
+                    pr = tp_sum / (fp_sum + tp_sum + np.spacing(1))
+                    recall[:, k, a, m] = rc[:, -1] if nd else 0
+                    # precision envelope, the max precision at a higher recall
+                    pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+                    # the recall thresholds above the max recall get 0
+                    q = np.zeros((T, R))
+                    ss = np.zeros((T, R))
+                    for t in range(T):
+                        pinds = np.searchsorted(rc[t], p.recThrs, side='left')
+                        valid = pinds < nd
+                        q[t, valid] = pr[t, pinds[valid]]
+                        ss[t, valid] = dtScoresSorted[pinds[valid]]
+                    precision[:, :, k, a, m] = q
+                    scores[:, :, k, a, m] = ss
+
+                    if not with_lrp:
+                        continue
+                    # oLRP and Opt.Thr. Computation
+                    if nd == 0 or tp_sum[0, -1] == 0:
+                        # No detection or no TP
+                        olrp_loc[k, a, m] = np.nan
+                        olrp_fp[k, a, m] = np.nan
+                        olrp_fn[k, a, m] = 1.
+                        olrp[k, a, m] = 1.
+                        lrp_opt_thr[k, a, m] = np.nan
+                        continue
+                    tp_num = tp_sum[0]
+                    fp_num = fp_sum[0]
+                    fn_num = npig - tp_num
+                    total_loc = tp_num - np.cumsum(dtIoU)
+                    lrps = (total_loc / (1 - _pe.iouThrs[0]) + fp_num +
+                            fn_num) / (tp_num + fp_num + fn_num)
+                    opt_pos_idx = np.argmin(lrps)
+                    olrp[k, a, m] = lrps[opt_pos_idx]
+                    olrp_loc[k, a, m] = total_loc[opt_pos_idx] / \
+                        tp_num[opt_pos_idx]
+                    olrp_fp[k, a, m] = fp_num[opt_pos_idx] / \
+                        (tp_num[opt_pos_idx] + fp_num[opt_pos_idx])
+                    olrp_fn[k, a, m] = fn_num[opt_pos_idx] / npig
+                    lrp_opt_thr[k, a, m] = dtScoresSorted[opt_pos_idx]
+        self.eval = {
+            'params': p,
+            'counts': [T, R, K, A, M],
+            'date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'precision': precision,
+            'recall': recall,
+            'scores': scores,
+            'olrp_loc': olrp_loc,
+            'olrp_fp': olrp_fp,
+            'olrp_fn': olrp_fn,
+            'olrp': olrp,
+            'lrp_opt_thr': lrp_opt_thr,
+        }
+
+    def _accumulateLoop(self, p, with_lrp=True):
+        '''
+        reference implementation of accumulate
+        :return: None
+        '''
         p.catIds = p.catIds if p.useCats == 1 else [-1]
         T = len(p.iouThrs)
         R = len(p.recThrs)
@@ -419,8 +773,8 @@ class COCOeval:
                                          np.logical_not(dtIg))
 
                     dtIoU = np.multiply(dtIoU, tps)
-                    tp_sum = np.cumsum(tps, axis=1).astype(dtype=np.float)
-                    fp_sum = np.cumsum(fps, axis=1).astype(dtype=np.float)
+                    tp_sum = np.cumsum(tps, axis=1).astype(dtype=float)
+                    fp_sum = np.cumsum(fps, axis=1).astype(dtype=float)
                     for t, (tp, fp) in enumerate(zip(tp_sum, fp_sum)):
                         tp = np.array(tp)
                         fp = np.array(fp)
@@ -502,8 +856,6 @@ class COCOeval:
             'olrp': olrp,
             'lrp_opt_thr': lrp_opt_thr,
         }
-        toc = time.time()
-        print('DONE (t={:0.2f}s).'.format(toc - tic))
 
     def summarize(self):
         '''
@@ -668,6 +1020,51 @@ class COCOeval:
         self.summarize()
 
 
+def _evaluateShard(params, gts, dts):
+    '''
+    evaluate a shard of the images in a worker of COCOeval._evaluateParallel
+    :return: ious and evalImgs of the shard
+    '''
+    cocoEval = COCOeval(iouType=params.iouType)
+    cocoEval.params = params
+    cocoEval._gts = gts
+    cocoEval._dts = dts
+    return cocoEval._evaluateImgs()
+
+
+class DtColumns:
+    '''
+    detections of an image as columns instead of a list of dicts, built by
+    COCOeval._prepare from the results of COCO.loadResArrays
+    '''
+    keys = ('score', 'bbox', 'area', 'id')
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def take(self, inds):
+        '''
+        :return: DtColumns of the detections at inds
+        '''
+        return DtColumns({key: col[inds] for key, col in self.columns.items()})
+
+    @staticmethod
+    def concatenate(groups):
+        '''
+        :return: DtColumns of the detections of all the groups
+        '''
+        return DtColumns({
+            key: np.concatenate([group[key] for group in groups])
+            for key in DtColumns.keys
+        })
+
+
 class Params:
     '''
     Params for coco evaluation api
@@ -723,3 +1120,7 @@ class Params:
         self.iouType = iouType
         # useSegm is deprecated
         self.useSegm = None
+        # match the dts with numpy instead of the reference python loop
+        self.useFastMatch = 1
+        # accumulate with numpy instead of the reference python loop
+        self.useFastAccumulate = 1
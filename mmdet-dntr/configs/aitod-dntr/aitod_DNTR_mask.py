@@ -53,7 +53,9 @@ model = dict(
             type='AnchorGenerator',
             scales=[8],
             ratios=[0.5, 1.0, 2.0],
-            strides=[4, 8, 16, 32, 64]),
+            strides=[4, 8, 16, 32, 64],
+            # reuse the anchors and valid flags of the fixed input size
+            cache_size=4),
         bbox_coder=dict(
             type='DeltaXYWHBBoxCoder',
             target_means=[.0, .0, .0, .0],
@@ -198,7 +200,8 @@ model = dict(
                     add_gt_as_proposals=True),
                 pos_weight=-1,
                 debug=False)
-        ]),
+        ],
+        contrastive_loss=dict(impl='matrix')),
     test_cfg=dict(
         rpn=dict(
             nms_pre=3000,
@@ -18,12 +18,31 @@ def single_gpu_test(model,
                     data_loader,
                     show=False,
                     out_dir=None,
-                    show_score_thr=0.3):
+                    show_score_thr=0.3,
+                    evaluator=None):
+    """Test model with a single gpu.
+
+    Args:
+        model (nn.Module): Model to be tested.
+        data_loader (nn.Dataloader): Pytorch data loader.
+        show (bool): Whether to show the results.
+        out_dir (str, optional): Directory where painted images are saved.
+        show_score_thr (float): Score threshold of the painted bboxes.
+        evaluator (IncrementalCocoEvaluator, optional): If given, the results
+            of each batch are evaluated by it while the model runs on the
+            next ones, and only its per-image records are kept.
+
+    Returns:
+        list: The prediction results, or the records of ``evaluator``.
+    """
     model.eval()
     results = []
     dataset = data_loader.dataset
     PALETTE = getattr(dataset, 'PALETTE', None)
     prog_bar = mmcv.ProgressBar(len(dataset))
+    if evaluator is not None:
+        # the dataset indices of each batch
+        batch_inds = iter(data_loader.batch_sampler)
     for i, data in enumerate(data_loader):
         with torch.no_grad():
             result = model(return_loss=False, rescale=True, **data)
@@ -71,14 +90,23 @@ def single_gpu_test(model,
                 result[j]['ins_results'] = (bbox_results,
                                             encode_mask_results(mask_results))
 
-        results.extend(result)
+        if evaluator is not None:
+            evaluator.process(result, next(batch_inds))
+        else:
+            results.extend(result)
 
         for _ in range(batch_size):
             prog_bar.update()
+    if evaluator is not None:
+        results = evaluator.wait()
     return results
 
 
-def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
+def multi_gpu_test(model,
+                   data_loader,
+                   tmpdir=None,
+                   gpu_collect=False,
+                   evaluator=None):
     """Test model with multiple gpus.
 
     This method tests model with multiple gpus and collects the results
@@ -93,9 +121,13 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
         tmpdir (str): Path of directory to save the temporary results from
             different gpus under cpu mode.
         gpu_collect (bool): Option to use either gpu or cpu to collect results.
+        evaluator (IncrementalCocoEvaluator, optional): If given, each rank
+            evaluates the results of its batches while the model runs on the
+            next ones, and only the per-image records of the evaluator are
+            collected.
 
     Returns:
-        list: The prediction results.
+        list: The prediction results, or the records of ``evaluator``.
     """
     model.eval()
     results = []
@@ -103,6 +135,9 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
     rank, world_size = get_dist_info()
     if rank == 0:
         prog_bar = mmcv.ProgressBar(len(dataset))
+    if evaluator is not None:
+        # the dataset indices of each batch of this rank
+        batch_inds = iter(data_loader.batch_sampler)
     time.sleep(2)  # This line can prevent deadlock problem in some cases.
     for i, data in enumerate(data_loader):
         with torch.no_grad():
@@ -118,13 +153,18 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
                     result[j]['ins_results'] = (
                         bbox_results, encode_mask_results(mask_results))
 
-        results.extend(result)
+        if evaluator is not None:
+            evaluator.process(result, next(batch_inds))
+        else:
+            results.extend(result)
 
         if rank == 0:
             batch_size = len(result)
             for _ in range(batch_size * world_size):
                 prog_bar.update()
 
+    if evaluator is not None:
+        results = evaluator.wait()
     # collect results from all ranks
     if gpu_collect:
         results = collect_results_gpu(results, len(dataset))
@@ -1,5 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import warnings
+from collections import OrderedDict
 
 import mmcv
 import numpy as np
@@ -38,6 +39,12 @@ class AnchorGenerator:
             float is given, they will be used to shift the centers of anchors.
         center_offset (float): The offset of center in proportion to anchors'
             width and height. By default it is 0 in V2.0.
+        cache_size (int): Number of results of :meth:`grid_priors` and
+            :meth:`valid_flags` kept in an LRU cache keyed by the feature map
+            sizes, pad shape, device and dtype, e.g. a few for multi-scale
+            training. The cached tensors are shared between the calls and
+            must not be modified in place. 0 disables the cache. Defaults
+            to 0.
 
     Examples:
         >>> from mmdet.core import AnchorGenerator
@@ -67,7 +74,8 @@ class AnchorGenerator:
                  octave_base_scale=None,
                  scales_per_octave=None,
                  centers=None,
-                 center_offset=0.):
+                 center_offset=0.,
+                 cache_size=0):
         # check center and center_offset
         if center_offset != 0:
             assert centers is None, 'center cannot be set when center_offset' \
@@ -111,6 +119,8 @@ class AnchorGenerator:
         self.centers = centers
         self.center_offset = center_offset
         self.base_anchors = self.gen_base_anchors()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
 
     @property
     def num_base_anchors(self):
@@ -231,11 +241,17 @@ class AnchorGenerator:
                 num_base_anchors is the number of anchors for that level.
         """
         assert self.num_levels == len(featmap_sizes)
+        key = ('priors', self._featmap_key(featmap_sizes), dtype,
+               torch.device(device))
+        multi_level_anchors = self._get_cache(key)
+        if multi_level_anchors is not None:
+            return multi_level_anchors
         multi_level_anchors = []
         for i in range(self.num_levels):
             anchors = self.single_level_grid_priors(
                 featmap_sizes[i], level_idx=i, dtype=dtype, device=device)
             multi_level_anchors.append(anchors)
+        self._set_cache(key, multi_level_anchors)
         return multi_level_anchors
 
     def single_level_grid_priors(self,
@@ -402,6 +418,11 @@ class AnchorGenerator:
             list(torch.Tensor): Valid flags of anchors in multiple levels.
         """
         assert self.num_levels == len(featmap_sizes)
+        key = ('flags', self._featmap_key(featmap_sizes),
+               tuple(pad_shape[:2]), torch.device(device))
+        multi_level_flags = self._get_cache(key)
+        if multi_level_flags is not None:
+            return multi_level_flags
         multi_level_flags = []
         for i in range(self.num_levels):
             anchor_stride = self.strides[i]
@@ -414,6 +435,7 @@ class AnchorGenerator:
                                                   self.num_base_anchors[i],
                                                   device=device)
             multi_level_flags.append(flags)
+        self._set_cache(key, multi_level_flags)
         return multi_level_flags
 
     def single_level_valid_flags(self,
@@ -448,6 +470,84 @@ class AnchorGenerator:
                                       num_base_anchors).contiguous().view(-1)
         return valid
 
+    def clear_cache(self):
+        """Drop the cached priors and valid flags, e.g. after changing the
+        base anchors."""
+        if hasattr(self, '_cache'):
+            self._cache.clear()
+
+    @staticmethod
+    def _featmap_key(featmap_sizes):
+        return tuple(tuple(int(s) for s in size) for size in featmap_sizes)
+
+    def _get_cache(self, key):
+        """Look up the cache, a new list holding the cached tensors is
+        returned so that the callers may change the list."""
+        cache = getattr(self, '_cache', None)
+        if not cache or key not in cache:
+            return None
+        cache.move_to_end(key)
+        return list(cache[key])
+
+    def _set_cache(self, key, value):
+        if getattr(self, 'cache_size', 0) <= 0:
+            return
+        self._cache[key] = list(value)
+        # drop the least recently used results
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def window_prior_inds(self, points, featmap_sizes, radius,
+                          device='cuda'):
+        """Indices of the anchors centered in a window around each point.
+
+        On each level the window spans the grid cells whose anchor centers
+        are at most ``radius`` away from the point along x and along y, so
+        every anchor within ``radius`` of the point is included.
+
+        Args:
+            points (Tensor): Points of shape (n, 2) in (x, y) order, e.g.
+                the centers of the gt bboxes.
+            featmap_sizes (list(tuple)): List of feature map sizes in
+                multiple feature levels.
+            radius (float): Half size of the window in pixels.
+            device (str): Device where the indices will be put on.
+
+        Return:
+            Tensor: Indices of shape (n, m) into the anchors of all levels
+                concatenated as in ``grid_priors``, increasing along each
+                row. The cells of a window outside the feature map are -1.
+        """
+        assert self.num_levels == len(featmap_sizes)
+        points = points.to(device)
+        multi_level_inds = []
+        level_offset = 0
+        for i in range(self.num_levels):
+            feat_h, feat_w = featmap_sizes[i]
+            stride_w, stride_h = self.strides[i]
+            num_base_anchors = self.num_base_anchors[i]
+            # all base anchors of a level share the same center
+            base_center = (self.base_anchors[i][0, :2] +
+                           self.base_anchors[i][0, 2:]) / 2
+            x_lo = torch.ceil(
+                (points[:, 0] - base_center[0].item() - radius) / stride_w)
+            y_lo = torch.ceil(
+                (points[:, 1] - base_center[1].item() - radius) / stride_h)
+            num_x = int(2 * radius // stride_w) + 1
+            num_y = int(2 * radius // stride_h) + 1
+            xs = x_lo.long()[:, None] + torch.arange(num_x, device=device)
+            ys = y_lo.long()[:, None] + torch.arange(num_y, device=device)
+            valid = ((xs >= 0) & (xs < feat_w))[:, None, :] & \
+                ((ys >= 0) & (ys < feat_h))[:, :, None]
+            cells = ys[:, :, None] * feat_w + xs[:, None, :]
+            inds = cells[..., None] * num_base_anchors + torch.arange(
+                num_base_anchors, device=device) + level_offset
+            inds[~valid] = -1
+            multi_level_inds.append(
+                inds.view(points.size(0), num_y * num_x * num_base_anchors))
+            level_offset += feat_h * feat_w * num_base_anchors
+        return torch.cat(multi_level_inds, dim=1)
+
     def __repr__(self):
         """str: a string that describes the module"""
         indent_str = '    '
@@ -0,0 +1,69 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+from .iou_calculators import SparseBboxOverlaps
+
+
+def build_gt_overlaps(bbox_assigners, gt_bboxes):
+    """Build the gt side of the sparse overlaps of each image once for the
+    stages of a cascade.
+
+    Args:
+        bbox_assigners (list[:obj:`BaseAssigner`]): Assigners of the stages.
+        gt_bboxes (list[Tensor]): Ground truth bboxes of each image.
+
+    Returns:
+        list[:obj:`SparseBboxOverlaps`] | None: The sparse overlaps of each
+        image, None if no assigner uses them.
+    """
+    if not any(getattr(assigner, 'sparse', False)
+               for assigner in bbox_assigners):
+        return None
+    return [SparseBboxOverlaps(gt) for gt in gt_bboxes]
+
+
+def assign_and_sample(bbox_assigner,
+                      bbox_sampler,
+                      proposal_list,
+                      gt_bboxes,
+                      gt_labels,
+                      gt_bboxes_ignore=None,
+                      feats=None,
+                      gt_overlaps=None):
+    """Assign the gts to the proposals of each image and sample them.
+
+    Args:
+        bbox_assigner (:obj:`BaseAssigner`): Assigner of the stage.
+        bbox_sampler (:obj:`BaseSampler`): Sampler of the stage.
+        proposal_list (list[Tensor]): Proposals of each image, shape (n, 4)
+            or (n, 5).
+        gt_bboxes (list[Tensor]): Ground truth bboxes of each image.
+        gt_labels (list[Tensor]): Ground truth labels of each image.
+        gt_bboxes_ignore (list[Tensor], optional): Ignored gts of each image.
+        feats (list[Tensor], optional): Multi-level features of the batch,
+            the features of each image are passed to the sampler, e.g. for
+            :obj:`OHEMSampler`.
+        gt_overlaps (list[:obj:`SparseBboxOverlaps`], optional): Sparse
+            overlaps of each image from :func:`build_gt_overlaps`, used by
+            the assigners with ``sparse=True``.
+
+    Returns:
+        list[:obj:`SamplingResult`]: Sampling result of each image.
+    """
+    num_imgs = len(proposal_list)
+    if gt_bboxes_ignore is None:
+        gt_bboxes_ignore = [None for _ in range(num_imgs)]
+    sampling_results = []
+    for i in range(num_imgs):
+        assign_kwargs = dict()
+        if gt_overlaps is not None and getattr(bbox_assigner, 'sparse',
+                                               False):
+            assign_kwargs['gt_overlaps'] = gt_overlaps[i]
+        assign_result = bbox_assigner.assign(proposal_list[i], gt_bboxes[i],
+                                             gt_bboxes_ignore[i],
+                                             gt_labels[i], **assign_kwargs)
+        kwargs = dict()
+        if feats is not None:
+            kwargs['feats'] = [lvl_feat[i][None] for lvl_feat in feats]
+        sampling_results.append(
+            bbox_sampler.sample(assign_result, proposal_list[i], gt_bboxes[i],
+                                gt_labels[i], **kwargs))
+    return sampling_results
@@ -2,7 +2,7 @@
 import torch
 
 from ..builder import BBOX_ASSIGNERS
-from ..iou_calculators import build_iou_calculator
+from ..iou_calculators import SparseBboxOverlaps, build_iou_calculator
 from .assign_result import AssignResult
 from .base_assigner import BaseAssigner
 
@@ -41,6 +41,17 @@ class MaxIoUAssigner(BaseAssigner):
         gpu_assign_thr (int): The upper bound of the number of GT for GPU
             assign. When the number of gt is above this threshold, will assign
             on CPU device. Negative values mean not assign on CPU.
+        tile_size (int, optional): If set, the overlaps are computed for a
+            chunk of gts at a time, each chunk holding at most this many
+            gt-bbox pairs, and a running max / argmax is kept instead of
+            building the full (num_gts, num_bboxes) matrix. The assignment
+            then stays on the device of the bboxes regardless of
+            ``gpu_assign_thr``.
+        sparse (bool): If True, only the non-zero IoUs are computed with
+            :obj:`SparseBboxOverlaps` and the bboxes are assigned from these
+            pairs, which also keeps the assignment on the device of the
+            bboxes. It requires the 'iou' metric and, with low quality
+            matching, a positive ``min_pos_iou``.
     """
 
     def __init__(self,
@@ -53,7 +64,9 @@ class MaxIoUAssigner(BaseAssigner):
                  match_low_quality=True,
                  gpu_assign_thr=-1,
                  iou_calculator=dict(type='BboxOverlaps2D'),
-                 assign_metric='iou'):
+                 assign_metric='iou',
+                 tile_size=None,
+                 sparse=False):
         self.pos_iou_thr = pos_iou_thr
         self.neg_iou_thr = neg_iou_thr
         self.min_pos_iou = min_pos_iou
@@ -64,8 +77,19 @@ class MaxIoUAssigner(BaseAssigner):
         self.match_low_quality = match_low_quality
         self.iou_calculator = build_iou_calculator(iou_calculator)
         self.assign_metric = assign_metric
+        self.tile_size = tile_size
+        self.sparse = sparse
+        if sparse:
+            assert assign_metric == 'iou'
+            # the zero overlaps would be low quality matches otherwise
+            assert not match_low_quality or min_pos_iou > 0
 
-    def assign(self, bboxes, gt_bboxes, gt_bboxes_ignore=None, gt_labels=None):
+    def assign(self,
+               bboxes,
+               gt_bboxes,
+               gt_bboxes_ignore=None,
+               gt_labels=None,
+               gt_overlaps=None):
         """Assign gt to bboxes.
 
         This method assign a gt bbox to every bbox (proposal/anchor), each bbox
@@ -86,6 +110,10 @@ class MaxIoUAssigner(BaseAssigner):
             gt_bboxes_ignore (Tensor, optional): Ground truth bboxes that are
                 labelled as `ignored`, e.g., crowd boxes in COCO.
             gt_labels (Tensor, optional): Label of gt_bboxes, shape (k, ).
+            gt_overlaps (:obj:`SparseBboxOverlaps`, optional): Sparse
+                overlaps built from ``gt_bboxes``, e.g. shared by the stages
+                of a cascade. Only used with ``sparse=True``, built here if
+                not given.
 
         Returns:
             :obj:`AssignResult`: The assign result.
@@ -99,7 +127,8 @@ class MaxIoUAssigner(BaseAssigner):
             >>> assert torch.all(assign_result.gt_inds == expected_gt_inds)
         """
         assign_on_cpu = True if (self.gpu_assign_thr > 0) and (
-            gt_bboxes.shape[0] > self.gpu_assign_thr) else False
+            gt_bboxes.shape[0] > self.gpu_assign_thr) and (
+            self.tile_size is None) and not self.sparse else False
         # compute overlap and assign gt on CPU when number of GT is large
         if assign_on_cpu:
             device = bboxes.device
@@ -110,8 +139,7 @@ class MaxIoUAssigner(BaseAssigner):
             if gt_labels is not None:
                 gt_labels = gt_labels.cpu()
 
-        overlaps = self.iou_calculator(gt_bboxes, bboxes, mode=self.assign_metric)
-
+        ignore_mask = None
         if (self.ignore_iof_thr > 0 and gt_bboxes_ignore is not None
                 and gt_bboxes_ignore.numel() > 0 and bboxes.numel() > 0):
             if self.ignore_wrt_candidates:
@@ -122,9 +150,24 @@ class MaxIoUAssigner(BaseAssigner):
                 ignore_overlaps = self.iou_calculator(
                     gt_bboxes_ignore, bboxes, mode='iof')
                 ignore_max_overlaps, _ = ignore_overlaps.max(dim=0)
-            overlaps[:, ignore_max_overlaps > self.ignore_iof_thr] = -1
+            ignore_mask = ignore_max_overlaps > self.ignore_iof_thr
 
-        assign_result = self.assign_wrt_overlaps(overlaps, gt_labels)
+        if self.sparse:
+            if gt_overlaps is None:
+                gt_overlaps = SparseBboxOverlaps(gt_bboxes)
+            gt_inds, bbox_inds, overlaps = gt_overlaps(bboxes)
+            assign_result = self.assign_wrt_sparse_overlaps(
+                gt_bboxes.size(0), bboxes.size(0), gt_inds, bbox_inds,
+                overlaps, ignore_mask, gt_labels)
+        elif self.tile_size is not None:
+            assign_result = self.assign_wrt_overlaps_tiled(
+                gt_bboxes, bboxes, ignore_mask, gt_labels)
+        else:
+            overlaps = self.iou_calculator(
+                gt_bboxes, bboxes, mode=self.assign_metric)
+            if ignore_mask is not None:
+                overlaps[:, ignore_mask] = -1
+            assign_result = self.assign_wrt_overlaps(overlaps, gt_labels)
         if assign_on_cpu:
             assign_result.gt_inds = assign_result.gt_inds.to(device)
             assign_result.max_overlaps = assign_result.max_overlaps.to(device)
@@ -171,9 +214,210 @@ class MaxIoUAssigner(BaseAssigner):
         # for each anchor, which gt best overlaps with it
         # for each anchor, the max iou of all gts
         max_overlaps, argmax_overlaps = overlaps.max(dim=0)
+        low_quality_gt_inds = self._low_quality_gt_inds(
+            overlaps) if self.match_low_quality else None
+        return self._assign_max_overlaps(num_gts, max_overlaps,
+                                         argmax_overlaps, low_quality_gt_inds,
+                                         gt_labels)
+
+    def assign_wrt_overlaps_tiled(self,
+                                  gt_bboxes,
+                                  bboxes,
+                                  ignore_mask=None,
+                                  gt_labels=None):
+        """Same as :meth:`assign_wrt_overlaps` with the gts streamed in
+        chunks.
+
+        Args:
+            gt_bboxes (Tensor): Groundtruth boxes, shape (k, 4).
+            bboxes (Tensor): Bounding boxes to be assigned, shape(n, 4).
+            ignore_mask (Tensor, optional): Bool mask of the ignored bboxes,
+                shape (n,).
+            gt_labels (Tensor, optional): Labels of k gt_bboxes, shape (k, ).
+
+        Returns:
+            :obj:`AssignResult`: The assign result.
+        """
+        num_gts, num_bboxes = gt_bboxes.size(0), bboxes.size(0)
+        if num_gts == 0 or num_bboxes == 0:
+            return self.assign_wrt_overlaps(
+                bboxes.new_zeros((num_gts, num_bboxes)), gt_labels)
+
+        chunk_size = max(self.tile_size // num_bboxes, 1)
+        max_overlaps = bboxes.new_full((num_bboxes, ), float('-inf'))
+        argmax_overlaps = bboxes.new_zeros((num_bboxes, ), dtype=torch.long)
+        low_quality_gt_inds = argmax_overlaps.new_zeros((num_bboxes, ))
+        for start in range(0, num_gts, chunk_size):
+            overlaps = self.iou_calculator(
+                gt_bboxes[start:start + chunk_size],
+                bboxes,
+                mode=self.assign_metric)
+            if ignore_mask is not None:
+                overlaps[:, ignore_mask] = -1
+            # the first gt with the max overlap wins as in overlaps.max()
+            chunk_max, chunk_argmax = overlaps.max(dim=0)
+            update = chunk_max > max_overlaps
+            max_overlaps = torch.where(update, chunk_max, max_overlaps)
+            argmax_overlaps = torch.where(update, chunk_argmax + start,
+                                          argmax_overlaps)
+            if self.match_low_quality:
+                low_quality_gt_inds = torch.max(
+                    low_quality_gt_inds,
+                    self._low_quality_gt_inds(overlaps, start))
+        return self._assign_max_overlaps(
+            num_gts, max_overlaps, argmax_overlaps,
+            low_quality_gt_inds if self.match_low_quality else None,
+            gt_labels)
+
+    def assign_wrt_sparse_overlaps(self,
+                                   num_gts,
+                                   num_bboxes,
+                                   gt_inds,
+                                   bbox_inds,
+                                   overlaps,
+                                   ignore_mask=None,
+                                   gt_labels=None):
+        """Same as :meth:`assign_wrt_overlaps` with only the non-zero
+        overlaps given.
+
+        Args:
+            num_gts (int): Number of gts.
+            num_bboxes (int): Number of bboxes.
+            gt_inds (Tensor): Gt index of each pair, shape (m, ).
+            bbox_inds (Tensor): Bbox index of each pair, shape (m, ).
+            overlaps (Tensor): Positive overlap of each pair, shape (m, ).
+            ignore_mask (Tensor, optional): Bool mask of the ignored bboxes,
+                shape (n,).
+            gt_labels (Tensor, optional): Labels of k gt_bboxes, shape (k, ).
+
+        Returns:
+            :obj:`AssignResult`: The assign result.
+        """
+        if num_gts == 0 or num_bboxes == 0:
+            return self.assign_wrt_overlaps(
+                overlaps.new_zeros((num_gts, num_bboxes)), gt_labels)
+
+        # the ignored bboxes have an overlap of -1 with every gt
+        if ignore_mask is not None:
+            keep = ~ignore_mask[bbox_inds]
+            gt_inds, bbox_inds, overlaps = (gt_inds[keep], bbox_inds[keep],
+                                            overlaps[keep])
+        # the bboxes without a pair only have zero overlaps, their argmax
+        # is the first gt as in overlaps.max()
+        max_overlaps = overlaps.new_zeros((num_bboxes, ))
+        argmax_overlaps = bbox_inds.new_zeros((num_bboxes, ))
+        if ignore_mask is not None:
+            max_overlaps[ignore_mask] = -1
+        segments, segment_max, segment_argmax = self._segment_max(
+            bbox_inds, gt_inds, overlaps)
+        max_overlaps[segments] = segment_max
+        argmax_overlaps[segments] = segment_argmax
+
+        low_quality_gt_inds = None
+        if self.match_low_quality:
+            gt_max_overlaps = overlaps.new_zeros((num_gts, ))
+            gt_argmax_overlaps = bbox_inds.new_zeros((num_gts, ))
+            segments, segment_max, segment_argmax = self._segment_max(
+                gt_inds, bbox_inds, overlaps)
+            gt_max_overlaps[segments] = segment_max
+            gt_argmax_overlaps[segments] = segment_argmax
+            if self.gt_max_assign_all:
+                matches = overlaps == gt_max_overlaps[gt_inds]
+            else:
+                matches = bbox_inds == gt_argmax_overlaps[gt_inds]
+            matches &= gt_max_overlaps[gt_inds] >= self.min_pos_iou
+            # a later gt overwrites an earlier one as in a loop over the gts
+            match_gt_inds, match_bbox_inds = gt_inds[matches], bbox_inds[
+                matches]
+            order = (match_bbox_inds * num_gts + match_gt_inds).argsort()
+            match_gt_inds, match_bbox_inds = match_gt_inds[
+                order], match_bbox_inds[order]
+            last = torch.ones_like(match_bbox_inds, dtype=torch.bool)
+            last[:-1] = match_bbox_inds[1:] != match_bbox_inds[:-1]
+            low_quality_gt_inds = bbox_inds.new_zeros((num_bboxes, ))
+            low_quality_gt_inds[match_bbox_inds[last]] = match_gt_inds[
+                last] + 1
+        return self._assign_max_overlaps(num_gts, max_overlaps,
+                                         argmax_overlaps, low_quality_gt_inds,
+                                         gt_labels)
+
+    @staticmethod
+    def _segment_max(segment_inds, inds, overlaps):
+        """Max overlap of the pairs of each segment, e.g. of each bbox.
+
+        Args:
+            segment_inds (Tensor): Segment of each pair, shape (m, ).
+            inds (Tensor): Index of the other side of each pair, shape (m, ).
+            overlaps (Tensor): Overlap of each pair, shape (m, ).
+
+        Returns:
+            tuple[Tensor]: The non-empty segments, their max overlap and the
+            first index reaching it as in ``max()`` of a dense matrix.
+        """
+        # sort by index, then overlap and segment keeping the previous order
+        # of the ties, the first pair of a segment is then its max
+        order = inds.sort(stable=True)[1]
+        order = order[overlaps[order].sort(descending=True, stable=True)[1]]
+        order = order[segment_inds[order].sort(stable=True)[1]]
+        segment_inds = segment_inds[order]
+        first = torch.ones_like(segment_inds, dtype=torch.bool)
+        first[1:] = segment_inds[1:] != segment_inds[:-1]
+        order = order[first]
+        return segment_inds[first], overlaps[order], inds[order]
+
+    def _low_quality_gt_inds(self, overlaps, gt_start=0):
+        """Low quality matches of the bboxes.
+
+        Args:
+            overlaps (Tensor): Overlaps between the gts from ``gt_start`` on
+                and n bboxes, shape (k, n).
+            gt_start (int): Index of the first gt of ``overlaps``.
+
+        Returns:
+            Tensor: For each bbox the index (1-based) of the last gt it is a
+                best match of, 0 if none, shape (n, ).
+        """
         # for each gt, which anchor best overlaps with it
         # for each gt, the max iou of all proposals
         gt_max_overlaps, gt_argmax_overlaps = overlaps.max(dim=1)
+        if self.gt_max_assign_all:
+            matches = overlaps == gt_max_overlaps[:, None]
+        else:
+            matches = torch.zeros_like(
+                overlaps, dtype=torch.bool).scatter_(
+                    1, gt_argmax_overlaps[:, None], True)
+        matches &= (gt_max_overlaps >= self.min_pos_iou)[:, None]
+        # a later gt overwrites an earlier one as in a loop over the gts
+        last_inds = matches.size(0) - matches.flip(0).byte().argmax(dim=0)
+        return torch.where(
+            matches.any(dim=0), last_inds + gt_start,
+            last_inds.new_zeros(()))
+
+    def _assign_max_overlaps(self,
+                             num_gts,
+                             max_overlaps,
+                             argmax_overlaps,
+                             low_quality_gt_inds=None,
+                             gt_labels=None):
+        """Assign the bboxes from their max overlaps with the gts.
+
+        Args:
+            num_gts (int): Number of gts.
+            max_overlaps (Tensor): Max overlap of each bbox, shape (n, ).
+            argmax_overlaps (Tensor): Index of the gt of the max overlap,
+                shape (n, ).
+            low_quality_gt_inds (Tensor, optional): Low quality matches, see
+                :meth:`_low_quality_gt_inds`.
+            gt_labels (Tensor, optional): Labels of the gts, shape (k, ).
+
+        Returns:
+            :obj:`AssignResult`: The assign result.
+        """
+        num_bboxes = max_overlaps.size(0)
+        # 1. assign -1 by default
+        assigned_gt_inds = max_overlaps.new_full((num_bboxes, ),
+                                                 -1,
+                                                 dtype=torch.long)
 
         # 2. assign negative: below
         # the negative inds are set to be 0
@@ -189,7 +433,7 @@ class MaxIoUAssigner(BaseAssigner):
         pos_inds = max_overlaps >= self.pos_iou_thr
         assigned_gt_inds[pos_inds] = argmax_overlaps[pos_inds] + 1
 
-        if self.match_low_quality:
+        if low_quality_gt_inds is not None:
             # Low-quality matching will overwrite the assigned_gt_inds assigned
             # in Step 3. Thus, the assigned gt might not be the best one for
             # prediction.
@@ -198,13 +442,9 @@ class MaxIoUAssigner(BaseAssigner):
             # However, if GT bbox 2's gt_argmax_overlaps = A, bbox A's
             # assigned_gt_inds will be overwritten to be bbox 2.
             # This might be the reason that it is not used in ROI Heads.
-            for i in range(num_gts):
-                if gt_max_overlaps[i] >= self.min_pos_iou:
-                    if self.gt_max_assign_all:
-                        max_iou_inds = overlaps[i, :] == gt_max_overlaps[i]
-                        assigned_gt_inds[max_iou_inds] = i + 1
-                    else:
-                        assigned_gt_inds[gt_argmax_overlaps[i]] = i + 1
+            low_quality_inds = low_quality_gt_inds > 0
+            assigned_gt_inds[low_quality_inds] = low_quality_gt_inds[
+                low_quality_inds]
 
         if gt_labels is not None:
             assigned_labels = assigned_gt_inds.new_full((num_bboxes, ), -1)
@@ -1,3 +1,5 @@
+import math
+
 import torch
 
 from ..builder import BBOX_ASSIGNERS
@@ -28,6 +30,22 @@ class RankingAssigner(BaseAssigner):
         iou_calculator (str): The class of calculating bbox similarity, including BboxOverlaps2D and BboxDistanceMetric
         assign_metric (str): The metric of measuring the similarity between boxes.
         topk (int): assign k positive samples to each gt.
+        tile_size (int, optional): If set, the overlaps are reduced in tiles
+            of at most this many gt-bbox pairs instead of building the full
+            (num_gts, num_bboxes) matrix, and the assignment stays on the
+            device of the bboxes regardless of ``gpu_assign_thr``. The
+            iou_calculator must provide ``topk``, e.g. BboxDistanceMetric.
+            It also bounds the overlaps of the images that
+            :meth:`assign_batch` assigns together.
+        candidate_radius (float, optional): If set, the anchor head passes
+            the anchors in a window of this half size (in pixels) around each
+            gt center as ``candidate_inds`` and only those are scored. The gts
+            whose k-th candidate may be beaten by an anchor outside the window
+            are scored against all bboxes, so the assignment equals the dense
+            one. Only for the 'nwd' and 'dotd' metrics, which are bounded by
+            ``exp(-center_distance / constant)``. It must exceed
+            ``constant * ln(1 / 0.3)`` so that the anchors outside all
+            windows are negatives.
     """
 
     def __init__(self,
@@ -36,15 +54,33 @@ class RankingAssigner(BaseAssigner):
                  gpu_assign_thr=-1,
                  iou_calculator=dict(type='BboxOverlaps2D'),
                  assign_metric='iou',
-                 topk=1):
+                 topk=1,
+                 tile_size=None,
+                 candidate_radius=None):
         self.ignore_iof_thr = ignore_iof_thr
         self.ignore_wrt_candidates = ignore_wrt_candidates
         self.gpu_assign_thr = gpu_assign_thr
         self.iou_calculator = build_iou_calculator(iou_calculator)
         self.assign_metric = assign_metric
         self.topk = topk
+        self.tile_size = tile_size
+        assert tile_size is None or hasattr(self.iou_calculator, 'topk'), \
+            f'{self.iou_calculator} does not support tiled overlaps'
+        self.candidate_radius = candidate_radius
+        if candidate_radius is not None:
+            assert assign_metric in ['nwd', 'dotd'], \
+                'candidate_radius needs a center distance based metric'
+            # the overlaps outside the windows must be below the neg thr
+            assert candidate_radius > self.iou_calculator.constant * \
+                math.log(1 / 0.3), f'candidate_radius {candidate_radius} is ' \
+                'too small'
 
-    def assign(self, bboxes, gt_bboxes, gt_bboxes_ignore=None, gt_labels=None):
+    def assign(self,
+               bboxes,
+               gt_bboxes,
+               gt_bboxes_ignore=None,
+               gt_labels=None,
+               candidate_inds=None):
         """Assign gt to bboxes.
 
         This method assign a gt bbox to every bbox (proposal/anchor), each bbox
@@ -58,6 +94,9 @@ class RankingAssigner(BaseAssigner):
             gt_bboxes_ignore (Tensor, optional): Ground truth bboxes that are
                 labelled as `ignored`, e.g., crowd boxes in COCO.
             gt_labels (Tensor, optional): Label of gt_bboxes, shape (k, ).
+            candidate_inds (Tensor, optional): Indices of the bboxes near
+                each gt, shape (k, m) padded with -1. Used when
+                ``candidate_radius`` is set.
 
         Returns:
             :obj:`AssignResult`: The assign result.
@@ -71,7 +110,8 @@ class RankingAssigner(BaseAssigner):
             >>> assert torch.all(assign_result.gt_inds == expected_gt_inds)
         """
         assign_on_cpu = True if (self.gpu_assign_thr > 0) and (
-            gt_bboxes.shape[0] > self.gpu_assign_thr) else False
+            gt_bboxes.shape[0] > self.gpu_assign_thr) and (
+            self.tile_size is None) and (candidate_inds is None) else False
         # compute overlap and assign gt on CPU when number of GT is large
         if assign_on_cpu:
             device = bboxes.device
@@ -82,8 +122,7 @@ class RankingAssigner(BaseAssigner):
             if gt_labels is not None:
                 gt_labels = gt_labels.cpu()
 
-        overlaps = self.iou_calculator(gt_bboxes, bboxes, mode=self.assign_metric)
-
+        ignore_mask = None
         if (self.ignore_iof_thr > 0 and gt_bboxes_ignore is not None
                 and gt_bboxes_ignore.numel() > 0 and bboxes.numel() > 0):
             if self.ignore_wrt_candidates:
@@ -94,9 +133,19 @@ class RankingAssigner(BaseAssigner):
                 ignore_overlaps = self.iou_calculator(
                     gt_bboxes_ignore, bboxes, mode='iof')
                 ignore_max_overlaps, _ = ignore_overlaps.max(dim=0)
-            overlaps[:, ignore_max_overlaps > self.ignore_iof_thr] = -1
+            ignore_mask = ignore_max_overlaps > self.ignore_iof_thr
 
-        assign_result =self.assign_wrt_ranking(overlaps, gt_labels)
+        if candidate_inds is not None:
+            assign_result = self.assign_wrt_candidates(
+                gt_bboxes, bboxes, candidate_inds, ignore_mask, gt_labels)
+        elif self.tile_size is not None:
+            assign_result = self.assign_wrt_ranking_tiled(
+                gt_bboxes, bboxes, ignore_mask, gt_labels)
+        else:
+            overlaps = self.iou_calculator(gt_bboxes, bboxes, mode=self.assign_metric)
+            if ignore_mask is not None:
+                overlaps[:, ignore_mask] = -1
+            assign_result =self.assign_wrt_ranking(overlaps, gt_labels)
 
         if assign_on_cpu:
             assign_result.gt_inds = assign_result.gt_inds.to(device)
@@ -135,16 +184,287 @@ class RankingAssigner(BaseAssigner):
         max_overlaps, argmax_overlaps = overlaps.max(dim=0)
         # for each gt, topk anchors
         # for each gt, the topk of all proposals
-        gt_max_overlaps, gt_argmax_overlaps = overlaps.topk(self.topk, dim=1, largest=True, sorted=True)
+        topk = min(self.topk, num_bboxes)
+        gt_max_overlaps, gt_argmax_overlaps = overlaps.topk(topk, dim=1, largest=True, sorted=True)
+
+        return self._assign_topk(max_overlaps, gt_argmax_overlaps, gt_labels)
+
+    def assign_wrt_ranking_tiled(self, gt_bboxes, bboxes, ignore_mask=None, gt_labels=None):
+        """Same as :meth:`assign_wrt_ranking` with overlaps reduced in tiles.
+
+        Args:
+            gt_bboxes (Tensor): Groundtruth boxes, shape (k, 4).
+            bboxes (Tensor): Bounding boxes to be assigned, shape(n, 4).
+            ignore_mask (Tensor, optional): Bool mask of the ignored bboxes,
+                shape (n,).
+            gt_labels (Tensor, optional): Label of gt_bboxes, shape (k, ).
+
+        Returns:
+            :obj:`AssignResult`: The assign result.
+        """
+        num_gts, num_bboxes = gt_bboxes.size(0), bboxes.size(0)
+        if num_gts == 0 or num_bboxes == 0:
+            return self.assign_wrt_ranking(
+                bboxes.new_zeros((num_gts, num_bboxes)), gt_labels)
+
+        _, gt_argmax_overlaps, max_overlaps, _ = self.iou_calculator.topk(
+            gt_bboxes, bboxes, self.topk, mode=self.assign_metric,
+            tile_size=self.tile_size, ignore_mask=ignore_mask)
+        return self._assign_topk(max_overlaps, gt_argmax_overlaps, gt_labels)
+
+    def assign_wrt_candidates(self, gt_bboxes, bboxes, candidate_inds, ignore_mask=None, gt_labels=None):
+        """Same as :meth:`assign_wrt_ranking` scoring the candidates only.
+
+        The k-th best candidate of a gt is exact when it beats
+        ``exp(-candidate_radius / constant)``, the bound of every anchor
+        outside its window. The other gts are scored against all bboxes.
+        The ``max_overlaps`` of the bboxes outside all windows are 0.
+
+        Args:
+            gt_bboxes (Tensor): Groundtruth boxes, shape (k, 4).
+            bboxes (Tensor): Bounding boxes to be assigned, shape(n, 4).
+            candidate_inds (Tensor): Indices of the bboxes near each gt,
+                shape (k, m) padded with -1.
+            ignore_mask (Tensor, optional): Bool mask of the ignored bboxes,
+                shape (n,).
+            gt_labels (Tensor, optional): Label of gt_bboxes, shape (k, ).
+
+        Returns:
+            :obj:`AssignResult`: The assign result.
+        """
+        num_gts, num_bboxes = gt_bboxes.size(0), bboxes.size(0)
+        if num_gts == 0 or num_bboxes == 0:
+            return self.assign_wrt_ranking(
+                bboxes.new_zeros((num_gts, num_bboxes)), gt_labels)
+
+        valid = candidate_inds >= 0
+        inds = candidate_inds.clamp(min=0)
+        # (k, 1, 4) against (k, m, 4) gives the (k, 1, m) overlaps
+        overlaps = self.iou_calculator(
+            gt_bboxes[:, None, :4], bboxes[inds],
+            mode=self.assign_metric)[:, 0]
+        if ignore_mask is not None:
+            overlaps[ignore_mask[inds]] = -1
+        # below the ignored bboxes, picked only when a gt lacks candidates
+        overlaps[~valid] = -2
+
+        topk = min(self.topk, num_bboxes)
+        cand_topk = min(topk, overlaps.size(1))
+        topk_overlaps, topk_cands = overlaps.topk(cand_topk, dim=1)
+        gt_argmax_overlaps = inds.new_zeros((num_gts, topk))
+        gt_argmax_overlaps[:, :cand_topk] = inds.gather(1, topk_cands)
+        if cand_topk < topk:
+            dense_gts = torch.arange(num_gts, device=inds.device)
+        else:
+            bound = math.exp(-self.candidate_radius /
+                             self.iou_calculator.constant)
+            dense_gts = torch.nonzero(
+                topk_overlaps[:, -1] <= bound, as_tuple=False).squeeze(1)
+
+        max_overlaps = overlaps.new_zeros((num_bboxes,))
+        max_inds, max_values = self._segment_max(inds[valid], overlaps[valid])
+        max_overlaps[max_inds] = max_values
+        if ignore_mask is not None:
+            max_overlaps[ignore_mask] = -1
+
+        if dense_gts.numel() > 0:
+            if self.tile_size is not None:
+                _, dense_argmax_overlaps, dense_max_overlaps, _ = self.iou_calculator.topk(
+                    gt_bboxes[dense_gts], bboxes, topk, mode=self.assign_metric,
+                    tile_size=self.tile_size, ignore_mask=ignore_mask)
+            else:
+                dense_overlaps = self.iou_calculator(
+                    gt_bboxes[dense_gts], bboxes, mode=self.assign_metric)
+                if ignore_mask is not None:
+                    dense_overlaps[:, ignore_mask] = -1
+                dense_max_overlaps = dense_overlaps.max(dim=0)[0]
+                dense_argmax_overlaps = dense_overlaps.topk(topk, dim=1)[1]
+            gt_argmax_overlaps[dense_gts] = dense_argmax_overlaps
+            max_overlaps = torch.max(max_overlaps, dense_max_overlaps)
+
+        return self._assign_topk(max_overlaps, gt_argmax_overlaps, gt_labels)
+
+    def assign_batch(self,
+                     bboxes,
+                     gt_bboxes,
+                     gt_valid,
+                     bbox_valid=None,
+                     gt_bboxes_ignore=None,
+                     gt_labels=None,
+                     candidate_inds=None):
+        """Assign a batch of images in one set of tensor ops.
+
+        Each image gets the same assignment as :meth:`assign` on its real
+        gts and valid bboxes. The images are assigned together in chunks
+        whose padded (num_imgs, num_gts, n) overlaps hold at most
+        ``tile_size`` gt-bbox pairs, or all at once if it is None. The images
+        :meth:`assign` handles differently are assigned one by one with it:
+        all of them if ``candidate_inds`` is given, and those with more gts
+        than ``gpu_assign_thr`` or more than ``tile_size`` pairs on their
+        own.
+
+        Args:
+            bboxes (Tensor): Bboxes of each image, shape (B, n, 4), e.g. the
+                anchors expanded to the batch.
+            gt_bboxes (Tensor): Groundtruth boxes padded to shape (B, k, 4).
+            gt_valid (Tensor): Bool mask of the real gts, shape (B, k).
+            bbox_valid (Tensor, optional): Bool mask of the bboxes to assign,
+                shape (B, n), e.g. the anchors inside the image. The other
+                bboxes are assigned -1.
+            gt_bboxes_ignore (list[Tensor], optional): Ignored gts of each
+                image.
+            gt_labels (Tensor, optional): Labels padded to shape (B, k).
+            candidate_inds (list[Tensor], optional): Indices of the valid
+                bboxes near each real gt of each image, see :meth:`assign`.
+
+        Returns:
+            tuple[Tensor]: ``gt_inds`` and ``max_overlaps`` of shape (B, n)
+            as in :obj:`AssignResult`, and the assigned ``labels`` of shape
+            (B, n) or None.
+        """
+        num_imgs, num_bboxes = bboxes.shape[:2]
+        if bbox_valid is None:
+            bbox_valid = gt_valid.new_ones((num_imgs, num_bboxes))
+        if gt_bboxes_ignore is None:
+            gt_bboxes_ignore = [None] * num_imgs
+        num_gts = gt_valid.sum(dim=1).tolist()
+        # the padded gts needed by each image, up to its last real gt
+        gt_extents = (gt_valid * torch.arange(
+            1, gt_valid.size(1) + 1, device=gt_valid.device)).max(
+                dim=1)[0].tolist() if gt_valid.size(1) > 0 else [0] * num_imgs
 
-        
+        assigned_gt_inds = bboxes.new_full((num_imgs, num_bboxes),
+                                           -1,
+                                           dtype=torch.long)
+        max_overlaps = bboxes.new_zeros((num_imgs, num_bboxes))
+        assigned_labels = None if gt_labels is None else \
+            torch.full_like(assigned_gt_inds, -1)
+        batch_inds = []
+        for i in range(num_imgs):
+            on_cpu = self.gpu_assign_thr > 0 and self.tile_size is None and \
+                num_gts[i] > self.gpu_assign_thr
+            tiled = self.tile_size is not None and \
+                num_gts[i] * num_bboxes > self.tile_size
+            if candidate_inds is None and not on_cpu and not tiled:
+                batch_inds.append(i)
+                continue
+            valid = bbox_valid[i]
+            real_gt_inds = gt_valid[i].nonzero(as_tuple=True)[0]
+            assign_result = self.assign(
+                bboxes[i, valid],
+                gt_bboxes[i, real_gt_inds],
+                gt_bboxes_ignore[i],
+                None if gt_labels is None else gt_labels[i, real_gt_inds],
+                candidate_inds=None
+                if candidate_inds is None else candidate_inds[i])
+            gt_inds = assign_result.gt_inds
+            pos = gt_inds > 0
+            gt_inds[pos] = real_gt_inds[gt_inds[pos] - 1] + 1
+            assigned_gt_inds[i, valid] = gt_inds
+            max_overlaps[i, valid] = assign_result.max_overlaps
+            if assigned_labels is not None:
+                assigned_labels[i, valid] = assign_result.labels
+
+        start = 0
+        while start < len(batch_inds):
+            end = start + 1
+            extent = gt_extents[batch_inds[start]]
+            while end < len(batch_inds):
+                next_extent = max(extent, gt_extents[batch_inds[end]])
+                if self.tile_size is not None and (
+                        end - start + 1) * next_extent * num_bboxes > \
+                        self.tile_size:
+                    break
+                extent = next_extent
+                end += 1
+            chunk = bboxes.new_tensor(batch_inds[start:end], dtype=torch.long)
+            chunk_results = self._assign_batch_dense(
+                bboxes[chunk], gt_bboxes[chunk, :extent],
+                gt_valid[chunk, :extent], bbox_valid[chunk],
+                [gt_bboxes_ignore[i] for i in batch_inds[start:end]],
+                None if gt_labels is None else gt_labels[chunk, :extent])
+            assigned_gt_inds[chunk] = chunk_results[0]
+            max_overlaps[chunk] = chunk_results[1]
+            if assigned_labels is not None:
+                assigned_labels[chunk] = chunk_results[2]
+            start = end
+        return assigned_gt_inds, max_overlaps, assigned_labels
+
+    def _assign_batch_dense(self, bboxes, gt_bboxes, gt_valid, bbox_valid,
+                            gt_bboxes_ignore, gt_labels=None):
+        """Assign the images of :meth:`assign_batch` with the full
+        (B, k, n) overlaps."""
+        num_imgs, num_bboxes = bboxes.shape[:2]
+        overlaps = self.iou_calculator(
+            gt_bboxes, bboxes, mode=self.assign_metric)
+        if overlaps.numel() == 0:
+            overlaps = bboxes.new_zeros(
+                (num_imgs, gt_bboxes.size(1), num_bboxes))
+
+        if self.ignore_iof_thr > 0 and gt_bboxes_ignore is not None:
+            for i, ignore_bboxes in enumerate(gt_bboxes_ignore):
+                if ignore_bboxes is None or ignore_bboxes.numel() == 0:
+                    continue
+                if self.ignore_wrt_candidates:
+                    ignore_overlaps = self.iou_calculator(
+                        bboxes[i], ignore_bboxes, mode='iof')
+                    ignore_max_overlaps, _ = ignore_overlaps.max(dim=1)
+                else:
+                    ignore_overlaps = self.iou_calculator(
+                        ignore_bboxes, bboxes[i], mode='iof')
+                    ignore_max_overlaps, _ = ignore_overlaps.max(dim=0)
+                overlaps[i, :, ignore_max_overlaps > self.ignore_iof_thr] = -1
+        if bbox_valid is not None:
+            # below the ignored bboxes, never in the top-k of a gt
+            img_inds, bbox_inds = torch.nonzero(~bbox_valid, as_tuple=True)
+            overlaps[img_inds, :, bbox_inds] = -2
+        if not gt_valid.all():
+            overlaps.masked_fill_(~gt_valid[:, :, None], float('-inf'))
+
+        max_overlaps = overlaps.max(dim=1)[0] if overlaps.size(1) > 0 \
+            else overlaps.new_zeros((num_imgs, num_bboxes))
+        # every bbox of an image without gts is a negative
+        max_overlaps[~gt_valid.any(dim=1)] = 0
+        assigned_gt_inds = max_overlaps.new_full((num_imgs, num_bboxes),
+                                                 -1,
+                                                 dtype=torch.long)
+        assigned_gt_inds[(max_overlaps >= 0) & (max_overlaps < 0.3)] = 0 # pre-assign neg samples
+
+        if overlaps.numel() > 0:
+            topk = min(self.topk, num_bboxes)
+            gt_argmax_overlaps = overlaps.topk(topk, dim=2)[1]
+            # the top-k of the real gts as indices into the flattened batch
+            img_inds, gt_inds = torch.nonzero(gt_valid, as_tuple=True)
+            pos_bbox_inds, pos_rows = self._resolve_topk(
+                gt_argmax_overlaps[img_inds, gt_inds] +
+                (img_inds * num_bboxes)[:, None])
+            assigned_gt_inds.view(-1)[pos_bbox_inds] = gt_inds[pos_rows - 1] + 1
+        if bbox_valid is not None:
+            assigned_gt_inds[~bbox_valid] = -1
+
+        if gt_labels is not None:
+            assigned_labels = torch.full_like(assigned_gt_inds, -1)
+            img_inds, bbox_inds = torch.nonzero(
+                assigned_gt_inds > 0, as_tuple=True)
+            assigned_labels[img_inds, bbox_inds] = gt_labels[
+                img_inds, assigned_gt_inds[img_inds, bbox_inds] - 1]
+        else:
+            assigned_labels = None
+        return assigned_gt_inds, max_overlaps, assigned_labels
+
+    def _assign_topk(self, max_overlaps, gt_argmax_overlaps, gt_labels=None):
+        """Assign the top-k bboxes of each gt as positives and the bboxes
+        with a max overlap in [0, 0.3) as negatives."""
+        num_gts = gt_argmax_overlaps.size(0)
+        num_bboxes = max_overlaps.size(0)
+        assigned_gt_inds = max_overlaps.new_full((num_bboxes,),
+                                                 -1,
+                                                 dtype=torch.long)
         assigned_gt_inds[(max_overlaps >= 0) & (max_overlaps < 0.3)] = 0 # pre-assign neg samples
        
         # assign pos samples to each gt wrt ranking
-        for i in range(num_gts):
-            for j in range(self.topk):
-                max_overlap_inds = overlaps[i,:] == gt_max_overlaps[i,j]
-                assigned_gt_inds[max_overlap_inds] = i + 1
+        pos_bbox_inds, pos_gt_inds = self._resolve_topk(gt_argmax_overlaps)
+        assigned_gt_inds[pos_bbox_inds] = pos_gt_inds
 
         if gt_labels is not None:
             assigned_labels = assigned_gt_inds.new_full((num_bboxes,), -1)
@@ -157,4 +477,51 @@ class RankingAssigner(BaseAssigner):
             assigned_labels = None
 
         return AssignResult(
-            num_gts, assigned_gt_inds, max_overlaps, labels=assigned_labels)
\ No newline at end of file
+            num_gts, assigned_gt_inds, max_overlaps, labels=assigned_labels)
+
+    @staticmethod
+    def _resolve_topk(gt_argmax_overlaps):
+        """Match the top-k bboxes of all gts at once.
+
+        Each gt takes exactly the k bboxes picked by ``topk``, ties in the
+        overlaps are broken by ``topk`` as well. A bbox in the top-k of
+        several gts goes to the gt with the largest index, the one the former
+        per-gt loop wrote last.
+
+        Args:
+            gt_argmax_overlaps (Tensor): Top-k bbox indices of each gt,
+                shape (num_gts, k).
+
+        Returns:
+            tuple[Tensor]: Indices of the positive bboxes and their assigned
+            gt indices (1-based), each bbox appears once.
+        """
+        num_gts, topk = gt_argmax_overlaps.shape
+        gt_inds = torch.arange(
+            1, num_gts + 1, device=gt_argmax_overlaps.device).repeat_interleave(topk)
+        bbox_inds = gt_argmax_overlaps.reshape(-1)
+        # sort the (bbox, gt) pairs by bbox then gt and keep the last gt
+        order = (bbox_inds * (num_gts + 1) + gt_inds).argsort()
+        bbox_inds, gt_inds = bbox_inds[order], gt_inds[order]
+        is_last = torch.ones_like(bbox_inds, dtype=torch.bool)
+        is_last[:-1] = bbox_inds[1:] != bbox_inds[:-1]
+        return bbox_inds[is_last], gt_inds[is_last]
+
+    @staticmethod
+    def _segment_max(inds, values):
+        """Max of the values sharing an index.
+
+        Args:
+            inds (Tensor): Bbox index of each value, shape (n,).
+            values (Tensor): Overlaps, shape (n,).
+
+        Returns:
+            tuple[Tensor]: The unique indices and the max value of each.
+        """
+        # sort by index then value and keep the last value of each index
+        ranks = values.argsort().argsort()
+        order = (inds * max(ranks.numel(), 1) + ranks).argsort()
+        inds, values = inds[order], values[order]
+        is_last = torch.ones_like(inds, dtype=torch.bool)
+        is_last[:-1] = inds[1:] != inds[:-1]
+        return inds[is_last], values[is_last]
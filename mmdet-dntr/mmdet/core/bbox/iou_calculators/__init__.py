@@ -2,5 +2,9 @@
 from .builder import build_iou_calculator
 from .iou2d_calculator import BboxOverlaps2D, bbox_overlaps
 from .metric_calculator import BboxDistanceMetric
+from .sparse_overlaps import SparseBboxOverlaps
 
-__all__ = ['build_iou_calculator', 'BboxOverlaps2D', 'bbox_overlaps', 'BboxDistanceMetric']
+__all__ = [
+    'build_iou_calculator', 'BboxOverlaps2D', 'bbox_overlaps',
+    'BboxDistanceMetric', 'SparseBboxOverlaps'
+]
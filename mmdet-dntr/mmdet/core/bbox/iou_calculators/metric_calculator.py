@@ -21,8 +21,9 @@ class BboxDistanceMetric(object):
                 empty. If ``is_aligned `` is ``True``, then m and n must be
                 equal.
             mode (str): "iou" (intersection over union), "iof" (intersection
-                over foreground), or "giou" (generalized intersection over
-                union).
+                over foreground), "giou" (generalized intersection over
+                union), "nwd" (normalized Wasserstein distance), "dotd" (dot
+                distance), see :func:`bbox_overlaps`.
             is_aligned (bool, optional): If True, then m and n must be equal.
                 Default False.
 
@@ -37,6 +38,21 @@ class BboxDistanceMetric(object):
             bboxes1 = bboxes1[..., :4]
         return bbox_overlaps(bboxes1, bboxes2, mode, is_aligned, constant=self.constant)
 
+    def topk(self, bboxes1, bboxes2, k, mode='iou', tile_size=2**22, ignore_mask=None):
+        """Per-row top-k and per-column max of the overlaps, computed in tiles.
+
+        See :func:`bbox_overlaps_topk`, the score column of the bboxes is
+        dropped as in ``__call__``.
+        """
+        assert bboxes1.size(-1) in [0, 4, 5]
+        assert bboxes2.size(-1) in [0, 4, 5]
+        if bboxes2.size(-1) == 5:
+            bboxes2 = bboxes2[..., :4]
+        if bboxes1.size(-1) == 5:
+            bboxes1 = bboxes1[..., :4]
+        return bbox_overlaps_topk(bboxes1, bboxes2, k, mode, tile_size=tile_size, ignore_mask=ignore_mask,
+                                  constant=self.constant)
+
     def __repr__(self):
         """str: a string describing the module"""
         repr_str = self.__class__.__name__ + '()'
@@ -44,6 +60,29 @@ class BboxDistanceMetric(object):
 
 
 def bbox_overlaps(bboxes1, bboxes2, mode='iou', is_aligned=False, eps=1e-6, constant=12.7, weight=2):
+    """Similarity of two sets of bboxes.
+
+    Each mode only computes what its metric needs, the per-box terms
+    (areas, centers, sizes) are computed once per box and broadcast.
+
+    Args:
+        bboxes1 (Tensor): shape (B, m, 4) in <x1, y1, x2, y2> format or empty.
+        bboxes2 (Tensor): shape (B, n, 4) in <x1, y1, x2, y2> format or empty.
+            B indicates the batch dim, in shape (B1, B2, ..., Bn).
+            If ``is_aligned`` is ``True``, then m and n must be equal.
+        mode (str): "iou", "iof" (same as "iou" here), "giou",
+            "normalized_giou", "ciou", "diou", "nwd" (normalized Wasserstein
+            distance) or "dotd" (dot distance).
+        is_aligned (bool, optional): If True, then m and n must be equal.
+            Default False.
+        eps (float, optional): A value added to the denominator for numerical
+            stability. Default 1e-6.
+        constant (float): Normalizer of the "nwd" and "dotd" distances.
+        weight (float): Divisor of the width and height terms of "nwd".
+
+    Returns:
+        Tensor: shape (m, n) if ``is_aligned`` is False else shape (m,)
+    """
     assert mode in ['iou', 'iof', 'giou', 'normalized_giou', 'ciou', 'diou', 'nwd',
                     'dotd'], f'Unsupported mode {mode}'
     # Either the boxes are empty or the length of boxes's last dimenstion is 4
@@ -57,127 +96,167 @@ def bbox_overlaps(bboxes1, bboxes2, mode='iou', is_aligned=False, eps=1e-6, cons
 
     rows = bboxes1.size(-2)
     cols = bboxes2.size(-2)
+    if is_aligned:
+        assert rows == cols
 
     if rows * cols == 0:
+        if is_aligned:
+            return bboxes1.new(batch_shape + (rows, ))
         return bboxes1.new(batch_shape + (rows, cols))
 
-    area1 = (bboxes1[..., 2] - bboxes1[..., 0]) * (
-            bboxes1[..., 3] - bboxes1[..., 1])
-    area2 = (bboxes2[..., 2] - bboxes2[..., 0]) * (
-            bboxes2[..., 3] - bboxes2[..., 1])
-
-
-    lt = torch.max(bboxes1[..., :, None, :2],
-                   bboxes2[..., None, :, :2])  # [B, rows, cols, 2]
-    rb = torch.min(bboxes1[..., :, None, 2:],
-                   bboxes2[..., None, :, 2:])  # [B, rows, cols, 2]
-
-    wh = (rb - lt).clamp(min=0)  # [B, rows, cols, 2]
-    overlap = wh[..., 0] * wh[..., 1]
-
-    union = area1[..., None] + area2[..., None, :] - overlap + eps
-
-    if mode in ['giou', 'normalized_giou', 'ciou', 'diou']:
-        enclosed_lt = torch.min(bboxes1[..., :, None, :2],
-                                bboxes2[..., None, :, :2])
-        enclosed_rb = torch.max(bboxes1[..., :, None, 2:],
-                                bboxes2[..., None, :, 2:])
-
-    eps = union.new_tensor([eps])
-    union = torch.max(union, eps)
+    if mode == 'nwd':
+        return _nwd_overlaps(bboxes1, bboxes2, is_aligned, eps, constant, weight)
+    if mode == 'dotd':
+        return _dotd_overlaps(bboxes1, bboxes2, is_aligned, eps, constant)
+    return _iou_overlaps(bboxes1, bboxes2, mode, is_aligned, eps)
+
+
+def _pairwise(x1, x2, is_aligned):
+    """Broadcast per-box terms of shape (..., m) and (..., n) to the pairs."""
+    if is_aligned:
+        return x1, x2
+    return x1[..., :, None], x2[..., None, :]
+
+
+def _iou_overlaps(bboxes1, bboxes2, mode, is_aligned, eps):
+    """IoU based modes, the pair terms are computed per coordinate."""
+    # contiguous (..., 4, m) coordinate planes broadcast faster than columns
+    x1_1, y1_1, x2_1, y2_1 = bboxes1.transpose(-1, -2).contiguous().unbind(-2)
+    x1_2, y1_2, x2_2, y2_2 = bboxes2.transpose(-1, -2).contiguous().unbind(-2)
+    area1 = (x2_1 - x1_1) * (y2_1 - y1_1)
+    area2 = (x2_2 - x1_2) * (y2_2 - y1_2)
+    width1, width2 = x2_1 - x1_1, x2_2 - x1_2
+    height1, height2 = y2_1 - y1_1, y2_2 - y1_2
+    center_x1, center_x2 = (x1_1 + x2_1) / 2, (x1_2 + x2_2) / 2
+    center_y1, center_y2 = (y1_1 + y2_1) / 2, (y1_2 + y2_2) / 2
+    x1_1, x1_2 = _pairwise(x1_1, x1_2, is_aligned)
+    y1_1, y1_2 = _pairwise(y1_1, y1_2, is_aligned)
+    x2_1, x2_2 = _pairwise(x2_1, x2_2, is_aligned)
+    y2_1, y2_2 = _pairwise(y2_1, y2_2, is_aligned)
+    area1, area2 = _pairwise(area1, area2, is_aligned)
+
+    overlap_w = torch.min(x2_1, x2_2).sub_(torch.max(x1_1, x1_2)).clamp_(min=0)
+    overlap_h = torch.min(y2_1, y2_2).sub_(torch.max(y1_1, y1_2)).clamp_(min=0)
+    overlap = overlap_w * overlap_h
+    union = (area1 + area2).sub_(overlap).add_(eps).clamp_(min=eps)
     ious = overlap / union
 
+    # iof has always returned the iou in this calculator
     if mode in ['iou', 'iof']:
         return ious
 
+    enclose_w = torch.max(x2_1, x2_2).sub_(torch.min(x1_1, x1_2)).clamp_(min=0)
+    enclose_h = torch.max(y2_1, y2_2).sub_(torch.min(y1_1, y1_2)).clamp_(min=0)
 
-    # calculate gious
-    if mode in ['giou', 'normalized_giou', 'ciou', 'diou']:
-        enclose_wh = (enclosed_rb - enclosed_lt).clamp(min=0)
-        enclose_area = enclose_wh[..., 0] * enclose_wh[..., 1]
-        enclose_area = torch.max(enclose_area, eps)
+    if mode in ['giou', 'normalized_giou']:
+        enclose_area = (enclose_w * enclose_h).clamp_(min=eps)
         gious = ious - (enclose_area - union) / enclose_area
-
-    if mode == 'giou':
+        if mode == 'normalized_giou':
+            gious = (1 + gious) / 2
         return gious
 
-    if mode == 'normalized_giou':
-        gious = (1 + gious) / 2
-
-        return gious
+    # diou and ciou
+    center_x1, center_x2 = _pairwise(center_x1, center_x2, is_aligned)
+    center_y1, center_y2 = _pairwise(center_y1, center_y2, is_aligned)
+    dx = center_x1 - center_x2
+    dy = center_y1 - center_y2
+    center_distance = dx * dx + dy * dy + eps  # distances of center points between gt and pre
+    enclosed_diagonal_distances = enclose_w * enclose_w + enclose_h * enclose_h  # distances of diagonal of enclosed bbox
+    center_penalty = center_distance / enclosed_diagonal_distances.clamp_(min=eps)
 
     if mode == 'diou':
-        center1 = (bboxes1[..., :, None, :2] + bboxes1[..., :, None, 2:]) / 2
-        center2 = (bboxes2[..., None, :, :2] + bboxes2[..., None, :, 2:]) / 2
-        whs = center1[..., :2] - center2[..., :2]
-
-        center_distance = whs[..., 0] * whs[..., 0] + whs[..., 1] * whs[
-            ..., 1] + eps  # distances of center points between gt and pre
-
-        enclosed_diagonal_distances = enclose_wh[..., 0] * enclose_wh[..., 0] + enclose_wh[..., 1] * enclose_wh[
-            ..., 1]  # distances of diagonal of enclosed bbox
-
-        dious = ious - center_distance / torch.max(enclosed_diagonal_distances, eps)
-
-        dious = torch.clamp(dious, min=-1.0, max=1.0)
-
-        return dious
-
-    if mode == 'ciou':
-        center1 = (bboxes1[..., :, None, :2] + bboxes1[..., :, None, 2:]) / 2
-        center2 = (bboxes2[..., None, :, :2] + bboxes2[..., None, :, 2:]) / 2
-        whs = center1[..., :2] - center2[..., :2]
-
-        center_distance = whs[..., 0] * whs[..., 0] + whs[..., 1] * whs[
-            ..., 1] + eps  # distances of center points between gt and pre
-
-        enclosed_diagonal_distances = enclose_wh[..., 0] * enclose_wh[..., 0] + enclose_wh[..., 1] * enclose_wh[
-            ..., 1]  # distances of diagonal of enclosed bbox
-
-        w1 = bboxes1[..., :, None, 2] - bboxes1[..., :, None, 0] + eps
-        h1 = bboxes1[..., :, None, 3] - bboxes1[..., :, None, 1] + eps
-        w2 = bboxes2[..., None, :, 2] - bboxes2[..., None, :, 0] + eps
-        h2 = bboxes2[..., None, :, 3] - bboxes2[..., None, :, 1] + eps
-
-        factor = 4 / math.pi ** 2
-        v = factor * torch.pow(torch.atan(w2 / h2) - torch.atan(w1 / h1), 2)
-
-        cious = ious - (center_distance / torch.max(enclosed_diagonal_distances, eps) + v ** 2 / torch.max(1 - ious + v,
-                                                                                                           eps))
-
-        cious = torch.clamp(cious, min=-1.0, max=1.0)
-
-        return cious
-
-    if mode == 'nwd':
-        center1 = (bboxes1[..., :, None, :2] + bboxes1[..., :, None, 2:]) / 2
-        center2 = (bboxes2[..., None, :, :2] + bboxes2[..., None, :, 2:]) / 2
-        whs = center1[..., :2] - center2[..., :2]
-
-        center_distance = whs[..., 0] * whs[..., 0] + whs[..., 1] * whs[..., 1] + eps  #
-
-        w1 = bboxes1[..., :, None, 2] - bboxes1[..., :, None, 0] + eps
-        h1 = bboxes1[..., :, None, 3] - bboxes1[..., :, None, 1] + eps
-        w2 = bboxes2[..., None, :, 2] - bboxes2[..., None, :, 0] + eps
-        h2 = bboxes2[..., None, :, 3] - bboxes2[..., None, :, 1] + eps
-
-        wh_distance = ((w1 - w2) ** 2 + (h1 - h2) ** 2) / (weight ** 2)
-
-        wassersteins = torch.sqrt(center_distance + wh_distance)
-
-        normalized_wasserstein = torch.exp(-wassersteins / constant)
-
-        return normalized_wasserstein
-
-    if mode == 'dotd':
-        center1 = (bboxes1[..., :, None, :2] + bboxes1[..., :, None, 2:]) / 2
-        center2 = (bboxes2[..., None, :, :2] + bboxes2[..., None, :, 2:]) / 2
-        whs = center1[..., :2] - center2[..., :2]
-
-        center_distance = whs[..., 0] * whs[..., 0] + whs[..., 1] * whs[..., 1] + eps  #
-
-        distance = torch.sqrt(center_distance)
-
-        dotd = torch.exp(-distance / constant)
-
-        return dotd
+        return torch.clamp(ious - center_penalty, min=-1.0, max=1.0)
+
+    angle1 = torch.atan((width1 + eps) / (height1 + eps))
+    angle2 = torch.atan((width2 + eps) / (height2 + eps))
+    angle1, angle2 = _pairwise(angle1, angle2, is_aligned)
+    factor = 4 / math.pi ** 2
+    v = factor * torch.pow(angle2 - angle1, 2)
+    cious = ious - (center_penalty + v ** 2 / torch.clamp(1 - ious + v, min=eps))
+    return torch.clamp(cious, min=-1.0, max=1.0)
+
+
+def _center_distance(points1, points2, is_aligned, eps):
+    """sqrt(squared euclidean distance + eps) of the point pairs."""
+    if is_aligned:
+        squared_distance = (points1 - points2).pow(2).sum(dim=-1)
+    else:
+        # exact differences, the matmul form loses precision for large coords
+        squared_distance = torch.cdist(
+            points1, points2, compute_mode='donot_use_mm_for_euclid_dist').square()
+    return squared_distance.add_(eps).sqrt_()
+
+
+def _nwd_overlaps(bboxes1, bboxes2, is_aligned, eps, constant, weight):
+    """exp(-W / constant), W is the Wasserstein distance of the gaussians,
+    i.e. the euclidean distance of (cx, cy, w / weight, h / weight)."""
+    points1 = torch.cat(((bboxes1[..., :2] + bboxes1[..., 2:]) / 2,
+                         (bboxes1[..., 2:] - bboxes1[..., :2]) / weight), dim=-1)
+    points2 = torch.cat(((bboxes2[..., :2] + bboxes2[..., 2:]) / 2,
+                         (bboxes2[..., 2:] - bboxes2[..., :2]) / weight), dim=-1)
+    wassersteins = _center_distance(points1, points2, is_aligned, eps)
+    return wassersteins.div(-constant).exp_()
+
+
+def _dotd_overlaps(bboxes1, bboxes2, is_aligned, eps, constant):
+    """exp(-center distance / constant)."""
+    centers1 = (bboxes1[..., :2] + bboxes1[..., 2:]) / 2
+    centers2 = (bboxes2[..., :2] + bboxes2[..., 2:]) / 2
+    distance = _center_distance(centers1, centers2, is_aligned, eps)
+    return distance.div(-constant).exp_()
+
+
+def bbox_overlaps_topk(bboxes1, bboxes2, k, mode='iou', tile_size=2**22, ignore_mask=None, eps=1e-6,
+                       constant=12.7, weight=2):
+    """Reduce the overlaps of bboxes1 (m) and bboxes2 (n) without building the
+    (m, n) matrix.
+
+    bboxes2 are streamed in chunks so that a tile holds at most ``tile_size``
+    overlaps, a running top-k over bboxes2 is kept for each of bboxes1 and the
+    max over bboxes1 is kept for each of bboxes2.
+
+    Args:
+        bboxes1 (Tensor): shape (m, 4) in <x1, y1, x2, y2> format, e.g. gts.
+        bboxes2 (Tensor): shape (n, 4) in <x1, y1, x2, y2> format, e.g.
+            anchors.
+        k (int): Number of bboxes2 kept for each of bboxes1, clamped to n.
+        mode (str): Overlap mode, see :func:`bbox_overlaps`.
+        tile_size (int): Max number of overlaps computed at once.
+        ignore_mask (Tensor, optional): Bool mask of shape (n,), the
+            overlaps of the masked bboxes2 are set to -1.
+
+    Returns:
+        tuple[Tensor]: ``topk_overlaps`` and ``topk_inds`` of shape (m, k)
+        sorted in descending order, ``max_overlaps`` and ``argmax_overlaps``
+        of shape (n,).
+    """
+    rows = bboxes1.size(0)
+    cols = bboxes2.size(0)
+    k = min(k, cols)
+    chunk_size = max(tile_size // max(rows, 1), 1)
+
+    topk_overlaps = bboxes1.new_zeros((rows, 0))
+    topk_inds = bboxes1.new_zeros((rows, 0), dtype=torch.long)
+    max_overlaps = []
+    argmax_overlaps = []
+    for start in range(0, cols, chunk_size):
+        overlaps = bbox_overlaps(bboxes1, bboxes2[start:start + chunk_size], mode, eps=eps, constant=constant,
+                                 weight=weight)
+        if ignore_mask is not None:
+            overlaps[:, ignore_mask[start:start + chunk_size]] = -1
+        if rows > 0:
+            chunk_max, chunk_argmax = overlaps.max(dim=0)
+            max_overlaps.append(chunk_max)
+            argmax_overlaps.append(chunk_argmax)
+
+        chunk_topk = min(k, overlaps.size(1))
+        chunk_topk_overlaps, chunk_topk_inds = overlaps.topk(chunk_topk, dim=1)
+        topk_overlaps = torch.cat((topk_overlaps, chunk_topk_overlaps), dim=1)
+        topk_inds = torch.cat((topk_inds, chunk_topk_inds + start), dim=1)
+        if topk_overlaps.size(1) > k:
+            topk_overlaps, order = topk_overlaps.topk(k, dim=1)
+            topk_inds = topk_inds.gather(1, order)
+
+    if len(max_overlaps) == 0:
+        return topk_overlaps, topk_inds, bboxes2.new_zeros((cols,)), bboxes2.new_zeros((cols,), dtype=torch.long)
+    return topk_overlaps, topk_inds, torch.cat(max_overlaps), torch.cat(argmax_overlaps)
@@ -0,0 +1,95 @@
+import torch
+
+
+class SparseBboxOverlaps:
+    """Non-zero IoUs of a fixed set of gt boxes with several sets of bboxes.
+
+    The gt side is computed once, e.g. once per image for all the stages of
+    a cascade: the gts are sorted by x1 together with their areas and the
+    running max of their x2. The gts that may overlap a bbox then form a
+    contiguous range of the sorted gts, found by a binary search on both
+    ends, and only the pairs in these ranges are computed. The IoUs equal
+    those of :func:`bbox_overlaps` in the 'iou' mode.
+
+    Args:
+        gt_bboxes (Tensor): Groundtruth boxes, shape (k, 4).
+        eps (float): Lower bound of the union as in :func:`bbox_overlaps`.
+
+    Example:
+        >>> gt_bboxes = torch.Tensor([[0, 0, 10, 10], [50, 50, 60, 60]])
+        >>> self = SparseBboxOverlaps(gt_bboxes)
+        >>> bboxes = torch.Tensor([[0, 0, 10, 20], [20, 20, 30, 30]])
+        >>> gt_inds, bbox_inds, overlaps = self(bboxes)
+        >>> assert gt_inds.tolist() == [0] and bbox_inds.tolist() == [0]
+        >>> assert overlaps.tolist() == [0.5]
+    """
+
+    def __init__(self, gt_bboxes, eps=1e-6):
+        gt_bboxes = gt_bboxes[:, :4]
+        self.num_gts = gt_bboxes.size(0)
+        self.eps = eps
+        self.order = gt_bboxes[:, 0].argsort()
+        self.gt_bboxes = gt_bboxes[self.order]
+        self.areas = (self.gt_bboxes[:, 2] - self.gt_bboxes[:, 0]) * (
+            self.gt_bboxes[:, 3] - self.gt_bboxes[:, 1])
+        self.x1 = self.gt_bboxes[:, 0].contiguous()
+        # the sorted gts before the first one whose running max of x2
+        # exceeds the x1 of a bbox are all on its left
+        self.x2_cummax = self.gt_bboxes[:, 2].cummax(dim=0)[0].contiguous()
+
+    def candidate_ranges(self, bboxes):
+        """Range of the sorted gts that may overlap each bbox.
+
+        Args:
+            bboxes (Tensor): Bboxes, shape (n, 4).
+
+        Returns:
+            tuple[Tensor]: Start and end (exclusive) of the range of each
+            bbox, shape (n, ).
+        """
+        starts = torch.searchsorted(
+            self.x2_cummax, bboxes[:, 0].contiguous(), right=True)
+        # the gts from the first with x1 >= the x2 of a bbox are on its right
+        ends = torch.searchsorted(self.x1, bboxes[:, 2].contiguous())
+        return starts, torch.max(starts, ends)
+
+    def __call__(self, bboxes):
+        """Compute the non-zero IoUs.
+
+        Args:
+            bboxes (Tensor): Bboxes, shape (n, 4) or (n, 5).
+
+        Returns:
+            tuple[Tensor]: ``gt_inds``, ``bbox_inds`` and ``overlaps`` of the
+            pairs with a non-zero IoU, each of shape (num_pairs, ). The pairs
+            are grouped by bbox.
+        """
+        bboxes = bboxes[:, :4]
+        starts, ends = self.candidate_ranges(bboxes)
+        counts = ends - starts
+        bbox_inds = torch.arange(
+            bboxes.size(0), device=bboxes.device).repeat_interleave(counts)
+        # position of each pair in the range of its bbox
+        offsets = torch.arange(
+            bbox_inds.numel(), device=bboxes.device) - (
+                counts.cumsum(0) - counts)[bbox_inds]
+        sorted_gt_inds = starts[bbox_inds] + offsets
+
+        gts = self.gt_bboxes[sorted_gt_inds]
+        pair_bboxes = bboxes[bbox_inds]
+        lt = torch.max(gts[:, :2], pair_bboxes[:, :2])
+        rb = torch.min(gts[:, 2:], pair_bboxes[:, 2:])
+        wh = (rb - lt).clamp(min=0)
+        overlap = wh[:, 0] * wh[:, 1]
+        areas = (pair_bboxes[:, 2] - pair_bboxes[:, 0]) * (
+            pair_bboxes[:, 3] - pair_bboxes[:, 1])
+        union = self.areas[sorted_gt_inds] + areas - overlap
+        overlaps = overlap / torch.max(union, union.new_tensor([self.eps]))
+
+        keep = overlaps > 0
+        return (self.order[sorted_gt_inds[keep]], bbox_inds[keep],
+                overlaps[keep])
+
+    def __repr__(self):
+        """str: a string describing the module"""
+        return self.__class__.__name__ + f'(num_gts={self.num_gts})'
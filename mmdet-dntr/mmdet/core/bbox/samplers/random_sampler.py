@@ -1,4 +1,5 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import numpy as np
 import torch
 
 from ..builder import BBOX_SAMPLERS
@@ -16,8 +17,17 @@ class RandomSampler(BaseSampler):
             positive samples. Defaults to -1.
         add_gt_as_proposals (bool, optional): Whether to add ground truth
             boxes as proposals. Defaults to True.
+        seed (int, optional): If set, the samples are drawn from a
+            :obj:`torch.Generator` seeded with it instead of the global
+            random state. A generator passed to :meth:`sample` or
+            :meth:`sample_batch` takes precedence, e.g. one seeded per
+            iteration for reproducible runs.
     """
 
+    # a partial shuffle draws the samples one by one in python, it is faster
+    # than a full permutation for galleries much larger than the samples
+    partial_shuffle_ratio = 64
+
     def __init__(self,
                  num,
                  pos_fraction,
@@ -28,8 +38,11 @@ class RandomSampler(BaseSampler):
         super(RandomSampler, self).__init__(num, pos_fraction, neg_pos_ub,
                                             add_gt_as_proposals)
         self.rng = demodata.ensure_rng(kwargs.get('rng', None))
+        seed = kwargs.get('seed', None)
+        self.generator = None if seed is None else torch.Generator(
+        ).manual_seed(seed)
 
-    def random_choice(self, gallery, num):
+    def random_choice(self, gallery, num, generator=None):
         """Random select some elements from the gallery.
 
         If `gallery` is a Tensor, the returned indices will be a Tensor;
@@ -39,27 +52,57 @@ class RandomSampler(BaseSampler):
         Args:
             gallery (Tensor | ndarray | list): indices pool.
             num (int): expected sample num.
+            generator (torch.Generator, optional): CPU generator of the
+                samples, defaults to the one of ``seed``.
 
         Returns:
             Tensor or ndarray: sampled indices.
         """
         assert len(gallery) >= num
+        if generator is None:
+            generator = self.generator
 
-        is_tensor = isinstance(gallery, torch.Tensor)
-        if not is_tensor:
-            if torch.cuda.is_available():
-                device = torch.cuda.current_device()
-            else:
-                device = 'cpu'
-            gallery = torch.tensor(gallery, dtype=torch.long, device=device)
         # This is a temporary fix. We can revert the following code
         # when PyTorch fixes the abnormal return of torch.randperm.
         # See: https://github.com/open-mmlab/mmdetection/pull/5014
-        perm = torch.randperm(gallery.numel())[:num].to(device=gallery.device)
-        rand_inds = gallery[perm]
-        if not is_tensor:
-            rand_inds = rand_inds.cpu().numpy()
-        return rand_inds
+        # The positions are drawn on the CPU and only the num sampled ones
+        # are moved to the device of the gallery.
+        perm = self._random_positions(len(gallery), num, generator)
+        if not isinstance(gallery, torch.Tensor):
+            return np.asarray(gallery, dtype=np.int64)[perm.numpy()]
+        return gallery[perm.to(device=gallery.device)]
+
+    def _random_positions(self, n, num, generator=None):
+        """Draw ``num`` distinct positions out of ``n`` on the CPU."""
+        if n > self.partial_shuffle_ratio * num:
+            return self._partial_shuffle(n, num, generator)
+        return torch.randperm(n, generator=generator)[:num]
+
+    @staticmethod
+    def _partial_shuffle(n, num, generator=None):
+        """Draw ``num`` distinct positions out of ``n`` in a random order.
+
+        The first ``num`` steps of a Fisher-Yates shuffle, the swaps are kept
+        in a dict so the cost does not depend on ``n``.
+
+        Args:
+            n (int): Size of the gallery.
+            num (int): Number of positions to draw.
+            generator (torch.Generator, optional): CPU generator.
+
+        Returns:
+            Tensor: The positions, shape (num, ).
+        """
+        steps = torch.arange(num, dtype=torch.float64)
+        swap_inds = (steps + torch.rand(
+            num, generator=generator, dtype=torch.float64) *
+                     (n - steps)).long().clamp_(max=n - 1).tolist()
+        swaps = dict()
+        perm = []
+        for i, j in enumerate(swap_inds):
+            perm.append(swaps.get(j, j))
+            swaps[j] = swaps.get(i, i)
+        return torch.tensor(perm, dtype=torch.long)
 
     def _sample_pos(self, assign_result, num_expected, **kwargs):
         """Randomly sample some positive samples."""
@@ -69,7 +112,8 @@ class RandomSampler(BaseSampler):
         if pos_inds.numel() <= num_expected:
             return pos_inds
         else:
-            return self.random_choice(pos_inds, num_expected)
+            return self.random_choice(pos_inds, num_expected,
+                                      kwargs.get('generator', None))
 
     def _sample_neg(self, assign_result, num_expected, **kwargs):
         """Randomly sample some negative samples."""
@@ -79,4 +123,80 @@ class RandomSampler(BaseSampler):
         if len(neg_inds) <= num_expected:
             return neg_inds
         else:
-            return self.random_choice(neg_inds, num_expected)
+            return self.random_choice(neg_inds, num_expected,
+                                      kwargs.get('generator', None))
+
+    def sample_batch(self, gt_inds, generator=None):
+        """Randomly sample the bboxes of a batch of images at once.
+
+        The number of samples of each image follows :meth:`sample`, the gts
+        are not added as proposals.
+
+        Args:
+            gt_inds (Tensor): Assigned gt indices of each image as in
+                :obj:`AssignResult`, shape (B, n).
+            generator (torch.Generator, optional): Generator of the samples,
+                defaults to the one of ``seed``. It may be a CUDA generator
+                for the gt_inds on a GPU.
+
+        Returns:
+            tuple[Tensor]: Bool masks of the sampled positive and negative
+            bboxes, each of shape (B, n).
+        """
+        if generator is None:
+            generator = self.generator
+        assert not self.add_gt_as_proposals, \
+            'sample_batch does not add the gts as proposals'
+        num_expected_pos = int(self.num * self.pos_fraction)
+        pos_mask = self._random_subset(gt_inds > 0, num_expected_pos,
+                                       generator)
+        num_sampled_pos = pos_mask.sum(dim=1)
+        num_expected_neg = self.num - num_sampled_pos
+        if self.neg_pos_ub >= 0:
+            neg_upper_bound = (self.neg_pos_ub *
+                               num_sampled_pos.clamp(min=1)).long()
+            num_expected_neg = torch.min(num_expected_neg, neg_upper_bound)
+        neg_mask = self._random_subset(gt_inds == 0, num_expected_neg,
+                                       generator)
+        return pos_mask, neg_mask
+
+    def _random_subset(self, mask, num, generator=None):
+        """Randomly keep at most ``num`` of the True entries of each row.
+
+        Args:
+            mask (Tensor): Bool mask of the gallery, shape (B, n).
+            num (int | Tensor): Number of entries to keep, shared or per row.
+            generator (torch.Generator, optional): Generator of the samples.
+                The random keys of a CUDA mask are drawn on its device.
+
+        Returns:
+            Tensor: Bool mask of the kept entries, shape (B, n).
+        """
+        num = torch.as_tensor(num, device=mask.device).expand(mask.size(0))
+        max_num = min(int(num.max()), mask.size(1)) if mask.numel() > 0 else 0
+        if max_num <= 0:
+            return torch.zeros_like(mask)
+        if not mask.is_cuda:
+            # without a device to keep in sync with, draw the samples of each
+            # row from its gallery
+            keep = torch.zeros_like(mask)
+            for row_keep, row_mask, row_num in zip(keep, mask, num.tolist()):
+                gallery = row_mask.nonzero(as_tuple=True)[0]
+                row_num = min(row_num, len(gallery))
+                if row_num > 0:
+                    row_keep[gallery[self._random_positions(
+                        len(gallery), row_num, generator)]] = True
+            return keep
+        # keep the gallery entries with the smallest random keys, the entries
+        # out of the gallery get a key no random key reaches
+        if generator is None:
+            keys = torch.rand(mask.shape, device=mask.device)
+        else:
+            keys = torch.rand(
+                mask.shape, generator=generator,
+                device=generator.device).to(mask.device)
+        keys.masked_fill_(~mask, 2)
+        rank_keys, rank_inds = keys.topk(max_num, dim=1, largest=False)
+        keep = (rank_keys < 2) & (torch.arange(
+            max_num, device=mask.device) < num[:, None])
+        return torch.zeros_like(mask).scatter_(1, rank_inds, keep)
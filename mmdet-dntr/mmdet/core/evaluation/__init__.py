@@ -4,6 +4,7 @@ from .class_names import (cityscapes_classes, coco_classes, dataset_aliases,
                           imagenet_vid_classes, oid_challenge_classes,
                           oid_v6_classes, voc_classes)
 from .eval_hooks import DistEvalHook, EvalHook
+from .incremental_coco_eval import IncrementalCocoEvaluator
 from .mean_ap import average_precision, eval_map, print_map_summary
 from .panoptic_utils import INSTANCE_OFFSET
 from .recall import (eval_recalls, plot_iou_recall, plot_num_recall,
@@ -15,5 +16,5 @@ __all__ = [
     'DistEvalHook', 'EvalHook', 'average_precision', 'eval_map',
     'print_map_summary', 'eval_recalls', 'print_recall_summary',
     'plot_num_recall', 'plot_iou_recall', 'oid_v6_classes',
-    'oid_challenge_classes', 'INSTANCE_OFFSET'
+    'oid_challenge_classes', 'INSTANCE_OFFSET', 'IncrementalCocoEvaluator'
 ]
@@ -0,0 +1,310 @@
+import copy
+import queue
+import threading
+
+import numpy as np
+
+try:
+    from aitodpycocotools.coco import COCO, makeResArrays
+    from aitodpycocotools.cocoeval import COCOeval
+except ImportError:
+    COCO = None
+    COCOeval = None
+    makeResArrays = None
+
+
+class IncrementalCocoEvaluator:
+    """Evaluate the detection results of a test loop batch by batch.
+
+    The results of each batch are matched to the gts of their images in a
+    background thread while the model runs on the next batches, so little
+    evaluation is left after the test loop. Only the per-image records read
+    by ``COCOeval.accumulate`` are kept: the scores, whether the detections
+    are matched or ignored at each IoU threshold as bits, the IoUs of the
+    matches at the first threshold for oLRP and the ignored gts. They are
+    kept for every category and area range, so they are not smaller than
+    the bbox results. The metrics equal those of ``dataset.evaluate`` on
+    all the results.
+
+    Only the bbox results of detectors are supported, e.g. not the proposals
+    of an RPN. The result format is checked on each batch and an error of
+    the background thread is raised by the next :meth:`process`.
+
+    Args:
+        dataset (AITODDataset): The test dataset.
+        metric (str | list[str]): Metrics to be evaluated, 'bbox' and
+            'proposal' are supported. Default: 'bbox'.
+        proposal_nums (Sequence[int]): Max number of detections per image,
+            as in ``dataset.evaluate``. Default: (100, 300, 1500).
+        iou_thrs (Sequence[float], optional): IoU thresholds, as in
+            ``dataset.evaluate``. Default: None.
+        max_pending (int): Max number of batches waiting for the background
+            thread, the test loop waits beyond. Default: 8.
+        eval_kwargs (dict): Other arguments of ``dataset.evaluate``, e.g.
+            ``classwise``. Those of the results, ``use_arrays``,
+            ``jsonfile_prefix`` and ``coco_evals``, are rejected as the
+            results are matched here.
+
+    Example:
+        >>> evaluator = IncrementalCocoEvaluator(dataset, metric='bbox')
+        >>> records = single_gpu_test(model, data_loader, evaluator=evaluator)
+        >>> eval_results = evaluator.evaluate(records)
+    """
+
+    supported_metrics = ('bbox', 'proposal')
+    # arguments of dataset.evaluate that only apply to the results
+    result_kwargs = ('use_arrays', 'jsonfile_prefix', 'coco_evals')
+
+    def __init__(self,
+                 dataset,
+                 metric='bbox',
+                 proposal_nums=(100, 300, 1500),
+                 iou_thrs=None,
+                 max_pending=8,
+                 **eval_kwargs):
+        if COCOeval is None:
+            raise ImportError('IncrementalCocoEvaluator requires '
+                              'aitodpycocotools to be installed')
+        # mmdet.datasets imports mmdet.core
+        from mmdet.datasets import AITODDataset
+        if not isinstance(dataset, AITODDataset):
+            raise TypeError('IncrementalCocoEvaluator requires an '
+                            f'AITODDataset, got {type(dataset).__name__}')
+        metrics = metric if isinstance(metric, list) else [metric]
+        for metric in metrics:
+            if metric not in self.supported_metrics:
+                raise KeyError(f'metric {metric} is not supported')
+        for key in self.result_kwargs:
+            if key in eval_kwargs:
+                raise ValueError(f'{key} is not supported by '
+                                 'IncrementalCocoEvaluator, the results are '
+                                 'matched batch by batch')
+        if iou_thrs is None:
+            iou_thrs = np.linspace(
+                .5, 0.95, int(np.round((0.95 - .5) / .05)) + 1, endpoint=True)
+        self.dataset = dataset
+        self.metrics = metrics
+        self.proposal_nums = proposal_nums
+        self.iou_thrs = iou_thrs
+        self.max_pending = max_pending
+        self.eval_kwargs = eval_kwargs
+        self._queue = None
+        self._thread = None
+        self._records = []
+        self._error = None
+
+    def process(self, results, img_inds):
+        """Queue the results of a batch for the background thread.
+
+        Args:
+            results (list[list | tuple]): Detection results of the batch.
+            img_inds (list[int]): Indices of the images of the batch in the
+                dataset.
+        """
+        if self._error is not None:
+            # stop the test loop at the first failed batch
+            self.wait()
+        self._check_results(results, img_inds)
+        if self._thread is None:
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            self._thread = threading.Thread(target=self._work, daemon=True)
+            self._thread.start()
+        self._queue.put((results, img_inds))
+
+    def wait(self):
+        """Wait for the background thread to match all the queued batches.
+
+        Returns:
+            list[tuple]: ``(img_id, img_records)`` of each processed image,
+            in the order of the batches.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        records, self._records = self._records, []
+        return records
+
+    def _check_results(self, results, img_inds):
+        """Check the results of a batch are bbox results of its images."""
+        if len(results) != len(img_inds):
+            raise ValueError(f'{len(results)} results for {len(img_inds)} '
+                             'images')
+        num_classes = len(self.dataset.cat_ids)
+        for result in results:
+            if isinstance(result, tuple):
+                result = result[0]
+            if not isinstance(result, list) or len(result) != num_classes:
+                raise TypeError(
+                    'IncrementalCocoEvaluator expects the bbox results of a '
+                    f'detector, a list of {num_classes} arrays per image, got '
+                    f'{type(result).__name__}. Evaluate the proposals of an '
+                    'RPN with dataset.evaluate.')
+
+    def _work(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            # after an error keep draining the queue, the test loop would
+            # wait forever on a full queue
+            if self._error is not None:
+                continue
+            results, img_inds = batch
+            try:
+                self._records.extend(
+                    self._match([self.dataset.img_ids[i] for i in img_inds],
+                                self.dataset._det2arrays(results, img_inds)))
+            except Exception as e:
+                self._error = e
+
+    def _coco_eval(self, metric, img_ids, coco_dt=None):
+        """COCOeval with the params ``dataset.evaluate`` would use."""
+        coco_eval = COCOeval(self.dataset.coco, coco_dt, 'bbox')
+        p = coco_eval.params
+        p.catIds = self.dataset.cat_ids
+        p.imgIds = list(np.unique(img_ids))
+        p.maxDets = sorted(self.proposal_nums)
+        p.iouThrs = self.iou_thrs
+        if metric == 'proposal':
+            p.useCats = 0
+        else:
+            p.catIds = list(np.unique(p.catIds))
+        return coco_eval
+
+    def _match(self, img_ids, det_arrays):
+        """Match the detections of some images to their gts.
+
+        Args:
+            img_ids (list[int]): Ids of the images.
+            det_arrays (tuple[np.ndarray]): Image ids, category ids, bboxes
+                and scores of their detections, see ``makeResArrays`` of
+                aitodpycocotools.
+
+        Returns:
+            list[tuple]: ``(img_id, img_records)`` of each image, the records
+            of each metric are ordered by category then area range.
+        """
+        coco_dt = COCO()
+        coco_dt.resArrays = makeResArrays(self.dataset.coco, *det_arrays)
+        img_records = {img_id: dict() for img_id in img_ids}
+        for metric in self.metrics:
+            coco_eval = self._coco_eval(metric, img_ids, coco_dt)
+            coco_eval._prepare()
+            _, eval_imgs = coco_eval._evaluateImgs()
+            sorted_img_ids = coco_eval.params.imgIds
+            num_areas = len(coco_eval.params.areaRng)
+            for i, img_id in enumerate(sorted_img_ids):
+                records = []
+                for n, eval_img in enumerate(
+                        eval_imgs[i::len(sorted_img_ids)]):
+                    # the sorted dts of a category are the same in all the
+                    # area ranges
+                    shared = records[-1] if n % num_areas else None
+                    records.append(
+                        self._compact(eval_img, shared and shared[0]))
+                img_records[img_id][metric] = records
+        return [(img_id, img_records[img_id]) for img_id in img_ids]
+
+    @staticmethod
+    def _compact(eval_img, scores=None):
+        """Keep the fields of an evalImg read by ``COCOeval.accumulate``.
+
+        Args:
+            eval_img (dict | None): An evalImg of ``COCOeval.evaluateImg``.
+            scores (np.ndarray, optional): Scores of its dts to share, those
+                of the same image and category in another area range.
+
+        Returns:
+            tuple | None: Scores of the dts, their matched and ignored flags
+            packed along the IoU thresholds, the IoUs of the dts matched at
+            the first threshold and the ignored flags of the gts.
+        """
+        if eval_img is None:
+            return None
+        if scores is None:
+            # the scores of the results are float32
+            scores = np.array(eval_img['dtScores'], dtype=np.float32)
+        matched = eval_img['dtMatches'] != 0
+        return (scores, np.packbits(matched, axis=0),
+                np.packbits(eval_img['dtIgnore'] != 0, axis=0),
+                eval_img['dtIoUs'][0, matched[0]],
+                eval_img['gtIgnore'] != 0)
+
+    @staticmethod
+    def _expand(record, num_thrs):
+        """The fields of an evalImg read by ``COCOeval.accumulate``."""
+        if record is None:
+            return None
+        scores, matched, ignored, ious, gt_ignored = record
+        matched = np.unpackbits(matched, axis=0, count=num_thrs) > 0
+        # only the IoUs of the matches at the first threshold are read
+        dt_ious = np.zeros((1, len(scores)))
+        dt_ious[0, matched[0]] = ious
+        return dict(
+            dtScores=scores,
+            dtMatches=matched,
+            dtIgnore=np.unpackbits(ignored, axis=0, count=num_thrs) > 0,
+            dtIoUs=dt_ious,
+            gtIgnore=gt_ignored)
+
+    def coco_evals(self, records):
+        """COCOeval of each metric with all the images evaluated.
+
+        The images without records, if any, are evaluated without
+        detections.
+
+        Args:
+            records (list[tuple]): Records of the images, as returned by
+                :meth:`wait` or gathered from all the ranks.
+
+        Returns:
+            dict[str, COCOeval]: COCOeval of each metric, ready for
+            ``accumulate``.
+        """
+        records = dict(records)
+        missing_img_ids = [
+            img_id for img_id in self.dataset.img_ids if img_id not in records
+        ]
+        if missing_img_ids:
+            no_dets = (np.zeros(0, dtype=np.int64),
+                       np.zeros(0, dtype=np.int64), np.zeros((0, 4)),
+                       np.zeros(0))
+            records.update(self._match(missing_img_ids, no_dets))
+        coco_evals = dict()
+        for metric in self.metrics:
+            coco_eval = self._coco_eval(metric, self.dataset.img_ids)
+            p = coco_eval.params
+            num_cats = len(p.catIds) if p.useCats else 1
+            # evalImgs are ordered by category, area range then image
+            coco_eval.evalImgs = [
+                self._expand(records[img_id][metric][n], len(p.iouThrs))
+                for n in range(num_cats * len(p.areaRng))
+                for img_id in p.imgIds
+            ]
+            coco_eval._paramsEval = copy.deepcopy(p)
+            coco_evals[metric] = coco_eval
+        return coco_evals
+
+    def evaluate(self, records, logger=None):
+        """Accumulate the records and report the metrics of the dataset.
+
+        Args:
+            records (list[tuple]): Records of the images, as returned by
+                :meth:`wait` or gathered from all the ranks.
+            logger (logging.Logger | str | None): Logger used for printing
+                related information during evaluation. Default: None.
+
+        Returns:
+            dict[str, float]: The metrics of ``dataset.evaluate``.
+        """
+        return self.dataset.evaluate([],
+                                     metric=self.metrics,
+                                     logger=logger,
+                                     proposal_nums=self.proposal_nums,
+                                     iou_thrs=self.iou_thrs,
+                                     coco_evals=self.coco_evals(records),
+                                     **self.eval_kwargs)
@@ -6,8 +6,10 @@ from collections import OrderedDict
 import numpy as np
 from mmcv.utils import print_log
 try:
+    from aitodpycocotools.coco import loadResArrays  # type: ignore
     from aitodpycocotools.cocoeval import COCOeval  # type: ignore
 except ImportError:
+    loadResArrays = None
     from pycocotools.cocoeval import COCOeval  # fallback when aitod tools unavailable
 from terminaltables import AsciiTable
 
@@ -31,7 +33,10 @@ class AITODDataset(CocoDataset):
                  proposal_nums=(100, 300, 1500),
                  iou_thrs=None,
                  metric_items=None,
-                 with_lrp=True):
+                 with_lrp=True,
+                 use_arrays=False,
+                 coco_evals=None,
+                 num_workers=1):
         """Evaluation in COCO protocol.
 
         Args:
@@ -58,6 +63,22 @@ class AITODDataset(CocoDataset):
                 used when ``metric=='proposal'``, ``['mAP', 'mAP_50', 'mAP_75',
                 'mAP_s', 'mAP_m', 'mAP_l']`` will be used when
                 ``metric=='bbox' or metric=='segm'``.
+            with_lrp (bool): Whether to compute the LRP metrics.
+                Default: True.
+            use_arrays (bool): Whether to pass the bbox results to COCOeval
+                as arrays, see ``loadResArrays`` of aitodpycocotools.
+                It skips the json files and the dict of every detection, the
+                'bbox' and 'proposal' metrics are the same. Default: False.
+            coco_evals (dict[str, COCOeval], optional): COCOeval of some
+                metrics whose images are already evaluated, e.g. by
+                :class:`IncrementalCocoEvaluator`. They are only accumulated
+                and summarized, the results are not used for these metrics.
+                Default: None.
+            num_workers (int): Number of processes of
+                ``COCOeval.evaluate`` of aitodpycocotools. If more than 1,
+                the images are evaluated in shards by worker processes forked
+                from this one, which only pays off with idle cores.
+                Default: 1.
 
         Returns:
             dict[str, float]: COCO style evaluation metric.
@@ -156,7 +177,24 @@ class AITODDataset(CocoDataset):
             if not isinstance(metric_items, list):
                 metric_items = [metric_items]
 
-        result_files, tmp_dir = self.format_results(results, jsonfile_prefix)
+        array_metrics = set()
+        if use_arrays:
+            if loadResArrays is None:
+                raise ImportError(
+                    'use_arrays requires aitodpycocotools to be installed')
+            if not isinstance(results[0], np.ndarray):
+                array_metrics = {'bbox', 'proposal'}
+        if num_workers > 1 and loadResArrays is None:
+            raise ImportError(
+                'num_workers requires aitodpycocotools to be installed')
+        if coco_evals is None:
+            coco_evals = dict()
+        if jsonfile_prefix is None and set(metrics) <= (
+                array_metrics | set(coco_evals) | {'proposal_fast'}):
+            result_files, tmp_dir = dict(), None
+        else:
+            result_files, tmp_dir = self.format_results(
+                results, jsonfile_prefix)
 
         eval_results = OrderedDict()
         cocoGt = self.coco
@@ -178,26 +216,39 @@ class AITODDataset(CocoDataset):
                 print_log(log_msg, logger=logger)
                 continue
 
-            if metric not in result_files:
-                raise KeyError(f'{metric} is not in results')
-            try:
-                cocoDt = cocoGt.loadRes(result_files[metric])
-            except IndexError:
-                print_log(
-                    'The testing results of the whole dataset is empty.',
-                    logger=logger,
-                    level=logging.ERROR)
-                break
+            if metric in coco_evals:
+                # the images are already evaluated
+                cocoEval = coco_evals[metric]
+            else:
+                if metric not in result_files and \
+                        metric not in array_metrics:
+                    raise KeyError(f'{metric} is not in results')
+                try:
+                    if metric in array_metrics:
+                        cocoDt = loadResArrays(cocoGt,
+                                               *self._det2arrays(results))
+                    else:
+                        cocoDt = cocoGt.loadRes(result_files[metric])
+                except IndexError:
+                    print_log(
+                        'The testing results of the whole dataset is empty.',
+                        logger=logger,
+                        level=logging.ERROR)
+                    break
 
-            iou_type = 'bbox' if metric == 'proposal' else metric
-            cocoEval = COCOeval(cocoGt, cocoDt, iou_type)
-            cocoEval.params.catIds = self.cat_ids
-            cocoEval.params.imgIds = self.img_ids
-            cocoEval.params.maxDets = list(proposal_nums)
-            cocoEval.params.iouThrs = iou_thrs
+                iou_type = 'bbox' if metric == 'proposal' else metric
+                cocoEval = COCOeval(cocoGt, cocoDt, iou_type)
+                cocoEval.params.catIds = self.cat_ids
+                cocoEval.params.imgIds = self.img_ids
+                cocoEval.params.maxDets = list(proposal_nums)
+                cocoEval.params.iouThrs = iou_thrs
+                if metric == 'proposal':
+                    cocoEval.params.useCats = 0
+                if num_workers > 1:
+                    cocoEval.evaluate(num_workers=num_workers)
+                else:
+                    cocoEval.evaluate()
             if metric == 'proposal':
-                cocoEval.params.useCats = 0
-                cocoEval.evaluate()
                 _accumulate_with_optional_lrp(cocoEval, with_lrp)
                 cocoEval.summarize()
                 custom_stats = len(cocoEval.stats) >= 19
@@ -226,7 +277,6 @@ class AITODDataset(CocoDataset):
                     val = float(f'{cocoEval.stats[stat_idx]:.3f}')
                     eval_results[item] = val
             else:
-                cocoEval.evaluate()
                 effective_with_lrp = _accumulate_with_optional_lrp(
                     cocoEval, with_lrp)
                 cocoEval.summarize()
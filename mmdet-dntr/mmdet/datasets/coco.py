@@ -19,6 +19,38 @@ from .builder import DATASETS
 from .custom import CustomDataset
 
 
+def det2arrays(results, img_ids, cat_ids):
+    """Convert detection results to the columns of a COCO result set.
+
+    The detections have the same order and values as the bbox results of
+    :meth:`CocoDataset.results2json`, without a dict per detection.
+
+    Args:
+        results (list[list | tuple]): Testing results of the images.
+        img_ids (list[int]): Image id of each result.
+        cat_ids (list[int]): Category id of each label.
+
+    Returns:
+        tuple[np.ndarray]: Image ids (n, ), category ids (n, ), bboxes
+            in ``xywh`` order (n, 4) and scores (n, ).
+    """
+    all_img_ids = [np.zeros(0, dtype=np.int64)]
+    all_cat_ids = [np.zeros(0, dtype=np.int64)]
+    bboxes = [np.zeros((0, 5))]
+    for img_id, result in zip(img_ids, results):
+        if isinstance(result, tuple):
+            result = result[0]
+        for label in range(len(result)):
+            num = result[label].shape[0]
+            all_img_ids.append(np.full(num, img_id, dtype=np.int64))
+            all_cat_ids.append(np.full(num, cat_ids[label], dtype=np.int64))
+            bboxes.append(result[label][:, :5])
+    bboxes = np.concatenate(bboxes).astype(np.float64)
+    bboxes[:, 2:4] -= bboxes[:, :2]
+    return (np.concatenate(all_img_ids), np.concatenate(all_cat_ids),
+            bboxes[:, :4], bboxes[:, 4])
+
+
 @DATASETS.register_module()
 class CocoDataset(CustomDataset):
 
@@ -291,6 +323,26 @@ class CocoDataset(CustomDataset):
                     segm_json_results.append(data)
         return bbox_json_results, segm_json_results
 
+    def _det2arrays(self, results, img_inds=None):
+        """Convert detection results to the columns of a COCO result set.
+
+        See :func:`det2arrays`.
+
+        Args:
+            results (list[list | tuple]): Testing results of the dataset.
+            img_inds (list[int], optional): Indices of the images of the
+                results in the dataset, e.g. those of a batch. Defaults to
+                all the images.
+
+        Returns:
+            tuple[np.ndarray]: Image ids (n, ), category ids (n, ), bboxes
+                in ``xywh`` order (n, 4) and scores (n, ).
+        """
+        img_ids = self.img_ids if img_inds is None else [
+            self.img_ids[idx] for idx in img_inds
+        ]
+        return det2arrays(results, img_ids, self.cat_ids)
+
     def results2json(self, results, outfile_prefix):
         """Dump the detection results to a COCO style json file.
 
@@ -16,6 +16,7 @@ from terminaltables import AsciiTable
 from mmdet.core import eval_recalls
 from .api_wrappers import COCO, COCOeval
 from .builder import DATASETS
+from .coco import det2arrays
 from .custom import CustomDataset
 
 
@@ -380,7 +381,8 @@ class VisdroneDataset(CustomDataset):
                           classwise=False,
                           proposal_nums=(100, 300, 1000),
                           iou_thrs=None,
-                          metric_items=None):
+                          metric_items=None,
+                          use_arrays=False):
         """Instance segmentation and object detection evaluation in COCO
         protocol.
 
@@ -408,6 +410,9 @@ class VisdroneDataset(CustomDataset):
                 used when ``metric=='proposal'``, ``['mAP', 'mAP_50', 'mAP_75',
                 'mAP_s', 'mAP_m', 'mAP_l']`` will be used when
                 ``metric=='bbox' or metric=='segm'``.
+            use_arrays (bool): Whether to load the bbox results from an array
+                of their ``[image_id, x, y, w, h, score, category_id]`` rows
+                instead of a json file. Default: False.
 
         Returns:
             dict[str, float]: COCO style evaluation metric.
@@ -441,10 +446,20 @@ class VisdroneDataset(CustomDataset):
                 continue
 
             iou_type = 'bbox' if metric == 'proposal' else metric
-            if metric not in result_files:
+            from_arrays = use_arrays and iou_type == 'bbox' and not isinstance(
+                results[0], np.ndarray)
+            if metric not in result_files and not from_arrays:
                 raise KeyError(f'{metric} is not in results')
             try:
-                predictions = mmcv.load(result_files[metric])
+                if from_arrays:
+                    # the rows COCO.loadRes accepts, without the json round
+                    # trip of the results
+                    img_ids, cat_ids, bboxes, scores = det2arrays(
+                        results, self.img_ids, self.cat_ids)
+                    predictions = np.column_stack(
+                        (img_ids, bboxes, scores, cat_ids))
+                else:
+                    predictions = mmcv.load(result_files[metric])
                 if iou_type == 'segm':
                     # Refer to https://github.com/cocodataset/cocoapi/blob/master/PythonAPI/pycocotools/coco.py#L331  # noqa
                     # When evaluating mask AP, if the results contain bbox,
@@ -585,7 +600,8 @@ class VisdroneDataset(CustomDataset):
                  classwise=False,
                  proposal_nums=(100, 300, 1000),
                  iou_thrs=None,
-                 metric_items=None):
+                 metric_items=None,
+                 use_arrays=False):
         """Evaluation in COCO protocol.
 
         Args:
@@ -612,6 +628,9 @@ class VisdroneDataset(CustomDataset):
                 used when ``metric=='proposal'``, ``['mAP', 'mAP_50', 'mAP_75',
                 'mAP_s', 'mAP_m', 'mAP_l']`` will be used when
                 ``metric=='bbox' or metric=='segm'``.
+            use_arrays (bool): Whether to evaluate the bbox results without
+                dumping them to json files, see :meth:`evaluate_det_segm`.
+                Default: False.
 
         Returns:
             dict[str, float]: COCO style evaluation metric.
@@ -626,11 +645,18 @@ class VisdroneDataset(CustomDataset):
         coco_gt = self.coco
         self.cat_ids = coco_gt.get_cat_ids(cat_names=self.CLASSES)
 
-        result_files, tmp_dir = self.format_results(results, jsonfile_prefix)
+        if use_arrays and jsonfile_prefix is None and not isinstance(
+                results[0], np.ndarray) and set(metrics) <= {
+                    'bbox', 'proposal', 'proposal_fast'
+                }:
+            result_files, tmp_dir = dict(), None
+        else:
+            result_files, tmp_dir = self.format_results(
+                results, jsonfile_prefix)
         eval_results = self.evaluate_det_segm(results, result_files, coco_gt,
                                               metrics, logger, classwise,
                                               proposal_nums, iou_thrs,
-                                              metric_items)
+                                              metric_items, use_arrays)
 
         if tmp_dir is not None:
             tmp_dir.cleanup()
@@ -206,7 +206,8 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
                             gt_labels,
                             img_meta,
                             label_channels=1,
-                            unmap_outputs=True):
+                            unmap_outputs=True,
+                            featmap_sizes=None):
         """Compute regression and classification targets for anchors in a
         single image.
 
@@ -226,6 +227,9 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
             label_channels (int): Channel of label.
             unmap_outputs (bool): Whether to map outputs back to the original
                 set of anchors.
+            featmap_sizes (list[tuple], optional): Feature map sizes of the
+                anchors. If given, the assigner only scores the anchors in a
+                window around each gt, see ``_get_candidate_inds``.
 
         Returns:
             tuple:
@@ -244,9 +248,19 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
         # assign gt and sample anchors
         anchors = flat_anchors[inside_flags, :]
 
-        assign_result = self.assigner.assign(
-            anchors, gt_bboxes, gt_bboxes_ignore,
-            None if self.sampling else gt_labels)
+        if featmap_sizes is None:
+            assign_result = self.assigner.assign(
+                anchors, gt_bboxes, gt_bboxes_ignore,
+                None if self.sampling else gt_labels)
+        else:
+            candidate_inds = self._get_candidate_inds(gt_bboxes, inside_flags,
+                                                      featmap_sizes)
+            assign_result = self.assigner.assign(
+                anchors,
+                gt_bboxes,
+                gt_bboxes_ignore,
+                None if self.sampling else gt_labels,
+                candidate_inds=candidate_inds)
         sampling_result = self.sampler.sample(assign_result, anchors,
                                               gt_bboxes)
 
@@ -296,6 +310,35 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
         return (labels, label_weights, bbox_targets, bbox_weights, pos_inds,
                 neg_inds, sampling_result)
 
+    def _get_candidate_inds(self, gt_bboxes, inside_flags, featmap_sizes):
+        """Indices of the anchors near each gt for the assigner.
+
+        Args:
+            gt_bboxes (Tensor): Ground truth bboxes of the image,
+                shape (num_gts, 4).
+            inside_flags (Tensor): Flags of the anchors passed to the
+                assigner, shape (num_anchors,).
+            featmap_sizes (list[tuple]): Feature map sizes of the anchors.
+
+        Returns:
+            Tensor: Indices into the anchors inside the image of shape
+                (num_gts, m), the anchors in a window of
+                ``assigner.candidate_radius`` around each gt center. Padded
+                with -1.
+        """
+        gt_centers = (gt_bboxes[:, :2] + gt_bboxes[:, 2:4]) / 2
+        candidate_inds = self.prior_generator.window_prior_inds(
+            gt_centers,
+            featmap_sizes,
+            self.assigner.candidate_radius,
+            device=gt_bboxes.device)
+        # map the indices of all anchors to the anchors inside the image
+        inside_inds = inside_flags.long().cumsum(0) - 1
+        inside_inds[~inside_flags] = -1
+        return torch.where(candidate_inds >= 0,
+                           inside_inds[candidate_inds.clamp(min=0)],
+                           candidate_inds)
+
     def get_targets(self,
                     anchor_list,
                     valid_flag_list,
@@ -305,7 +348,8 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
                     gt_labels_list=None,
                     label_channels=1,
                     unmap_outputs=True,
-                    return_sampling_results=False):
+                    return_sampling_results=False,
+                    featmap_sizes=None):
         """Compute regression and classification targets for anchors in
         multiple images.
 
@@ -326,6 +370,9 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
             label_channels (int): Channel of label.
             unmap_outputs (bool): Whether to map outputs back to the original
                 set of anchors.
+            featmap_sizes (list[tuple], optional): Feature map sizes of the
+                anchors, used when the assigner scores the anchors near each
+                gt only (``assigner.candidate_radius`` is set).
 
         Returns:
             tuple: Usually returns a tuple containing learning targets.
@@ -363,6 +410,10 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
             gt_bboxes_ignore_list = [None for _ in range(num_imgs)]
         if gt_labels_list is None:
             gt_labels_list = [None for _ in range(num_imgs)]
+        kwargs = dict()
+        if featmap_sizes is not None and getattr(
+                self.assigner, 'candidate_radius', None) is not None:
+            kwargs['featmap_sizes'] = featmap_sizes
         results = multi_apply(
             self._get_targets_single,
             concat_anchor_list,
@@ -372,7 +423,8 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
             gt_labels_list,
             img_metas,
             label_channels=label_channels,
-            unmap_outputs=unmap_outputs)
+            unmap_outputs=unmap_outputs,
+            **kwargs)
         (all_labels, all_label_weights, all_bbox_targets, all_bbox_weights,
          pos_inds_list, neg_inds_list, sampling_results_list) = results[:7]
         rest_results = list(results[7:])  # user-added return values
@@ -490,7 +542,8 @@ class AnchorHead(BaseDenseHead, BBoxTestMixin):
             img_metas,
             gt_bboxes_ignore_list=gt_bboxes_ignore,
             gt_labels_list=gt_labels,
-            label_channels=label_channels)
+            label_channels=label_channels,
+            featmap_sizes=featmap_sizes)
         if cls_reg_targets is None:
             return None
         (labels_list, label_weights_list, bbox_targets_list, bbox_weights_list,
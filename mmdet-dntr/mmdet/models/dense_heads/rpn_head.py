@@ -6,7 +6,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 from mmcv.cnn import ConvModule
 from mmcv.ops import batched_nms
+from torch.nn.utils.rnn import pad_sequence
 
+from mmdet.core import anchor_inside_flags, bbox_overlaps
 from ..builder import HEADS
 from .anchor_head import AnchorHead
 
@@ -100,6 +102,145 @@ class RPNHead(AnchorHead):
         return dict(
             loss_rpn_cls=losses['loss_cls'], loss_rpn_bbox=losses['loss_bbox'])
 
+    def get_targets(self,
+                    anchor_list,
+                    valid_flag_list,
+                    gt_bboxes_list,
+                    img_metas,
+                    gt_bboxes_ignore_list=None,
+                    gt_labels_list=None,
+                    label_channels=1,
+                    unmap_outputs=True,
+                    return_sampling_results=False,
+                    featmap_sizes=None):
+        """Compute regression and classification targets for anchors in
+        multiple images.
+
+        With ``train_cfg.batch_targets`` the anchors of all images are
+        assigned and sampled at once by ``assigner.assign_batch`` and
+        ``sampler.sample_batch``, see :meth:`_get_targets_batch`. Otherwise
+        the images are handled one by one as in :class:`AnchorHead`.
+        """
+        if not self.train_cfg.get('batch_targets', False):
+            return super(RPNHead, self).get_targets(
+                anchor_list,
+                valid_flag_list,
+                gt_bboxes_list,
+                img_metas,
+                gt_bboxes_ignore_list=gt_bboxes_ignore_list,
+                gt_labels_list=gt_labels_list,
+                label_channels=label_channels,
+                unmap_outputs=unmap_outputs,
+                return_sampling_results=return_sampling_results,
+                featmap_sizes=featmap_sizes)
+        assert unmap_outputs and not return_sampling_results, \
+            'batch_targets only returns the unmapped targets'
+        return self._get_targets_batch(
+            anchor_list,
+            valid_flag_list,
+            gt_bboxes_list,
+            img_metas,
+            gt_bboxes_ignore_list,
+            featmap_sizes=featmap_sizes)
+
+    def _get_targets_batch(self,
+                           anchor_list,
+                           valid_flag_list,
+                           gt_bboxes_list,
+                           img_metas,
+                           gt_bboxes_ignore_list=None,
+                           featmap_sizes=None):
+        """Compute the targets of all images in one set of tensor ops.
+
+        The gts are padded to the largest number of gts in the batch. The
+        targets equal those of :meth:`AnchorHead.get_targets` up to the
+        random sampling.
+
+        Args:
+            anchor_list (list[list[Tensor]]): Multi level anchors of each
+                image, the same for all images.
+            valid_flag_list (list[list[Tensor]]): Multi level valid flags of
+                each image.
+            gt_bboxes_list (list[Tensor]): Ground truth bboxes of each image.
+            img_metas (list[dict]): Meta info of each image.
+            gt_bboxes_ignore_list (list[Tensor], optional): Ground truth
+                bboxes to be ignored of each image.
+            featmap_sizes (list[tuple], optional): Feature map sizes of the
+                anchors, used to pass the candidate windows to the assigner
+                as in :meth:`AnchorHead.get_targets`.
+
+        Returns:
+            tuple: The targets of each level and the numbers of positive and
+                negative samples as in :meth:`AnchorHead.get_targets`, or
+                None if an image has no valid anchors.
+        """
+        num_level_anchors = [anchors.size(0) for anchors in anchor_list[0]]
+        flat_anchors = torch.cat(anchor_list[0])
+        inside_flags = torch.stack([
+            anchor_inside_flags(flat_anchors, torch.cat(valid_flags),
+                                img_meta['img_shape'][:2],
+                                self.train_cfg.allowed_border)
+            for valid_flags, img_meta in zip(valid_flag_list, img_metas)
+        ])
+        if not inside_flags.any(dim=1).all():
+            return None
+        num_imgs, num_anchors = inside_flags.shape
+        gt_bboxes = pad_sequence(gt_bboxes_list, batch_first=True)
+        num_gts = gt_bboxes.new_tensor([len(gts) for gts in gt_bboxes_list],
+                                       dtype=torch.long)
+        gt_valid = torch.arange(
+            gt_bboxes.size(1), device=gt_bboxes.device) < num_gts[:, None]
+
+        candidate_inds = None
+        if featmap_sizes is not None and getattr(
+                self.assigner, 'candidate_radius', None) is not None:
+            candidate_inds = [
+                self._get_candidate_inds(gts, flags, featmap_sizes)
+                for gts, flags in zip(gt_bboxes_list, inside_flags)
+            ]
+
+        # assign gt and sample anchors
+        anchors = flat_anchors.expand(num_imgs, num_anchors, 4)
+        gt_inds, _, _ = self.assigner.assign_batch(
+            anchors,
+            gt_bboxes,
+            gt_valid,
+            bbox_valid=inside_flags,
+            gt_bboxes_ignore=gt_bboxes_ignore_list,
+            candidate_inds=candidate_inds)
+        pos_mask, neg_mask = self.sampler.sample_batch(gt_inds)
+
+        labels = gt_inds.new_full((num_imgs, num_anchors), self.num_classes)
+        # Foreground is the first class since v2.5.0
+        labels[pos_mask] = 0
+        label_weights = pos_mask.new_zeros((num_imgs, num_anchors),
+                                           dtype=torch.float)
+        pos_weight = self.train_cfg.pos_weight
+        label_weights[pos_mask] = 1.0 if pos_weight <= 0 else pos_weight
+        label_weights[neg_mask] = 1.0
+        bbox_targets = torch.zeros_like(anchors)
+        bbox_weights = torch.zeros_like(anchors)
+        pos_img_inds, pos_anchor_inds = pos_mask.nonzero(as_tuple=True)
+        if pos_img_inds.numel() > 0:
+            pos_gt_bboxes = gt_bboxes[pos_img_inds, gt_inds[pos_mask] - 1]
+            if not self.reg_decoded_bbox:
+                pos_bbox_targets = self.bbox_coder.encode(
+                    flat_anchors[pos_anchor_inds], pos_gt_bboxes)
+            else:
+                pos_bbox_targets = pos_gt_bboxes
+            bbox_targets[pos_mask] = pos_bbox_targets
+            bbox_weights[pos_mask] = 1.0
+
+        # sampled anchors of all images
+        num_total_pos = int(pos_mask.sum(dim=1).clamp(min=1).sum())
+        num_total_neg = int(neg_mask.sum(dim=1).clamp(min=1).sum())
+        # split targets to a list w.r.t. multiple levels
+        return (list(labels.split(num_level_anchors, dim=1)),
+                list(label_weights.split(num_level_anchors, dim=1)),
+                list(bbox_targets.split(num_level_anchors, dim=1)),
+                list(bbox_weights.split(num_level_anchors, dim=1)),
+                num_total_pos, num_total_neg)
+
     def _get_bboxes_single(self,
                            cls_score_list,
                            bbox_pred_list,
@@ -135,6 +276,13 @@ class RPNHead(AnchorHead):
             Tensor: Labeled boxes in shape (n, 5), where the first 4 columns
                 are bounding box positions (tl_x, tl_y, br_x, br_y) and the
                 5-th column is a score between 0 and 1.
+
+        Note:
+            Besides an int, ``cfg.nms_pre`` may be a list or a dict mapping
+            the level index to the number of boxes kept in that level, the
+            levels missing from the dict keep all their boxes. The boxes with
+            a score not above ``cfg.score_thr`` (0 by default) are dropped
+            before the top-k.
         """
         cfg = self.test_cfg if cfg is None else cfg
         cfg = copy.deepcopy(cfg)
@@ -146,7 +294,7 @@ class RPNHead(AnchorHead):
         mlvl_scores = []
         mlvl_bbox_preds = []
         mlvl_valid_anchors = []
-        nms_pre = cfg.get('nms_pre', -1)
+        score_thr = cfg.get('score_thr', 0)
         for level_idx in range(len(cls_score_list)):
             rpn_cls_score = cls_score_list[level_idx]
             rpn_bbox_pred = bbox_pred_list[level_idx]
@@ -165,6 +313,13 @@ class RPNHead(AnchorHead):
             rpn_bbox_pred = rpn_bbox_pred.permute(1, 2, 0).reshape(-1, 4)
 
             anchors = mlvl_anchors[level_idx]
+            if score_thr > 0:
+                valid_inds = torch.nonzero(
+                    scores > score_thr, as_tuple=True)[0]
+                scores = scores[valid_inds]
+                rpn_bbox_pred = rpn_bbox_pred[valid_inds, :]
+                anchors = anchors[valid_inds, :]
+            nms_pre = self._level_nms_pre(cfg.get('nms_pre', -1), level_idx)
             if 0 < nms_pre < scores.shape[0]:
                 # sort is faster than topk
                 # _, topk_inds = scores.topk(cfg.nms_pre)
@@ -186,6 +341,15 @@ class RPNHead(AnchorHead):
                                        mlvl_valid_anchors, level_ids, cfg,
                                        img_shape)
 
+    @staticmethod
+    def _level_nms_pre(nms_pre, level_idx):
+        """The ``nms_pre`` of a level from an int, a list or a dict."""
+        if isinstance(nms_pre, dict):
+            return nms_pre.get(level_idx, -1)
+        if isinstance(nms_pre, (list, tuple)):
+            return nms_pre[level_idx]
+        return nms_pre
+
     def _bbox_post_process(self, mlvl_scores, mlvl_bboxes, mlvl_valid_anchors,
                            level_ids, cfg, img_shape, **kwargs):
         """bbox post-processing method.
@@ -228,13 +392,59 @@ class RPNHead(AnchorHead):
                 scores = scores[valid_mask]
                 ids = ids[valid_mask]
 
-        if proposals.numel() > 0:
-            dets, _ = batched_nms(proposals, scores, ids, cfg.nms)
-        else:
+        if proposals.numel() == 0:
             return proposals.new_zeros(0, 5)
+        if cfg.get('level_fast_nms', False):
+            dets = self._level_fast_nms(proposals, scores, ids,
+                                        cfg.nms.iou_threshold,
+                                        cfg.max_per_img)
+        else:
+            dets, _ = batched_nms(proposals, scores, ids, cfg.nms)
 
         return dets[:cfg.max_per_img]
 
+    @staticmethod
+    def _level_fast_nms(proposals, scores, ids, iou_thr, max_num=-1):
+        """Fast NMS in each level of the proposals.
+
+        The proposals of a level are contiguous, so each level is suppressed
+        on its own instead of offsetting the boxes of all levels as
+        :func:`batched_nms` does. As in the Fast NMS of `YOLACT
+        <https://arxiv.org/abs/1904.02689>`_ a box is dropped if it overlaps
+        any higher scored box of its level by more than ``iou_thr``, even a
+        dropped one, so it may keep fewer boxes than the standard NMS.
+
+        Args:
+            proposals (Tensor): Proposals grouped by level, shape (n, 4).
+            scores (Tensor): Scores of the proposals, shape (n, ).
+            ids (Tensor): Level of each proposal, shape (n, ).
+            iou_thr (float): IoU threshold of the NMS.
+            max_num (int): Number of boxes kept, -1 keeps all of them.
+
+        Returns:
+            Tensor: The kept boxes and their scores sorted by score, shape
+                (m, 5).
+        """
+        level_sizes = torch.bincount(ids).tolist()
+        keep_inds = []
+        start = 0
+        for level_size in level_sizes:
+            if level_size == 0:
+                continue
+            level_scores = scores[start:start + level_size]
+            order = level_scores.argsort(descending=True)
+            level_proposals = proposals[start:start + level_size][order]
+            ious = bbox_overlaps(level_proposals, level_proposals).triu_(1)
+            keep = ious.max(dim=0)[0] <= iou_thr
+            keep_inds.append(order[keep] + start)
+            start += level_size
+        keep_inds = torch.cat(keep_inds)
+        keep_scores, order = scores[keep_inds].sort(descending=True)
+        if max_num > 0:
+            keep_scores, order = keep_scores[:max_num], order[:max_num]
+        return torch.cat([proposals[keep_inds[order]], keep_scores[:, None]],
+                         dim=1)
+
     def onnx_export(self, x, img_metas):
         """Test without augmentation.
 
@@ -59,17 +59,28 @@ class Cosine_similarity(nn.Module):
         return out
 
 class Contrastive_Loss(nn.Module):
-    def __init__(self):
+    """Geometric and semantic contrastive losses of DN-FPN.
+
+    Args:
+        impl (str): 'loop' computes every pair with Cosine_similarity in
+            python loops, 'matrix' computes all pairs of the stacked
+            [S*B, 256] embeddings with one matmul. Both give the same
+            losses. Defaults to 'loop'.
+    """
+
+    def __init__(self, impl='loop'):
         super(Contrastive_Loss, self).__init__()
-        device = torch.device("cuda")
-        self.cos = Cosine_similarity().to(device)
-        self.loc_E = Encoder().to(device)
-        self.sem_E = Encoder().to(device)
+        assert impl in ('loop', 'matrix'), \
+            f'impl should be loop or matrix, got {impl}'
+        self.impl = impl
+        self.cos = Cosine_similarity()
+        self.loc_E = Encoder()
+        self.sem_E = Encoder()
         #### channel transfer for backbone features
         base_c = 256
-        self.channel_transfer = []
+        self.channel_transfer = nn.ModuleList()
         for cnt in range (4):
-            self.channel_transfer.append(nn.Conv2d(base_c*pow(2,cnt), base_c, kernel_size=1).to(device))
+            self.channel_transfer.append(nn.Conv2d(base_c*pow(2,cnt), base_c, kernel_size=1))
      # @torch.no_grad()
     # def init_weights(m,n):
     #     if type(m) == nn.Linear:
@@ -128,6 +139,10 @@ class Contrastive_Loss(nn.Module):
             semantic_b.append(self.sem_E(temp_b[i]))
             semantic.append(self.sem_E(self.x[i]))
 
+        if self.impl == 'matrix':
+            return self.matrix_forward(localization_b, localization,
+                                       semantic_b, semantic)
+
         # generate contrastive loss
         # geo_pos= 0
         # geo_neg= 0
@@ -197,6 +212,52 @@ class Contrastive_Loss(nn.Module):
         # print("sem_pos:",sem_pos,"sem_neg:",sem_neg) #6,24
         # print("geo_loss, sem_loss:",geo_loss, sem_loss)
         return geo_loss, sem_loss
+
+    def matrix_forward(self, localization_b, localization, semantic_b,
+                       semantic):
+        """Compute the same losses as the loops in ``forward`` from the
+        pairwise similarities of all embeddings at once.
+
+        Each argument is a list of S tensors of shape [B, 256], stacked
+        scale-major into [S*B, 256] so that row ``i*B + j`` is scale ``i``
+        of image ``j``.
+        """
+        scale_size = len(localization)
+        batch_size = len(localization[0])
+        device = localization[0].device
+        scale_idx = torch.arange(
+            scale_size, device=device).repeat_interleave(batch_size)
+        batch_idx = torch.arange(batch_size, device=device).repeat(scale_size)
+        diff_batch = batch_idx[:, None] != batch_idx[None, :]
+
+        def pairwise_sim(q, k):
+            q = nn.functional.normalize(q, dim=1)
+            k = nn.functional.normalize(k, dim=1)
+            return torch.exp(torch.mm(q, k.t()) / self.cos.temp)
+
+        # geometric: positive is the backbone feature of the same scale and
+        # image, negatives are both features of other scales and images
+        loc = torch.cat(localization)
+        loc_b = torch.cat(localization_b)
+        sim_b = pairwise_sim(loc, loc_b)
+        numerator = torch.diagonal(sim_b)
+        neg_mask = diff_batch & (scale_idx[:, None] != scale_idx[None, :])
+        denominator = numerator + (
+            (pairwise_sim(loc, loc) + sim_b) * neg_mask).sum(dim=1)
+        geo_loss = -torch.log(numerator / denominator).sum()
+
+        # semantic: positive is the next top-down scale of the same image,
+        # negatives are both features of any scale of other images
+        num_q = (scale_size - 1) * batch_size
+        sem = torch.cat(semantic)
+        sem_b = torch.cat(semantic_b)
+        sim = pairwise_sim(sem[:num_q], sem)
+        numerator = torch.diagonal(sim, offset=batch_size)
+        denominator = numerator + (
+            (sim + pairwise_sim(sem[:num_q], sem_b)) *
+            diff_batch[:num_q]).sum(dim=1)
+        sem_loss = -torch.log(numerator / denominator).sum()
+        return geo_loss, sem_loss
 ##############################################################################
 
 @DETECTORS.register_module()
@@ -245,8 +306,10 @@ class TwoStageDetector(BaseDetector):
         self.test_cfg = test_cfg
 
         ########################## add for CL part ##########################
-        device = torch.device("cuda")
-        self.contrastive_loss = Contrastive_Loss().to(device)
+        contrastive_cfg = dict()
+        if train_cfg is not None:
+            contrastive_cfg = train_cfg.get('contrastive_loss', dict())
+        self.contrastive_loss = Contrastive_Loss(**contrastive_cfg)
         # self.reconstruct = Reconstruct_Network().to(device)
         #####################################################################
 
@@ -267,10 +330,25 @@ class TwoStageDetector(BaseDetector):
     #         x = self.neck(x)
     #     return x
 
-    def extract_feat(self, img, filename):
+    def extract_feat(self, img, filename=None, return_backbone_feat=False):
     # def extract_feat(self, img):
-        """Directly extract features from the backbone+neck."""
+        """Directly extract features from the backbone+neck.
+
+        Args:
+            img (Tensor): of shape (N, C, H, W) encoding input images.
+            filename (str, optional): Image file name, only used when
+                visualizing the feature maps. Defaults to None.
+            return_backbone_feat (bool): Whether to also return the raw
+                backbone features, e.g. for the contrastive loss, so that
+                the backbone only runs once. Defaults to False.
+
+        Returns:
+            tuple[Tensor] | tuple[tuple[Tensor], tuple[Tensor]]: Neck
+                features, or (backbone features, neck features) if
+                ``return_backbone_feat`` is True.
+        """
         x = self.backbone(img)
+        x_b = x
 
         # 可视化resnet产生的特征
         # from tools.feature_visualization import draw_feature_map
@@ -293,6 +371,8 @@ class TwoStageDetector(BaseDetector):
             # from tools.feature_visualization import draw_feature_map
             # draw_feature_map(x, filename)
         # exit()
+        if return_backbone_feat:
+            return x_b, x
         return x
 
     def forward_dummy(self, img):
@@ -350,20 +430,18 @@ class TwoStageDetector(BaseDetector):
         Returns:
             dict[str, Tensor]: a dictionary of loss components
         """
-        filename = os.path.basename(img_metas[0]['ori_filename'])
-        x = self.extract_feat(img, filename)
+        filename = os.path.basename(img_metas[0].get('ori_filename', ''))
+        # one backbone pass feeds both the contrastive loss and the heads
+        x_b, x = self.extract_feat(img, filename, return_backbone_feat=True)
 
         losses = dict()
 
         ########################## add for CL part ###################################
-        device = torch.device("cuda")
-        x_b = self.backbone(img)
-        x = self.extract_feat(img, filename)
         geo_loss, sem_loss = self.contrastive_loss(x_b, x)
 
         # # print(geo_loss, sem_loss)
-        losses["geo_loss"] = (0.01*geo_loss).to(device)
-        losses["sem_loss"] = (0.01*sem_loss).to(device)
+        losses["geo_loss"] = 0.01*geo_loss
+        losses["sem_loss"] = 0.01*sem_loss
         # print(losses["loc_cl_loss"], losses["sem_cl_loss"])
         # print(losses)
         ########################## add for Reconstruct part ##########################
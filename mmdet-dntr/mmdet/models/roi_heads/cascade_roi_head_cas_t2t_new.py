@@ -2,7 +2,8 @@ import torch
 import torch.nn as nn
 from mmcv.runner import ModuleList
 
-from mmdet.core import (bbox2result, bbox2roi, bbox_mapping, build_assigner,
+from mmdet.core import (assign_and_sample, bbox2result, bbox2roi,
+                        bbox_mapping, build_assigner, build_gt_overlaps,
                         build_sampler, merge_aug_bboxes, merge_aug_masks,
                         multiclass_nms)
 from ..builder import HEADS, build_head, build_roi_extractor
@@ -214,8 +215,8 @@ class Cascade_t2t_new_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
         self.in_chans = 256
         self.token_dim = 100
         self.embed_dim = 128
-        self.bbox_token = [nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)).to(torch.device('cuda:0')) for _ in range(self.num_stages)]
-        self.cls_token = [nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)).to(torch.device('cuda:0')) for _ in range(self.num_stages)]
+        self.bbox_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)) for _ in range(self.num_stages)])
+        self.cls_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)) for _ in range(self.num_stages)])
         self.token_to_token = ModuleList([T2T_module(
                                 img_size=7, tokens_type='performer', in_chans=self.in_chans, embed_dim=self.embed_dim, token_dim=self.token_dim) for _ in range(self.num_stages)])
         self.t2t_bbox_head = ModuleList([nn.Linear(17*128, 4) for _ in range(self.num_stages)])
@@ -435,6 +436,8 @@ class Cascade_t2t_new_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
             dict[str, Tensor]: a dictionary of loss components
         """
         losses = dict()
+        # the gt side of the overlaps is shared by the stages
+        gt_overlaps = build_gt_overlaps(self.bbox_assigner, gt_bboxes)
         for i in range(self.num_stages):
             self.current_stage = i
             rcnn_train_cfg = self.train_cfg[i]
@@ -443,23 +446,15 @@ class Cascade_t2t_new_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
             # assign gts and sample proposals
             sampling_results = []
             if self.with_bbox or self.with_mask:
-                bbox_assigner = self.bbox_assigner[i]
-                bbox_sampler = self.bbox_sampler[i]
-                num_imgs = len(img_metas)
-                if gt_bboxes_ignore is None:
-                    gt_bboxes_ignore = [None for _ in range(num_imgs)]
-
-                for j in range(num_imgs):
-                    assign_result = bbox_assigner.assign(
-                        proposal_list[j], gt_bboxes[j], gt_bboxes_ignore[j],
-                        gt_labels[j])
-                    sampling_result = bbox_sampler.sample(
-                        assign_result,
-                        proposal_list[j],
-                        gt_bboxes[j],
-                        gt_labels[j],
-                        feats=[lvl_feat[j][None] for lvl_feat in x])
-                    sampling_results.append(sampling_result)
+                sampling_results = assign_and_sample(
+                    self.bbox_assigner[i],
+                    self.bbox_sampler[i],
+                    proposal_list,
+                    gt_bboxes,
+                    gt_labels,
+                    gt_bboxes_ignore,
+                    feats=x,
+                    gt_overlaps=gt_overlaps)
 
             # bbox head forward and loss
             bbox_results = self._bbox_forward_train(i, x, sampling_results,
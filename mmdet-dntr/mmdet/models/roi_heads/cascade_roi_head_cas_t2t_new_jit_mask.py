@@ -5,7 +5,8 @@ import numpy as np
 from numba import jit
 from mmcv.runner import ModuleList
 
-from mmdet.core import (bbox2result, bbox2roi, bbox_mapping, build_assigner,
+from mmdet.core import (assign_and_sample, bbox2result, bbox2roi,
+                        bbox_mapping, build_assigner, build_gt_overlaps,
                         build_sampler, merge_aug_bboxes, merge_aug_masks,
                         multiclass_nms)
 from ..builder import HEADS, build_head, build_roi_extractor
@@ -17,7 +18,8 @@ from .t2t_models.t2t_vit import T2T_module
 ####### evit topk model ######
 import math
 from functools import partial
-from .evit.helpers import complement_idx
+from .evit.helpers import (complement_idx, pair_token_idx,
+                           task_token_attention)
 ##############################
 
 
@@ -123,8 +125,10 @@ class Attention(nn.Module):
 
 ## no topK , only reture atten score
 class Token_Pair_Attention(nn.Module):
-    def __init__(self, dim, num_heads=8, qkv_bias=False, attn_drop=0., proj_drop=0.,):
+    def __init__(self, dim, num_heads=8, qkv_bias=False, attn_drop=0., proj_drop=0., attn_impl='explicit'):
         super().__init__()
+        assert attn_impl in ('explicit', 'sdpa'), f'unknown attn_impl {attn_impl}'
+        self.attn_impl = attn_impl
         self.num_heads = num_heads
         head_dim = dim // num_heads
         self.scale = head_dim ** -0.5
@@ -140,6 +144,15 @@ class Token_Pair_Attention(nn.Module):
         qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
         q, k, v = qkv[0], qkv[1], qkv[2]   # make torchscript happy (cannot use tensor as tuple)
 
+        if self.attn_impl == 'sdpa':
+            # only the rows of the cls and box tokens are computed explicitly
+            x, task_attn = task_token_attention(
+                q, k, v, self.scale, self.attn_drop, mask_task_pair=True, return_task_attn=True)
+            x = x.transpose(1, 2).reshape(B, N, C)
+            x = self.proj(x)
+            x = self.proj_drop(x)
+            task_attn = task_attn[:, :, :, 2:].mean(dim=1)  # [B, 2, N-2]
+            return x, task_attn[:, 0], task_attn[:, 1]
 
         attn = (q @ k.transpose(-2, -1)) * self.scale
         attn[:,:,0,1] = 0  # cls see box as 0
@@ -167,35 +180,15 @@ class Token_Pair_Attention(nn.Module):
 
         return  x, cls_attn, box_attn
 
-## pair the class and bbox token
-## return cls + cls_g token and bbox + bbox_g token
-# @jit()
-def gpu_pair(token_compare, index, B, N):
-    # id = cuda.threadIdx.x + cuda.blockDim.x * cuda.blockIdx.x
-
-    idx = np.zeros([B,N-1],dtype=np.int64)
-
-    for b in range(B):
-      box_token_cnt = 0
-      cls_token_cnt = 15
-      for j in index[b]:
-          if token_compare[b,j]:
-              idx[b,box_token_cnt] = int(j)
-              box_token_cnt += 1
-          else:
-              idx[b,cls_token_cnt] = int(j)
-              cls_token_cnt -= 1
-    return idx
-
 class Token_pair_block(nn.Module):
 
     def __init__(self, dim, num_heads, mlp_ratio=4., qkv_bias=False, drop=0., attn_drop=0.,
-                 drop_path=0., act_layer=nn.GELU, norm_layer=nn.LayerNorm,
+                 drop_path=0., act_layer=nn.GELU, norm_layer=nn.LayerNorm, attn_impl='explicit',
                  ):
         super().__init__()
         self.norm1 = norm_layer(dim)
         self.attn = Token_Pair_Attention(dim, num_heads=num_heads, qkv_bias=qkv_bias,
-                              attn_drop=attn_drop, proj_drop=drop)
+                              attn_drop=attn_drop, proj_drop=drop, attn_impl=attn_impl)
         # NOTE: drop path for stochastic depth, we shall see if this is better than dropout here
         self.drop_path = DropPath(drop_path) if drop_path > 0. else nn.Identity()
         self.norm2 = norm_layer(dim)
@@ -203,7 +196,8 @@ class Token_pair_block(nn.Module):
         self.mlp = Mlp(in_features=dim, hidden_features=mlp_hidden_dim, act_layer=act_layer, drop=drop)
         self.mlp_hidden_dim = mlp_hidden_dim
 
-    def forward(self, general_token , cls_token , box_token, keep_rate=None, tokens=None, get_idx=False):
+    def forward(self, general_token , cls_token , box_token, keep_rate=None, tokens=None, get_idx=False,
+                return_attn=False):
 
         # cls_fuse_general = torch.cat((cls_token, general_token), dim=1)
         # box_fuse_general = torch.cat((box_token, general_token), dim=1)
@@ -256,43 +250,104 @@ class Token_pair_block(nn.Module):
         # start = time.time()
         token_compare = torch.gt(box_attn,cls_attn) # True if (box_attn>cls_attn)
 
-        index = index.cpu().numpy()
-        token_compare = token_compare.cpu().numpy()
+        pair_idx = pair_token_idx(token_compare, index)
+        idx = pair_idx.unsqueeze(-1).expand(-1, -1, C)
 
+        cat_token = torch.gather(general_token,dim=1,index=idx)
 
+        # print(cls_token.size())
 
-        # start = time.time()
-        # idx = np.zeros([B,N-1],dtype=np.int64)
-        # for b in range(B) :
-        #     box_token_cnt = 0
-        #     cls_token_cnt = 15
-        #     for i in index[b] :
+        cls_task_token = torch.cat((cls_token,cat_token[:,0:8,:]),dim=1)
+        box_task_token = torch.cat((box_token,cat_token[:,8:16,:]),dim=1)
 
+        if return_attn:
+            # attention of each task token to the general tokens it is paired with
+            cls_task_attn = torch.gather(cls_attn, dim=1, index=pair_idx[:, 0:8])
+            box_task_attn = torch.gather(box_attn, dim=1, index=pair_idx[:, 8:16])
+            return cls_task_token, box_task_token, cls_task_attn, box_task_attn
 
-        #         if token_compare[b,i]: #> cls_attn[b,i]:
+        return cls_task_token , box_task_token
 
-        #             idx[b,box_token_cnt] = int(i)
-        #             box_token_cnt += 1
-        #         else:
-        #             idx[b,cls_token_cnt] = int(i)
-        #             cls_token_cnt -= 1
 
+class T2T_stage_core(nn.Module):
+    """T2T path of one cascade stage, RoI features -> (cls_score, bbox_pred).
 
-        idx = gpu_pair(token_compare,index,B,N)
-        # end = time.time()
-        # print('time:',end-start)
-        idx = torch.from_numpy(idx).to(torch.device('cuda'))
-        idx = idx.unsqueeze(-1).expand(-1, -1, C)
+    It holds the modules of the stage of a roi head and has no host syncs or
+    data-dependent control flow, so it can be traced with torch.jit.trace or
+    compiled with torch.compile. The shuffle of the T2T module is an input,
+    a traced core still shuffles the tokens differently on each call.
+    With ``with_heads=False`` it stops before the t2t heads and returns the
+    paired cls and box tokens instead.
+    """
 
-        cat_token = torch.gather(general_token,dim=1,index=idx)
+    def __init__(self, roi_head, stage, keep_rate=1., with_heads=True):
+        super().__init__()
+        self.token_to_token = roi_head.token_to_token[stage]
+        self.token_pair = roi_head.token_pair[stage]
+        self.t2t_cls_head = roi_head.t2t_cls_head[stage]
+        self.t2t_bbox_head = roi_head.t2t_bbox_head[stage]
+        self.cls_token = roi_head.cls_token[stage]
+        self.bbox_token = roi_head.bbox_token[stage]
+        self.keep_rate = keep_rate
+        self.with_heads = with_heads
 
-        # print(cls_token.size())
+    @staticmethod
+    def mask_task_tokens(task_token, task_attn, keep_rate):
+        """Mask the general tokens a task token attends least to.
 
-        cls_task_token = torch.cat((cls_token,cat_token[:,0:8,:]),dim=1)
-        box_task_token = torch.cat((box_token,cat_token[:,8:16,:]),dim=1)
+        The general tokens out of the top ``keep_rate`` of ``task_attn``
+        are zeroed in place of being dropped, so the shape is kept. This is
+        a masking mode, not a speed-up.
 
+        Args:
+            task_token (Tensor): Task token followed by its general tokens,
+                with shape (num_rois, 1 + num_general, C).
+            task_attn (Tensor): Attention of the task token to each of its
+                general tokens, with shape (num_rois, num_general).
+            keep_rate (float): Rate of general tokens to keep.
 
-        return cls_task_token , box_task_token
+        Returns:
+            Tensor: Tokens of the same shape, with the masked general tokens
+            zeroed.
+        """
+        num_general = task_attn.shape[1]
+        left_tokens = math.ceil(keep_rate * num_general)
+        if left_tokens >= num_general:
+            return task_token
+        _, keep = torch.topk(task_attn, left_tokens, dim=1)
+        keep_mask = task_attn.new_zeros(task_attn.shape).scatter_(1, keep, 1.)
+        general_token = task_token[:, 1:] * keep_mask.unsqueeze(-1)
+        return torch.cat((task_token[:, 0:1], general_token), dim=1)
+
+    def forward(self, bbox_feats, shuffle_index):
+        ####### t2t_module #######
+        cls_token = self.cls_token.expand(bbox_feats.shape[0], -1, -1)
+        bbox_token = self.bbox_token.expand(bbox_feats.shape[0], -1, -1)
+        t2t_feats, cls_token, bbox_token = self.token_to_token(
+            bbox_feats, cls_token=cls_token, bbox_token=bbox_token, random_shuffle_forward=True,
+            shuffle_index=shuffle_index)
+
+        ######### token pairing #############
+        if self.keep_rate < 1:
+            t2t_feats_cls, t2t_feats_bbox, cls_task_attn, box_task_attn = self.token_pair(
+                general_token=t2t_feats, cls_token=cls_token, box_token=bbox_token, return_attn=True)
+            t2t_feats_cls = self.mask_task_tokens(t2t_feats_cls, cls_task_attn, self.keep_rate)
+            t2t_feats_bbox = self.mask_task_tokens(t2t_feats_bbox, box_task_attn, self.keep_rate)
+        else:
+            t2t_feats_cls, t2t_feats_bbox = self.token_pair(
+                general_token=t2t_feats, cls_token=cls_token, box_token=bbox_token)
+
+        if not self.with_heads:
+            return t2t_feats_cls, t2t_feats_bbox
+        return self.heads(self.t2t_cls_head, self.t2t_bbox_head,
+                          t2t_feats_cls, t2t_feats_bbox)
+
+    @staticmethod
+    def heads(t2t_cls_head, t2t_bbox_head, t2t_feats_cls, t2t_feats_bbox):
+        """Apply the t2t heads to the paired cls and box tokens."""
+        cls_score = t2t_cls_head(torch.flatten(t2t_feats_cls, start_dim=1))
+        bbox_pred = t2t_bbox_head(torch.flatten(t2t_feats_bbox, start_dim=1))
+        return cls_score, bbox_pred
 
 
 class Block(nn.Module):
@@ -349,6 +404,8 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
     https://arxiv.org/abs/1712.00726
     """
 
+    min_roi_chunk_size = 16
+
     def __init__(self,
                  num_stages,
                  stage_loss_weights,
@@ -360,14 +417,43 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
                  train_cfg=None,
                  test_cfg=None,
                  pretrained=None,
-                 init_cfg=None):
+                 init_cfg=None,
+                 roi_chunk_size=None,
+                 attn_impl='explicit',
+                 shuffle_in_eval=True,
+                 shuffle_seed=None):
+        """
+        Args:
+            roi_chunk_size (int, optional): If set, the RoIs go through the
+                T2T module and the token pairing in chunks of at most this
+                size, which bounds the peak memory of the unfolded tokens.
+                It must be at least ``min_roi_chunk_size`` and a smaller last
+                chunk is merged into the previous one, the GEMMs of a few
+                rows use other kernels that round differently. The t2t heads
+                still run on all the RoIs at once, so the outputs do not
+                change. Defaults to None (all RoIs at once).
+            attn_impl (str): Attention backend of the T2T module and the
+                token pairing, 'explicit' builds the full attention matrix
+                and 'sdpa' uses the fused scaled dot product attention.
+                Both give the same results. Defaults to 'explicit'.
+            shuffle_in_eval (bool): Whether the T2T module shuffles the
+                kernel positions of the tokens in eval mode as well.
+                Defaults to True.
+            shuffle_seed (int, optional): Seed of the generator of the
+                shuffle, stage i uses ``shuffle_seed + i``. Defaults to None
+                (global torch RNG).
+        """
         assert bbox_roi_extractor is not None
         assert bbox_head is not None
         assert shared_head is None, \
             'Shared head is not supported in Cascade RCNN anymore'
+        assert roi_chunk_size is None or \
+            roi_chunk_size >= self.min_roi_chunk_size, \
+            f'roi_chunk_size must be at least {self.min_roi_chunk_size}'
 
         self.num_stages = num_stages
         self.stage_loss_weights = stage_loss_weights
+        self.roi_chunk_size = roi_chunk_size
         super(Cascade_t2t_new_jit_mask_RoIHead, self).__init__(
             bbox_roi_extractor=bbox_roi_extractor,
             bbox_head=bbox_head,
@@ -378,6 +464,8 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
             test_cfg=test_cfg,
             pretrained=pretrained,
             init_cfg=init_cfg)
+        # traced or compiled T2T_stage_core, see _get_t2t_core
+        self._t2t_cores = {}
 
         ####### t2t_module #######
         # self.token_to_token = T2T_module(
@@ -389,16 +477,20 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
         self.in_chans = 256
         self.token_dim = 100
         self.embed_dim = 128
-        self.bbox_token = [nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)).to(torch.device('cuda')) for _ in range(self.num_stages)]
-        self.cls_token = [nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)).to(torch.device('cuda')) for _ in range(self.num_stages)]
+        self.bbox_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)) for _ in range(self.num_stages)])
+        self.cls_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)) for _ in range(self.num_stages)])
         self.token_to_token = ModuleList([T2T_module(
-                                img_size=7, tokens_type='transformer', in_chans=self.in_chans, embed_dim=self.embed_dim, token_dim=self.token_dim, mask=True) for _ in range(self.num_stages)])
+                                img_size=7, tokens_type='transformer', in_chans=self.in_chans, embed_dim=self.embed_dim, token_dim=self.token_dim, mask=True,
+                                attn_impl=attn_impl, shuffle_in_eval=shuffle_in_eval,
+                                shuffle_seed=None if shuffle_seed is None else shuffle_seed + i)
+                                for i in range(self.num_stages)])
         self.t2t_bbox_head = ModuleList([nn.Linear(9*128, 4) for _ in range(self.num_stages)])
         # norm_layer = partial(nn.LayerNorm, eps=1e-6)
 
 
         ## do the bipartite token pair ##
-        self.token_pair = ModuleList([Token_pair_block(dim=self.embed_dim, num_heads=t2t_token)  for _ in range(self.num_stages)])
+        self.token_pair = ModuleList([Token_pair_block(dim=self.embed_dim, num_heads=t2t_token, attn_impl=attn_impl)
+                                      for _ in range(self.num_stages)])
 
         # self.blk = Block(keep_rate=0.7, fuse_token=True)
         # self.cls_blk = ModuleList([Block(dim=self.embed_dim, num_heads=t2t_token, keep_rate=self.keep_rate, fuse_token=True) for _ in range(self.num_stages)])
@@ -498,50 +590,99 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
         # do not support caffe_c4 model anymore
         # cls_score, bbox_pred = bbox_head(bbox_feats)
 
-        ####### t2t_module #######
-        token_to_token = self.token_to_token[stage]
-        # bbox_blk = self.bbox_blk[stage]
-        t2t_bbox_head = self.t2t_bbox_head[stage]
-
-        # cls_blk = self.cls_blk[stage]
-        t2t_cls_head = self.t2t_cls_head[stage]
-
-        cls_token = self.cls_token[stage].expand(bbox_feats.shape[0], -1, -1)
-        bbox_token = self.bbox_token[stage].expand(bbox_feats.shape[0], -1, -1)
-        token_pair = self.token_pair[stage]
-
-        t2t_feats, cls_token, bbox_token = token_to_token(bbox_feats, cls_token=cls_token, bbox_token=bbox_token, random_shuffle_forward=True)
-
-        ######### token pairing #############
-        t2t_feats_cls, t2t_feats_bbox = token_pair(general_token=t2t_feats, cls_token=cls_token, box_token=bbox_token)
-
-        # print('cls_token:',t2t_feats_cls.size())
-        ########## evit topk ##########
-        # t2t_feats_cls = torch.cat((cls_token, t2t_feats), dim=1)
-        # t2t_feats_cls, cls_n_token, cls_token_idx = cls_blk(t2t_feats_cls)
-        ################################
-        # t2t_feats_cls = self.norm(t2t_feats_cls)
-        # t2t_feats_cls = t2t_feats_cls[:, 0]
-        t2t_feats_cls = torch.flatten(t2t_feats_cls, start_dim=1)
-        cls_score = t2t_cls_head(t2t_feats_cls)
-
-        ########## evit topk ##########
-        # t2t_feats_bbox = torch.cat((bbox_token, t2t_feats), dim=1)
-        # t2t_feats_bbox, bbox_n_token, bbox_token_idx = bbox_blk(t2t_feats_bbox)
-        ################################
-        # t2t_feats_bbox = self.norm(t2t_feats_bbox)
-        # t2t_feats_bbox = t2t_feats_bbox[:, 0]
-        t2t_feats_bbox = torch.flatten(t2t_feats_bbox, start_dim=1)
-        bbox_pred = t2t_bbox_head(t2t_feats_bbox)
-
-        # print("cls_score:", cls_score.size())
-        # bbox_pred = self.t2t_bbox_head(t2t_feats)
-        ##########################
+        # all chunks must share the shuffle of the T2T module
+        shuffle_index = self.token_to_token[stage].get_shuffle_index()
+        if self.roi_chunk_size is None or \
+                bbox_feats.size(0) <= self.roi_chunk_size:
+            cls_score, bbox_pred = self._t2t_forward(stage, bbox_feats,
+                                                     shuffle_index)
+        else:
+            num_chunks, last_size = divmod(bbox_feats.size(0),
+                                           self.roi_chunk_size)
+            split_sizes = [self.roi_chunk_size] * num_chunks
+            if last_size >= self.min_roi_chunk_size:
+                split_sizes.append(last_size)
+            else:
+                split_sizes[-1] += last_size
+            t2t_core = self._get_t2t_core(
+                stage, bbox_feats, shuffle_index, with_heads=False)
+            chunk_tokens = [
+                t2t_core(chunk_feats, shuffle_index)
+                for chunk_feats in bbox_feats.split(split_sizes)
+            ]
+            # the heads are small, they run once on all the RoIs because
+            # their GEMMs may round differently on fewer rows
+            cls_score, bbox_pred = T2T_stage_core.heads(
+                self.t2t_cls_head[stage], self.t2t_bbox_head[stage],
+                torch.cat([tokens[0] for tokens in chunk_tokens]),
+                torch.cat([tokens[1] for tokens in chunk_tokens]))
 
         bbox_results = dict(
             cls_score=cls_score, bbox_pred=bbox_pred, bbox_feats=bbox_feats)
         return bbox_results
 
+    def _t2t_forward(self, stage, bbox_feats, shuffle_index):
+        """Run the T2T module, the token pairing and the t2t heads."""
+        t2t_core = self._get_t2t_core(stage, bbox_feats, shuffle_index)
+        return t2t_core(bbox_feats, shuffle_index)
+
+    def _get_t2t_core(self, stage, bbox_feats, shuffle_index,
+                      with_heads=True):
+        """Get the T2T path of a stage for the backend of the test_cfg.
+
+        ``test_cfg.t2t_backend`` is 'eager' (default), 'jit' for a
+        ``torch.jit.trace`` of :class:`T2T_stage_core` or 'compile' for
+        ``torch.compile`` with the kwargs in ``test_cfg.t2t_compile_cfg``.
+        The cores are built on first use and cached per stage, keep rate and
+        ``with_heads``, the traced or compiled ones also per device and
+        shuffle mode. Training always runs eagerly.
+        """
+        keep_rate = self._token_keep_rate(stage)
+        backend = 'eager'
+        if not self.training and self.test_cfg is not None:
+            backend = self.test_cfg.get('t2t_backend', 'eager')
+        assert backend in ('eager', 'jit', 'compile'), \
+            f'unknown t2t_backend {backend}'
+        if backend == 'eager':
+            # the core only holds the modules of the stage, it follows the
+            # train/eval mode and the device of the roi head
+            key = (stage, keep_rate, backend, with_heads)
+            if key not in self._t2t_cores:
+                self._t2t_cores[key] = T2T_stage_core(self, stage, keep_rate,
+                                                      with_heads)
+            return self._t2t_cores[key]
+
+        key = (stage, keep_rate, backend, bbox_feats.device,
+               self.token_to_token[stage].shuffle_in_eval, with_heads)
+        if key not in self._t2t_cores:
+            t2t_core = T2T_stage_core(self, stage, keep_rate,
+                                      with_heads).eval()
+            if backend == 'jit':
+                with torch.no_grad():
+                    t2t_core = torch.jit.trace(
+                        t2t_core, (bbox_feats, shuffle_index),
+                        check_trace=False)
+            else:
+                compile_cfg = self.test_cfg.get('t2t_compile_cfg', dict())
+                t2t_core = torch.compile(t2t_core, dynamic=True, **compile_cfg)
+            self._t2t_cores[key] = t2t_core
+        return self._t2t_cores[key]
+
+    def _token_keep_rate(self, stage):
+        """Rate of general tokens the t2t heads of a stage do not mask.
+
+        Token masking is a test-time mode, ``test_cfg.token_keep_rate`` is
+        either a float shared by all stages or a list with one rate per stage.
+        """
+        if self.training or self.test_cfg is None:
+            return 1.
+        keep_rate = self.test_cfg.get('token_keep_rate', 1.)
+        if isinstance(keep_rate, (list, tuple)):
+            keep_rate = keep_rate[stage]
+        assert 0 < keep_rate <= 1, \
+            f'token_keep_rate must be in (0, 1], got {keep_rate}'
+        return keep_rate
+
     def _bbox_forward_train(self, stage, x, sampling_results, gt_bboxes,
                             gt_labels, rcnn_train_cfg):
         """Run forward function and calculate loss for box head in training."""
@@ -619,6 +760,8 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
             dict[str, Tensor]: a dictionary of loss components
         """
         losses = dict()
+        # the gt side of the overlaps is shared by the stages
+        gt_overlaps = build_gt_overlaps(self.bbox_assigner, gt_bboxes)
         for i in range(self.num_stages):
             self.current_stage = i
             rcnn_train_cfg = self.train_cfg[i]
@@ -627,23 +770,15 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
             # assign gts and sample proposals
             sampling_results = []
             if self.with_bbox or self.with_mask:
-                bbox_assigner = self.bbox_assigner[i]
-                bbox_sampler = self.bbox_sampler[i]
-                num_imgs = len(img_metas)
-                if gt_bboxes_ignore is None:
-                    gt_bboxes_ignore = [None for _ in range(num_imgs)]
-
-                for j in range(num_imgs):
-                    assign_result = bbox_assigner.assign(
-                        proposal_list[j], gt_bboxes[j], gt_bboxes_ignore[j],
-                        gt_labels[j])
-                    sampling_result = bbox_sampler.sample(
-                        assign_result,
-                        proposal_list[j],
-                        gt_bboxes[j],
-                        gt_labels[j],
-                        feats=[lvl_feat[j][None] for lvl_feat in x])
-                    sampling_results.append(sampling_result)
+                sampling_results = assign_and_sample(
+                    self.bbox_assigner[i],
+                    self.bbox_sampler[i],
+                    proposal_list,
+                    gt_bboxes,
+                    gt_labels,
+                    gt_bboxes_ignore,
+                    feats=x,
+                    gt_overlaps=gt_overlaps)
 
             # bbox head forward and loss
             bbox_results = self._bbox_forward_train(i, x, sampling_results,
@@ -692,16 +827,19 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
         ms_segm_result = {}
         ms_scores = []
         rcnn_test_cfg = self.test_cfg
+        stage_pruning = None
+        if rcnn_test_cfg is not None:
+            stage_pruning = rcnn_test_cfg.get('stage_roi_pruning', None)
 
         rois = bbox2roi(proposal_list)
+        num_proposals_per_img = tuple(
+            len(proposals) for proposals in proposal_list)
         for i in range(self.num_stages):
             bbox_results = self._bbox_forward(i, x, rois)
 
             # split batch bbox prediction back to each image
             cls_score = bbox_results['cls_score']
             bbox_pred = bbox_results['bbox_pred']
-            num_proposals_per_img = tuple(
-                len(proposals) for proposals in proposal_list)
             rois = rois.split(num_proposals_per_img, 0)
             cls_score = cls_score.split(num_proposals_per_img, 0)
             if isinstance(bbox_pred, torch.Tensor):
@@ -712,6 +850,23 @@ class Cascade_t2t_new_jit_mask_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin
             ms_scores.append(cls_score)
 
             if i < self.num_stages - 1:
+                if stage_pruning is not None:
+                    keep_inds = [
+                        self._stage_keep_inds(s, stage_pruning)
+                        for s in cls_score
+                    ]
+                    # also prune the scores of the previous stages so that
+                    # the survivors are averaged over all stages
+                    ms_scores = [[
+                        score[j][keep_inds[j]] for j in range(num_imgs)
+                    ] for score in ms_scores]
+                    cls_score = ms_scores[-1]
+                    rois = [rois[j][keep_inds[j]] for j in range(num_imgs)]
+                    bbox_pred = [
+                        bbox_pred[j][keep_inds[j]] for j in range(num_imgs)
+                    ]
+                    num_proposals_per_img = tuple(
+                        len(inds) for inds in keep_inds)
                 bbox_label = [s[:, :-1].argmax(dim=1) for s in cls_score]
                 rois = torch.cat([
                     self.bbox_head[i].regress_by_class(rois[j], bbox_label[j],
@@ -5,7 +5,8 @@ import numpy as np
 from numba import jit
 from mmcv.runner import ModuleList
 
-from mmdet.core import (bbox2result, bbox2roi, bbox_mapping, build_assigner,
+from mmdet.core import (assign_and_sample, bbox2result, bbox2roi,
+                        bbox_mapping, build_assigner, build_gt_overlaps,
                         build_sampler, merge_aug_bboxes, merge_aug_masks,
                         multiclass_nms)
 from ..builder import HEADS, build_head, build_roi_extractor
@@ -17,7 +18,7 @@ from .t2t_models.t2t_vit_woshuffle import T2T_module
 ####### evit topk model ######
 import math
 from functools import partial
-from .evit.helpers import complement_idx
+from .evit.helpers import complement_idx, pair_token_idx
 ##############################
 
 
@@ -171,24 +172,6 @@ class Token_Pair_Attention(nn.Module):
 
         return  x, cls_attn, box_attn
 
-## pair the class and bbox token
-## return cls + cls_g token and bbox + bbox_g token
-# @jit()
-def gpu_pair(token_compare, index, B, N):
-    # id = cuda.threadIdx.x + cuda.blockDim.x * cuda.blockIdx.x
-    idx = np.zeros([B,N-2],dtype=np.int64)
-    for b in range(B):
-      box_token_cnt = 0
-      cls_token_cnt = 15
-      for j in index[b]:
-          if token_compare[b,j]:
-              idx[b,box_token_cnt] = int(j)
-              box_token_cnt += 1
-          else:
-              idx[b,cls_token_cnt] = int(j)
-              cls_token_cnt -= 1
-    return idx
-
 class Token_pair_block(nn.Module):
 
     def __init__(self, dim, num_heads, mlp_ratio=4., qkv_bias=False, drop=0., attn_drop=0.,
@@ -234,16 +217,8 @@ class Token_pair_block(nn.Module):
         ## compare which is more important
         token_compare = torch.gt(box_attn,cls_attn) # True if (box_attn>cls_attn)
 
-        ## to CPU accerate
-        index = index.cpu().numpy()
-        token_compare = token_compare.cpu().numpy()
-
-
-
-        ## get pair index
-        idx = gpu_pair(token_compare,index,B,N)
-
-        idx = torch.from_numpy(idx).to(torch.device('cuda:0'))
+        ## get pair index on the same device
+        idx = pair_token_idx(token_compare, index)
         idx = idx.unsqueeze(-1).expand(-1, -1, C)
 
         ## using idx to choose token
@@ -349,8 +324,8 @@ class Cascade_t2t_new_jit_mask_woshuffle_RoIHead(BaseRoIHead, BBoxTestMixin, Mas
         self.in_chans = 256
         self.token_dim = 100
         self.embed_dim = 128
-        self.bbox_token = [nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)).to(torch.device('cuda:0')) for _ in range(self.num_stages)]
-        self.cls_token = [nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)).to(torch.device('cuda:0')) for _ in range(self.num_stages)]
+        self.bbox_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)) for _ in range(self.num_stages)])
+        self.cls_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)) for _ in range(self.num_stages)])
         self.token_to_token = ModuleList([T2T_module(
                                 img_size=7, tokens_type='transformer', in_chans=self.in_chans, embed_dim=self.embed_dim, token_dim=self.token_dim,mask=True) for _ in range(self.num_stages)])
         self.t2t_bbox_head = ModuleList([nn.Linear(9*128, 4) for _ in range(self.num_stages)])
@@ -579,6 +554,8 @@ class Cascade_t2t_new_jit_mask_woshuffle_RoIHead(BaseRoIHead, BBoxTestMixin, Mas
             dict[str, Tensor]: a dictionary of loss components
         """
         losses = dict()
+        # the gt side of the overlaps is shared by the stages
+        gt_overlaps = build_gt_overlaps(self.bbox_assigner, gt_bboxes)
         for i in range(self.num_stages):
             self.current_stage = i
             rcnn_train_cfg = self.train_cfg[i]
@@ -587,23 +564,15 @@ class Cascade_t2t_new_jit_mask_woshuffle_RoIHead(BaseRoIHead, BBoxTestMixin, Mas
             # assign gts and sample proposals
             sampling_results = []
             if self.with_bbox or self.with_mask:
-                bbox_assigner = self.bbox_assigner[i]
-                bbox_sampler = self.bbox_sampler[i]
-                num_imgs = len(img_metas)
-                if gt_bboxes_ignore is None:
-                    gt_bboxes_ignore = [None for _ in range(num_imgs)]
-
-                for j in range(num_imgs):
-                    assign_result = bbox_assigner.assign(
-                        proposal_list[j], gt_bboxes[j], gt_bboxes_ignore[j],
-                        gt_labels[j])
-                    sampling_result = bbox_sampler.sample(
-                        assign_result,
-                        proposal_list[j],
-                        gt_bboxes[j],
-                        gt_labels[j],
-                        feats=[lvl_feat[j][None] for lvl_feat in x])
-                    sampling_results.append(sampling_result)
+                sampling_results = assign_and_sample(
+                    self.bbox_assigner[i],
+                    self.bbox_sampler[i],
+                    proposal_list,
+                    gt_bboxes,
+                    gt_labels,
+                    gt_bboxes_ignore,
+                    feats=x,
+                    gt_overlaps=gt_overlaps)
 
             # bbox head forward and loss
             bbox_results = self._bbox_forward_train(i, x, sampling_results,
@@ -2,7 +2,8 @@ import torch
 import torch.nn as nn
 from mmcv.runner import ModuleList
 
-from mmdet.core import (bbox2result, bbox2roi, bbox_mapping, build_assigner,
+from mmdet.core import (assign_and_sample, bbox2result, bbox2roi,
+                        bbox_mapping, build_assigner, build_gt_overlaps,
                         build_sampler, merge_aug_bboxes, merge_aug_masks,
                         multiclass_nms)
 from ..builder import HEADS, build_head, build_roi_extractor
@@ -14,7 +15,7 @@ from .t2t_models.t2t_vit import T2T_module
 ####### evit topk model ######
 import math
 from functools import partial
-from .evit.helpers import complement_idx
+from .evit.helpers import complement_idx, task_token_attention
 ##############################
 
 
@@ -71,8 +72,11 @@ class Mlp(nn.Module):
         return x
 
 class Attention(nn.Module):
-    def __init__(self, dim, num_heads=8, qkv_bias=False, attn_drop=0., proj_drop=0., keep_rate=1.):
+    def __init__(self, dim, num_heads=8, qkv_bias=False, attn_drop=0., proj_drop=0., keep_rate=1.,
+                 attn_impl='explicit'):
         super().__init__()
+        assert attn_impl in ('explicit', 'sdpa'), f'unknown attn_impl {attn_impl}'
+        self.attn_impl = attn_impl
         self.num_heads = num_heads
         head_dim = dim // num_heads
         self.scale = head_dim ** -0.5
@@ -91,16 +95,23 @@ class Attention(nn.Module):
         qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
         q, k, v = qkv[0], qkv[1], qkv[2]   # make torchscript happy (cannot use tensor as tuple)
 
-        attn = (q @ k.transpose(-2, -1)) * self.scale
-        attn = attn.softmax(dim=-1)
-        attn = self.attn_drop(attn)
+        need_cls_attn = self.keep_rate < 1 and keep_rate < 1 or tokens is not None  # double check the keep rate
+        if self.attn_impl == 'sdpa':
+            # only the row of the cls token is computed explicitly, for the topk
+            x, attn = task_token_attention(
+                q, k, v, self.scale, self.attn_drop, return_task_attn=need_cls_attn, num_task_tokens=1)
+            x = x.transpose(1, 2).reshape(B, N, C)
+        else:
+            attn = (q @ k.transpose(-2, -1)) * self.scale
+            attn = attn.softmax(dim=-1)
+            attn = self.attn_drop(attn)
 
-        x = (attn @ v).transpose(1, 2).reshape(B, N, C)
+            x = (attn @ v).transpose(1, 2).reshape(B, N, C)
         x = self.proj(x)
         x = self.proj_drop(x)
 
         left_tokens = N - 1
-        if self.keep_rate < 1 and keep_rate < 1 or tokens is not None:  # double check the keep rate
+        if need_cls_attn:
             left_tokens = math.ceil(keep_rate * (N - 1))
             if tokens is not None:
                 left_tokens = tokens
@@ -123,11 +134,12 @@ class Block(nn.Module):
 
     def __init__(self, dim, num_heads, mlp_ratio=4., qkv_bias=False, drop=0., attn_drop=0.,
                  drop_path=0., act_layer=nn.GELU, norm_layer=nn.LayerNorm, keep_rate=0.,
-                 fuse_token=False):
+                 fuse_token=False, attn_impl='explicit'):
         super().__init__()
         self.norm1 = norm_layer(dim)
         self.attn = Attention(dim, num_heads=num_heads, qkv_bias=qkv_bias,
-                              attn_drop=attn_drop, proj_drop=drop, keep_rate=keep_rate)
+                              attn_drop=attn_drop, proj_drop=drop, keep_rate=keep_rate,
+                              attn_impl=attn_impl)
         # NOTE: drop path for stochastic depth, we shall see if this is better than dropout here
         self.drop_path = DropPath(drop_path) if drop_path > 0. else nn.Identity()
         self.norm2 = norm_layer(dim)
@@ -185,7 +197,16 @@ class Cascade_t2t_evit_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
                  train_cfg=None,
                  test_cfg=None,
                  pretrained=None,
-                 init_cfg=None):
+                 init_cfg=None,
+                 attn_impl='explicit'):
+        """
+        Args:
+            attn_impl (str): Attention backend of the EViT blocks, 'explicit'
+                builds the full attention matrix and 'sdpa' uses the fused
+                scaled dot product attention for all rows but the one of
+                the cls token, which the topk needs. Both give the same
+                results. Defaults to 'explicit'.
+        """
         assert bbox_roi_extractor is not None
         assert bbox_head is not None
         assert shared_head is None, \
@@ -212,8 +233,8 @@ class Cascade_t2t_evit_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
         t2t_token = 8
         evit_token = math.ceil(self.keep_rate*t2t_token) + 2
         self.embed_dim = 128
-        self.bbox_token = [torch.zeros(1,self.embed_dim).to(torch.device('cuda:0')) for _ in range(self.num_stages)]
-        self.cls_token = [torch.zeros(1,self.embed_dim).to(torch.device('cuda:0')) for _ in range(self.num_stages)]
+        self.bbox_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.embed_dim), requires_grad=False) for _ in range(self.num_stages)])
+        self.cls_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.embed_dim), requires_grad=False) for _ in range(self.num_stages)])
         self.token_to_token_bbox = ModuleList([T2T_module(
                                 img_size=7, tokens_type='performer', in_chans=256, embed_dim=self.embed_dim, token_dim=100) for _ in range(self.num_stages)])
         # self.t2t_bbox_head = nn.Linear(4*128, 4)
@@ -225,8 +246,10 @@ class Cascade_t2t_evit_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
 
 
         # self.blk = Block(keep_rate=0.7, fuse_token=True)
-        self.cls_blk = ModuleList([Block(dim=self.embed_dim, num_heads=t2t_token, keep_rate=self.keep_rate, fuse_token=True) for _ in range(self.num_stages)])
-        self.bbox_blk = ModuleList([Block(dim=self.embed_dim, num_heads=t2t_token, keep_rate=self.keep_rate, fuse_token=True) for _ in range(self.num_stages)])
+        self.cls_blk = ModuleList([Block(dim=self.embed_dim, num_heads=t2t_token, keep_rate=self.keep_rate, fuse_token=True,
+                                         attn_impl=attn_impl) for _ in range(self.num_stages)])
+        self.bbox_blk = ModuleList([Block(dim=self.embed_dim, num_heads=t2t_token, keep_rate=self.keep_rate, fuse_token=True,
+                                          attn_impl=attn_impl) for _ in range(self.num_stages)])
         self.norm = norm_layer(self.embed_dim)
 
         ###### aitod dataset #####
@@ -473,6 +496,8 @@ class Cascade_t2t_evit_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
             dict[str, Tensor]: a dictionary of loss components
         """
         losses = dict()
+        # the gt side of the overlaps is shared by the stages
+        gt_overlaps = build_gt_overlaps(self.bbox_assigner, gt_bboxes)
         for i in range(self.num_stages):
             self.current_stage = i
             rcnn_train_cfg = self.train_cfg[i]
@@ -481,23 +506,15 @@ class Cascade_t2t_evit_RoIHead(BaseRoIHead, BBoxTestMixin, MaskTestMixin):
             # assign gts and sample proposals
             sampling_results = []
             if self.with_bbox or self.with_mask:
-                bbox_assigner = self.bbox_assigner[i]
-                bbox_sampler = self.bbox_sampler[i]
-                num_imgs = len(img_metas)
-                if gt_bboxes_ignore is None:
-                    gt_bboxes_ignore = [None for _ in range(num_imgs)]
-
-                for j in range(num_imgs):
-                    assign_result = bbox_assigner.assign(
-                        proposal_list[j], gt_bboxes[j], gt_bboxes_ignore[j],
-                        gt_labels[j])
-                    sampling_result = bbox_sampler.sample(
-                        assign_result,
-                        proposal_list[j],
-                        gt_bboxes[j],
-                        gt_labels[j],
-                        feats=[lvl_feat[j][None] for lvl_feat in x])
-                    sampling_results.append(sampling_result)
+                sampling_results = assign_and_sample(
+                    self.bbox_assigner[i],
+                    self.bbox_sampler[i],
+                    proposal_list,
+                    gt_bboxes,
+                    gt_labels,
+                    gt_bboxes_ignore,
+                    feats=x,
+                    gt_overlaps=gt_overlaps)
 
             # bbox head forward and loss
             bbox_results = self._bbox_forward_train(i, x, sampling_results,
@@ -18,7 +18,7 @@ from .t2t_models.t2t_vit import T2T_module
 ####### evit topk model ######
 import math
 from functools import partial
-from .evit.helpers import complement_idx
+from .evit.helpers import complement_idx, pair_token_idx
 ##############################
 
 
@@ -172,26 +172,6 @@ class Token_Pair_Attention(nn.Module):
 
         return  x, cls_attn, box_attn
 
-## pair the class and bbox token
-## return cls + cls_g token and bbox + bbox_g token
-# @jit()
-def gpu_pair(token_compare, index, B, N):
-    # id = cuda.threadIdx.x + cuda.blockDim.x * cuda.blockIdx.x
-
-    idx = np.zeros([B,N-2],dtype=np.int64)
-
-    for b in range(B):
-      box_token_cnt = 0
-      cls_token_cnt = 15
-      for j in index[b]:
-          if token_compare[b,j]:
-              idx[b,box_token_cnt] = int(j)
-              box_token_cnt += 1
-          else:
-              idx[b,cls_token_cnt] = int(j)
-              cls_token_cnt -= 1
-    return idx
-
 class Token_pair_block(nn.Module):
 
     def __init__(self, dim, num_heads, mlp_ratio=4., qkv_bias=False, drop=0., attn_drop=0.,
@@ -237,16 +217,8 @@ class Token_pair_block(nn.Module):
         ## compare which is more important
         token_compare = torch.gt(box_attn,cls_attn) # True if (box_attn>cls_attn)
 
-        ## to CPU accerate
-        index = index.cpu().numpy()
-        token_compare = token_compare.cpu().numpy()
-
-
-
-        ## get pair index
-        idx = gpu_pair(token_compare,index,B,N)
-
-        idx = torch.from_numpy(idx).to(torch.device('cuda:0'))
+        ## get pair index on the same device
+        idx = pair_token_idx(token_compare, index)
         idx = idx.unsqueeze(-1).expand(-1, -1, C)
 
         ## using idx to choose token
@@ -352,8 +324,8 @@ class Cascade_t2t_new_jit_mask_woshuffle_RoIHead(BaseRoIHead, BBoxTestMixin, Mas
         self.in_chans = 256
         self.token_dim = 100
         self.embed_dim = 128
-        self.bbox_token = [nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)).to(torch.device('cuda:0')) for _ in range(self.num_stages)]
-        self.cls_token = [nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)).to(torch.device('cuda:0')) for _ in range(self.num_stages)]
+        self.bbox_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)) for _ in range(self.num_stages)])
+        self.cls_token = nn.ParameterList([nn.Parameter(torch.zeros(1, self.in_chans * 3 * 3)) for _ in range(self.num_stages)])
         self.token_to_token = ModuleList([T2T_module(
                                 img_size=7, tokens_type='transformer', in_chans=self.in_chans, embed_dim=self.embed_dim, token_dim=self.token_dim,mask=True) for _ in range(self.num_stages)])
         self.t2t_bbox_head = ModuleList([nn.Linear(9*128, 4) for _ in range(self.num_stages)])
@@ -1,6 +1,7 @@
 import math
 import time
 import torch
+import torch.nn.functional as F
 from torchprofile import profile_macs
 
 
@@ -71,3 +72,102 @@ def complement_idx(idx, dim):
     compl = compl.permute(-1, *tuple(range(ndim - 1)))
     compl = compl[n_idx:].permute(*(tuple(range(1, ndim)) + (0,)))
     return compl
+
+
+def pair_token_idx(token_compare, index):
+    """
+    Split the general tokens into box and cls groups without leaving the device.
+    Walking `index` in order, tokens with token_compare=True fill the slots from
+    the front and the others fill the slots from the back, so the result equals
+    the python loop in `gpu_pair`.
+    Args:
+        token_compare: bool tensor, True if box_attn > cls_attn, shape: [B, G]
+        index: token order, e.g. argsort of cls_attn + box_attn, shape: [B, G]
+    Returns:
+        idx: gather index of the paired tokens, shape: [B, G]
+    """
+    num_tokens = index.shape[-1]
+    is_box = torch.gather(token_compare, -1, index)
+    box_pos = torch.cumsum(is_box.long(), dim=-1) - 1
+    cls_pos = num_tokens - torch.cumsum((~is_box).long(), dim=-1)
+    pos = torch.where(is_box, box_pos, cls_pos)
+    idx = torch.empty_like(index)
+    return idx.scatter_(-1, pos, index)
+
+
+def scaled_dot_product_attention(q, k, v, scale, attn_mask=None, dropout_p=0.):
+    """
+    softmax(q @ k^T * scale + attn_mask) @ v with the fused kernel of torch>=2.0,
+    the same math is done explicitly on older versions.
+    Args:
+        q, k, v: shape: [B, H, N, C]
+        scale: scale of the attention logits
+        attn_mask: additive mask broadcastable to [B, H, N_q, N_k]
+    """
+    if hasattr(F, 'scaled_dot_product_attention'):
+        # fold the scale into q, the `scale` argument needs torch>=2.1
+        q = q * (scale * math.sqrt(q.shape[-1]))
+        return F.scaled_dot_product_attention(
+            q, k, v, attn_mask=attn_mask, dropout_p=dropout_p)
+    attn = (q @ k.transpose(-2, -1)) * scale
+    if attn_mask is not None:
+        attn = attn + attn_mask
+    attn = F.dropout(attn.softmax(dim=-1), p=dropout_p)
+    return attn @ v
+
+
+def task_pair_mask(q, k, scale):
+    """
+    Additive mask for the rows of the cls (0) and box (1) task tokens.
+    The attention modules set the cls<->box logits to 0 (not -inf), i.e. they
+    add minus these logits, so the mask depends on q and k.
+    Args:
+        q, k: shape: [B, H, N, C]
+    Returns:
+        mask: shape: [B, H, 2, N]
+    """
+    B, H, N, _ = k.shape
+    mask = q.new_zeros(B, H, 2, N)
+    mask[:, :, 0, 1] = -(q[:, :, 0] * k[:, :, 1]).sum(-1) * scale
+    mask[:, :, 1, 0] = -(q[:, :, 1] * k[:, :, 0]).sum(-1) * scale
+    return mask
+
+
+def task_token_attention(q, k, v, scale, attn_drop, mask_task_pair=False,
+                         return_task_attn=False, num_task_tokens=2):
+    """
+    Attention over [task tokens, other tokens] without materializing the full
+    attention matrix. Only the rows of the task tokens are computed
+    explicitly, and only when their probabilities are returned.
+    Args:
+        q, k, v: shape: [B, H, N, C]
+        attn_drop: nn.Dropout applied to the attention probabilities
+        mask_task_pair: if True, the cls and box tokens do not see each other,
+            needs num_task_tokens=2
+        return_task_attn: also return the attention rows of the task tokens
+        num_task_tokens: number of task tokens at the front, e.g. 2 for the
+            cls and box tokens or 1 for the cls token of EViT
+    Returns:
+        x: attention output, shape: [B, H, N, C]
+        task_attn: attention of the task tokens,
+            shape: [B, H, num_task_tokens, N] or None
+    """
+    dropout_p = attn_drop.p if attn_drop.training else 0.
+    if not (mask_task_pair or return_task_attn):
+        return scaled_dot_product_attention(q, k, v, scale, dropout_p=dropout_p), None
+
+    assert not mask_task_pair or num_task_tokens == 2
+    task_mask = task_pair_mask(q, k, scale) if mask_task_pair else None
+    task_q = q[:, :, :num_task_tokens]
+    task_attn = None
+    if return_task_attn:
+        task_attn = (task_q @ k.transpose(-2, -1)) * scale
+        if task_mask is not None:
+            task_attn = task_attn + task_mask
+        task_attn = attn_drop(task_attn.softmax(dim=-1))
+        task_x = task_attn @ v
+    else:
+        task_x = scaled_dot_product_attention(
+            task_q, k, v, scale, attn_mask=task_mask, dropout_p=dropout_p)
+    x = scaled_dot_product_attention(q[:, :, num_task_tokens:], k, v, scale, dropout_p=dropout_p)
+    return torch.cat((task_x, x), dim=2), task_attn
@@ -16,7 +16,6 @@ import numpy as np
 from .token_transformer_mask import Token_transformer
 from .token_performer import Token_performer
 from .transformer_block import Block, get_sinusoid_encoding
-import random
 
 def _cfg(url='', **kwargs):
     return {
@@ -46,8 +45,18 @@ class T2T_module(nn.Module):
     """
     Tokens-to-Token encoding module
     """
-    def __init__(self, img_size=224, tokens_type='performer', in_chans=3, embed_dim=768, token_dim=64, mask=True):
+    def __init__(self, img_size=224, tokens_type='performer', in_chans=3, embed_dim=768, token_dim=64, mask=True,
+                 attn_impl='explicit', shuffle_in_eval=True, shuffle_seed=None):
         super().__init__()
+        # random shuffle of the 3x3 kernel positions, see get_shuffle_index
+        self.shuffle_in_eval = shuffle_in_eval
+        self.generator = None
+        if shuffle_seed is not None:
+            self.generator = torch.Generator()
+            self.generator.manual_seed(shuffle_seed)
+        self.register_buffer('identity_index', torch.arange(9).repeat(4, 1), persistent=False)
+        self.register_buffer('identity_gather_index', self._gather_index(self.identity_index, 16, in_chans),
+                             persistent=False)
 
         if tokens_type == 'transformer':
             print('adopt transformer encoder for tokens-to-token')
@@ -56,7 +65,8 @@ class T2T_module(nn.Module):
             self.soft_split2 = nn.Unfold(kernel_size=(3, 3), stride=(1, 1), padding=(1, 1))
 
             # self.attention1 = Token_transformer(dim=in_chans * 7 * 7, in_dim=token_dim, num_heads=1, mlp_ratio=1.0,mask=mask)
-            self.attention2 = Token_transformer(dim=in_chans*3*3, in_dim=token_dim,  num_heads=1, mlp_ratio=1.0,mask=mask)
+            self.attention2 = Token_transformer(dim=in_chans*3*3, in_dim=token_dim,  num_heads=1, mlp_ratio=1.0,mask=mask,
+                                                attn_impl=attn_impl)
             self.project = nn.Linear(token_dim * 3 * 3, embed_dim)
             self.cls_project = nn.Linear(token_dim, token_dim * 3 * 3)
             self.bbox_project = nn.Linear(token_dim, token_dim * 3 * 3)
@@ -85,7 +95,36 @@ class T2T_module(nn.Module):
 
         self.num_patches = (img_size // (4 * 2 * 2)) * (img_size // (4 * 2 * 2))  # there are 3 sfot split, stride are 4,2,2 seperately
 
-    def forward(self, x, random_shuffle_forward=False, cls_token=None, bbox_token=None):
+    def get_shuffle_index(self):
+        """Draw the orders of the 3x3 kernel positions for the random shuffle.
+
+        The first group keeps the kernel order and the other three are random
+        permutations drawn from ``self.generator`` (the global torch RNG if no
+        ``shuffle_seed`` is given). With ``shuffle_in_eval=False`` the eval
+        mode uses the identity layout instead.
+
+        The same index must be used for all RoIs of one forward, pass it to
+        ``forward`` as ``shuffle_index`` when the RoIs are split in chunks.
+        """
+        if not (self.training or self.shuffle_in_eval):
+            return self.identity_index
+        perms = [torch.randperm(9, generator=self.generator) for _ in range(3)]
+        return torch.stack([torch.arange(9)] + perms)
+
+    @staticmethod
+    def _gather_index(shuffle_index, num_patches, channels, device=None):
+        """Flat index that maps the unfolded features [C*9, L] to the shuffled
+        tokens [4*L, C*9] in one gather.
+
+        Token ``i*L + p`` holds the features of patch ``p`` with the kernel
+        positions ordered by ``shuffle_index[i]``.
+        """
+        shuffle_index = torch.as_tensor(shuffle_index, device=device).view(-1, 1, 1, 9)
+        patch = torch.arange(num_patches, device=shuffle_index.device).view(1, -1, 1, 1)
+        channel = torch.arange(channels, device=shuffle_index.device).view(1, 1, -1, 1)
+        return ((channel * 9 + shuffle_index) * num_patches + patch).view(-1)
+
+    def forward(self, x, random_shuffle_forward=False, cls_token=None, bbox_token=None, shuffle_index=None):
         # print("random_shuffle_forward:", random_shuffle_forward)
         # step0: soft split
         # print("input:", x.size())
@@ -96,21 +135,21 @@ class T2T_module(nn.Module):
         # B, new_HW, C = x.shape
         # x = x.transpose(1,2).reshape(B, C, int(np.sqrt(new_HW)), int(np.sqrt(new_HW)))
         # iteration1: soft split
-        x = self.soft_split1(x).transpose(1, 2)         # output size:(1024, 16, 2304)   #input size:(1024, 256, 7, 7)
+        x = self.soft_split1(x)         # output size:(1024, 2304, 16)   #input size:(1024, 256, 7, 7)
         if random_shuffle_forward:
-            x = x.reshape(-1, 16, 256, 9).transpose(0, 3)
-            index = [[0,1,2,3,4,5,6,7,8],
-                     [8,7,6,5,4,3,2,1,0],
-                     [0,1,2,3,4,5,6,7,8],
-                     [0,1,2,3,4,5,6,7,8]]
-            random.shuffle(index[1])
-            random.shuffle(index[2])
-            random.shuffle(index[3])
+            index = shuffle_index
+            if index is None:
+                index = self.get_shuffle_index()
+            B, C, L = x.shape
+            if index is self.identity_index and self.identity_gather_index.numel() == 4 * C * L:
+                gather_index = self.identity_gather_index
+            else:
+                gather_index = self._gather_index(index, L, C // 9, device=x.device)
             # print(index)
-            x = torch.cat((x[index[0]], x[index[1]], x[index[2]], x[index[3]]), dim=1)
-            # print(x.shape)
-            x = x.transpose(0, 3).reshape(-1,64,256*9)  #output size:(1024, 64, 2304)
+            x = x.flatten(1).index_select(1, gather_index).view(B, 4 * L, C)  #output size:(1024, 64, 2304)
             # print(x.shape)
+        else:
+            x = x.transpose(1, 2)         # output size:(1024, 16, 2304)
         # print("split1:", x.size())
         # iteration2: re-structurization/reconstruction
         if bbox_token is not None:
@@ -9,11 +9,14 @@ Take the standard Transformer as T2T Transformer
 import torch.nn as nn
 from timm.models.layers import DropPath
 from .transformer_block import Mlp
+from ..evit.helpers import task_token_attention
 
 class Attention(nn.Module):
-    def __init__(self, dim, num_heads=1, in_dim = None, qkv_bias=False, qk_scale=None, attn_drop=0., proj_drop=0., mask = False):
+    def __init__(self, dim, num_heads=1, in_dim = None, qkv_bias=False, qk_scale=None, attn_drop=0., proj_drop=0., mask = False, attn_impl='explicit'):
         super().__init__()
+        assert attn_impl in ('explicit', 'sdpa'), f'unknown attn_impl {attn_impl}'
         self.mask = mask
+        self.attn_impl = attn_impl
         self.num_heads = num_heads
         self.in_dim = in_dim
         head_dim = dim // num_heads
@@ -32,16 +35,20 @@ class Attention(nn.Module):
         qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, self.in_dim//self.num_heads).permute(2, 0, 3, 1, 4)
         q, k, v = qkv[0], qkv[1], qkv[2]
 
-        attn = (q * self.scale) @ k.transpose(-2, -1)
-        if(self.mask):
-            # print('masked')
-            attn[:,:,0,1] = 0
-            attn[:,:,1,0] = 0
-        attn = attn.softmax(dim=-1)
-        attn = self.attn_drop(attn)
-        # print(attn.shape)
+        if self.attn_impl == 'sdpa':
+            x, _ = task_token_attention(q, k, v, self.scale, self.attn_drop, mask_task_pair=self.mask)
+        else:
+            attn = (q * self.scale) @ k.transpose(-2, -1)
+            if(self.mask):
+                # print('masked')
+                attn[:,:,0,1] = 0
+                attn[:,:,1,0] = 0
+            attn = attn.softmax(dim=-1)
+            attn = self.attn_drop(attn)
+            # print(attn.shape)
+            x = attn @ v
 
-        x = (attn @ v).transpose(1, 2).reshape(B, N, self.in_dim)
+        x = x.transpose(1, 2).reshape(B, N, self.in_dim)
         x = self.proj(x)
         x = self.proj_drop(x)
 
@@ -55,11 +62,12 @@ class Attention(nn.Module):
 class Token_transformer(nn.Module):
 
     def __init__(self, dim, in_dim, num_heads, mlp_ratio=1., qkv_bias=False, qk_scale=None, drop=0., attn_drop=0.,mask=False,
-                 drop_path=0., act_layer=nn.GELU, norm_layer=nn.LayerNorm):
+                 drop_path=0., act_layer=nn.GELU, norm_layer=nn.LayerNorm, attn_impl='explicit'):
         super().__init__()
         self.norm1 = norm_layer(dim)
         self.attn = Attention(
-            dim, in_dim=in_dim, num_heads=num_heads, qkv_bias=qkv_bias, qk_scale=qk_scale, attn_drop=attn_drop, proj_drop=drop, mask=mask)
+            dim, in_dim=in_dim, num_heads=num_heads, qkv_bias=qkv_bias, qk_scale=qk_scale, attn_drop=attn_drop, proj_drop=drop, mask=mask,
+            attn_impl=attn_impl)
         self.drop_path = DropPath(drop_path) if drop_path > 0. else nn.Identity()
         self.norm2 = norm_layer(in_dim)
         self.mlp = Mlp(in_features=in_dim, hidden_features=int(in_dim*mlp_ratio), out_features=in_dim, act_layer=act_layer, drop=drop)
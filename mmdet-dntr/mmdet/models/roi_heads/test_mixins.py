@@ -175,6 +175,32 @@ class BBoxTestMixin:
                                                     rcnn_test_cfg.max_per_img)
         return det_bboxes, det_labels
 
+    def _stage_keep_inds(self, cls_score, cfg):
+        """Select the RoIs of one image that go to the next stage.
+
+        Args:
+            cls_score (Tensor): Class scores of the current stage with shape
+                (num_rois, num_classes + 1), the last column is background.
+            cfg (dict): ``test_cfg.stage_roi_pruning``. RoIs whose
+                foreground score is below ``score_thr`` are dropped and at
+                most ``max_num`` of the highest scoring ones are kept. The
+                best RoI is always kept.
+
+        Returns:
+            Tensor: Indices of the kept RoIs in their original order.
+        """
+        fg_score = 1 - cls_score.softmax(dim=-1)[:, -1]
+        keep = fg_score.argsort(descending=True)
+        max_num = cfg.get('max_num', -1)
+        if 0 < max_num < keep.numel():
+            keep = keep[:max_num]
+        score_thr = cfg.get('score_thr', 0.)
+        if score_thr > 0:
+            valid = fg_score[keep] >= score_thr
+            valid[:1] = True
+            keep = keep[valid]
+        return keep.sort()[0]
+
 
 class MaskTestMixin:
 
@@ -1,11 +1,17 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import os.path as osp
 import tempfile
+import time
 
 import mmcv
+import numpy as np
 import pytest
+import torch.nn as nn
+from torch.utils.data import DataLoader
 
-from mmdet.datasets import CocoDataset
+from mmdet.apis import single_gpu_test
+from mmdet.core import IncrementalCocoEvaluator
+from mmdet.datasets import AITODDataset, CocoDataset, VisdroneDataset
 
 
 def _create_ids_error_coco_json(json_name):
@@ -56,3 +62,199 @@ def test_coco_annotation_ids_unique():
     # test annotation ids not unique error
     with pytest.raises(AssertionError):
         CocoDataset(ann_file=fake_json_file, classes=('car', ), pipeline=[])
+
+
+def _create_random_coco_json(json_name, classes, num_imgs=3):
+    rng = np.random.RandomState(0)
+    images = [
+        dict(id=i, width=640, height=640, file_name=f'fake_name_{i}.jpg')
+        for i in range(1, num_imgs + 1)
+    ]
+    categories = [
+        dict(id=i, name=name, supercategory=name)
+        for i, name in enumerate(classes, 1)
+    ]
+    annotations = []
+    for image in images:
+        for _ in range(10):
+            x, y, w, h = rng.randint(1, 100, 4).tolist()
+            annotations.append(
+                dict(
+                    id=len(annotations) + 1,
+                    image_id=image['id'],
+                    category_id=int(rng.randint(1, len(classes) + 1)),
+                    area=w * h,
+                    bbox=[x, y, w, h],
+                    iscrowd=0))
+    fake_json = dict(
+        images=images, annotations=annotations, categories=categories)
+    mmcv.dump(fake_json, json_name)
+
+
+def _create_random_results(dataset, seed=0):
+    """Jittered gts and random false positives of each image."""
+    rng = np.random.RandomState(seed)
+    results = []
+    for img_id in dataset.img_ids:
+        anns = dataset.coco.load_anns(dataset.coco.get_ann_ids([img_id]))
+        result = []
+        for cat_id in dataset.cat_ids:
+            xywh = [
+                ann['bbox'] for ann in anns if ann['category_id'] == cat_id
+            ]
+            xywh = np.array(xywh + rng.randint(1, 60, (2, 4)).tolist())
+            bboxes = np.hstack((xywh[:, :2], xywh[:, :2] + xywh[:, 2:]))
+            bboxes = bboxes + rng.randn(*bboxes.shape) * 2
+            result.append(
+                np.hstack((bboxes, rng.rand(len(bboxes), 1))).astype(
+                    np.float32))
+        results.append(result)
+    return results
+
+
+def test_coco_det2arrays():
+    tmp_dir = tempfile.TemporaryDirectory()
+    fake_json_file = osp.join(tmp_dir.name, 'fake_data.json')
+    classes = ('car', 'person')
+    _create_random_coco_json(fake_json_file, classes)
+    dataset = CocoDataset(
+        ann_file=fake_json_file, classes=classes, pipeline=[])
+    results = _create_random_results(dataset)
+
+    json_results = dataset._det2json(results)
+    img_ids, cat_ids, bboxes, scores = dataset._det2arrays(results)
+    assert img_ids.tolist() == [res['image_id'] for res in json_results]
+    assert cat_ids.tolist() == [res['category_id'] for res in json_results]
+    assert bboxes.tolist() == [res['bbox'] for res in json_results]
+    assert scores.tolist() == [res['score'] for res in json_results]
+
+    # the bboxes of instance segmentation results
+    segm_arrays = dataset._det2arrays([(result, None) for result in results])
+    for array, segm_array in zip((img_ids, cat_ids, bboxes, scores),
+                                 segm_arrays):
+        np.testing.assert_array_equal(segm_array, array)
+
+    # the results of a subset of the images
+    sub_arrays = dataset._det2arrays(results[1:], img_inds=[1, 2])
+    keep = img_ids != dataset.img_ids[0]
+    for array, sub_array in zip((img_ids, cat_ids, bboxes, scores),
+                                sub_arrays):
+        np.testing.assert_array_equal(sub_array, array[keep])
+
+
+def test_visdrone_evaluate_use_arrays():
+    tmp_dir = tempfile.TemporaryDirectory()
+    fake_json_file = osp.join(tmp_dir.name, 'fake_data.json')
+    _create_random_coco_json(fake_json_file, VisdroneDataset.CLASSES)
+    dataset = VisdroneDataset(
+        ann_file=fake_json_file, pipeline=[], test_mode=True)
+    results = _create_random_results(dataset)
+
+    metric = ['bbox', 'proposal']
+    eval_results = dataset.evaluate(results, metric=metric)
+    assert eval_results['bbox_mAP_50'] > 0
+    assert dataset.evaluate(
+        results, metric=metric, use_arrays=True) == eval_results
+
+
+def test_aitod_evaluate_use_arrays():
+    pytest.importorskip('aitodpycocotools.cocoeval')
+    tmp_dir = tempfile.TemporaryDirectory()
+    fake_json_file = osp.join(tmp_dir.name, 'fake_data.json')
+    _create_random_coco_json(fake_json_file, AITODDataset.CLASSES)
+    dataset = AITODDataset(
+        ann_file=fake_json_file, pipeline=[], test_mode=True)
+    results = _create_random_results(dataset)
+
+    metric = ['bbox', 'proposal']
+    eval_results = dataset.evaluate(results, metric=metric)
+    assert eval_results['bbox_mAP_50'] > 0
+    assert dataset.evaluate(
+        results, metric=metric, use_arrays=True) == eval_results
+
+
+def test_aitod_evaluate_num_workers():
+    pytest.importorskip('aitodpycocotools.cocoeval')
+    tmp_dir = tempfile.TemporaryDirectory()
+    fake_json_file = osp.join(tmp_dir.name, 'fake_data.json')
+    _create_random_coco_json(
+        fake_json_file, AITODDataset.CLASSES, num_imgs=5)
+    dataset = AITODDataset(
+        ann_file=fake_json_file, pipeline=[], test_mode=True)
+    results = _create_random_results(dataset)
+
+    metric = ['bbox', 'proposal']
+    eval_results = dataset.evaluate(results, metric=metric)
+    assert eval_results['bbox_mAP_50'] > 0
+    assert dataset.evaluate(
+        results, metric=metric, num_workers=2) == eval_results
+
+
+class _ResultModel(nn.Module):
+    """Returns the given results of the images of each batch."""
+
+    def __init__(self, results):
+        super().__init__()
+        self.results = results
+
+    def forward(self, idx, return_loss=False, rescale=True):
+        return [self.results[i] for i in idx.tolist()]
+
+
+@pytest.mark.parametrize('metric', ['bbox', ['bbox', 'proposal']])
+def test_incremental_coco_evaluator(metric):
+    pytest.importorskip('aitodpycocotools.cocoeval')
+    tmp_dir = tempfile.TemporaryDirectory()
+    fake_json_file = osp.join(tmp_dir.name, 'fake_data.json')
+    _create_random_coco_json(
+        fake_json_file, AITODDataset.CLASSES, num_imgs=5)
+    dataset = AITODDataset(
+        ann_file=fake_json_file, pipeline=[], test_mode=True)
+    results = _create_random_results(dataset)
+    eval_results = dataset.evaluate(results, metric=metric, classwise=False)
+    assert eval_results['bbox_mAP_50'] > 0
+
+    evaluator = IncrementalCocoEvaluator(
+        dataset, metric=metric, max_pending=1, classwise=False)
+    data_loader = DataLoader([dict(idx=i) for i in range(len(dataset))],
+                             batch_size=2)
+    records = single_gpu_test(
+        _ResultModel(results), data_loader, evaluator=evaluator)
+    assert [img_id for img_id, _ in records] == dataset.img_ids
+    assert evaluator.evaluate(records) == eval_results
+
+    # the images without records have no detections
+    results[1] = [np.zeros((0, 5), dtype=np.float32) for _ in results[1]]
+    assert evaluator.evaluate(records[:1] + records[2:]) == dataset.evaluate(
+        results, metric=metric, classwise=False)
+
+    with pytest.raises(KeyError):
+        IncrementalCocoEvaluator(dataset, metric='segm')
+    # the arguments of the results of dataset.evaluate are rejected
+    for key, value in [('use_arrays', True), ('jsonfile_prefix', 'results'),
+                       ('coco_evals', dict())]:
+        with pytest.raises(ValueError, match=key):
+            IncrementalCocoEvaluator(dataset, metric=metric, **{key: value})
+    with pytest.raises(TypeError):
+        IncrementalCocoEvaluator(
+            CocoDataset(
+                ann_file=fake_json_file,
+                classes=AITODDataset.CLASSES,
+                pipeline=[]))
+
+    # the proposals of an rpn are rejected before the background thread
+    evaluator = IncrementalCocoEvaluator(dataset, metric=metric)
+    with pytest.raises(TypeError):
+        evaluator.process([result[0] for result in results[:2]], [0, 1])
+    with pytest.raises(ValueError):
+        evaluator.process(results[:2], [0])
+    assert evaluator._thread is None
+
+    # an error of the background thread stops the next batch
+    evaluator.process(results[:1], [len(dataset)])
+    deadline = time.time() + 10
+    while evaluator._error is None and time.time() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(IndexError):
+        evaluator.process(results[:1], [0])
+    assert evaluator.wait() == []
@@ -1,4 +1,5 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import numpy as np
 import torch
 
 from mmdet.core.bbox.assigners import MaxIoUAssigner
@@ -92,6 +93,70 @@ def test_random_sampler_empty_pred():
     assert len(sample_result.neg_bboxes) == len(sample_result.neg_inds)
 
 
+def test_random_sampler_batch():
+    sampler = RandomSampler(
+        num=10, pos_fraction=0.5, neg_pos_ub=-1, add_gt_as_proposals=False)
+    gt_inds = torch.LongTensor([
+        [1, 2, 0, 0, -1, 0, 3, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, -1],
+        [-1, 0, 0, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1, -1],
+    ])
+    pos_mask, neg_mask = sampler.sample_batch(gt_inds)
+    assert pos_mask.shape == neg_mask.shape == gt_inds.shape
+    assert (gt_inds[pos_mask] > 0).all()
+    assert (gt_inds[neg_mask] == 0).all()
+    # the numbers of samples follow sample()
+    assert pos_mask.sum(dim=1).tolist() == [3, 5, 0]
+    assert neg_mask.sum(dim=1).tolist() == [7, 5, 2]
+
+    sampler = RandomSampler(
+        num=10, pos_fraction=0.5, neg_pos_ub=1, add_gt_as_proposals=False)
+    pos_mask, neg_mask = sampler.sample_batch(gt_inds)
+    assert pos_mask.sum(dim=1).tolist() == [3, 5, 0]
+    assert neg_mask.sum(dim=1).tolist() == [3, 5, 1]
+
+    pos_mask, neg_mask = sampler.sample_batch(gt_inds[:, :0])
+    assert pos_mask.shape == neg_mask.shape == (3, 0)
+
+    # the same generator state gives the same samples
+    sampler = RandomSampler(
+        num=10, pos_fraction=0.5, add_gt_as_proposals=False, seed=0)
+    masks = sampler.sample_batch(gt_inds)
+    assert not all(
+        torch.equal(mask, other)
+        for mask, other in zip(masks, sampler.sample_batch(gt_inds)))
+    generator = torch.Generator().manual_seed(0)
+    for mask, other in zip(masks, sampler.sample_batch(gt_inds, generator)):
+        assert torch.equal(mask, other)
+
+
+def test_random_sampler_random_choice():
+    sampler = RandomSampler(num=10, pos_fraction=0.5, seed=0)
+    # a full permutation of the small galleries, a partial shuffle of the
+    # large ones
+    for gallery_size in [50, 200000]:
+        gallery = torch.arange(gallery_size) * 2
+        inds = sampler.random_choice(gallery, 20)
+        assert len(inds) == len(inds.unique()) == 20
+        assert (inds % 2 == 0).all() and (inds < 2 * gallery_size).all()
+        generator = torch.Generator().manual_seed(1)
+        inds = sampler.random_choice(gallery, 20, generator)
+        generator.manual_seed(1)
+        assert torch.equal(inds,
+                           sampler.random_choice(gallery, 20, generator))
+        # numpy galleries give numpy samples
+        inds = sampler.random_choice(gallery.numpy(), 20)
+        assert isinstance(inds, np.ndarray) and len(np.unique(inds)) == 20
+
+    # every element of the gallery is equally likely to be sampled
+    counts = torch.zeros(1000)
+    for _ in range(300):
+        counts[sampler._partial_shuffle(1000, 10)] += 1
+    assert counts.sum() == 3000 and counts.max() < 15
+    assert torch.equal(
+        sampler._partial_shuffle(5, 5).sort()[0], torch.arange(5))
+
+
 def _context_for_ohem():
     import sys
     from os.path import dirname
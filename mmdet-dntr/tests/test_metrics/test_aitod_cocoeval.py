@@ -0,0 +1,203 @@
+import contextlib
+import copy
+import io
+
+import numpy as np
+import pytest
+
+cocoeval = pytest.importorskip('aitodpycocotools.cocoeval')
+coco = pytest.importorskip('aitodpycocotools.coco')
+COCO = coco.COCO
+
+
+def _random_coco(seed, num_imgs=8, num_cats=3):
+    """Random gts with crowds and detections jittered from them."""
+    rng = np.random.RandomState(seed)
+    images = [
+        dict(id=i, width=200, height=200) for i in range(1, num_imgs + 1)
+    ]
+    categories = [dict(id=i, name=str(i)) for i in range(1, num_cats + 1)]
+    anns, dets = [], []
+    for img in images:
+        for _ in range(rng.randint(0, 40)):
+            x, y = rng.randint(0, 180, 2)
+            w, h = rng.randint(1, 40, 2)
+            anns.append(
+                dict(
+                    id=len(anns) + 1,
+                    image_id=img['id'],
+                    category_id=int(rng.randint(1, num_cats + 1)),
+                    bbox=[float(x), float(y),
+                          float(w), float(h)],
+                    area=float(w * h),
+                    iscrowd=int(rng.rand() < 0.1)))
+        for _ in range(rng.randint(1, 120)):
+            if anns and rng.rand() < 0.7:
+                ann = anns[rng.randint(len(anns))]
+                bbox = [float(v + rng.randint(-3, 4)) for v in ann['bbox']]
+                bbox[2:] = [max(v, 1.) for v in bbox[2:]]
+                category_id = ann['category_id']
+                image_id = ann['image_id']
+            else:
+                x, y = rng.randint(0, 180, 2)
+                w, h = rng.randint(1, 40, 2)
+                bbox = [float(x), float(y), float(w), float(h)]
+                category_id = int(rng.randint(1, num_cats + 1))
+                image_id = img['id']
+            # coarse scores give ties
+            dets.append(
+                dict(
+                    image_id=image_id,
+                    category_id=category_id,
+                    bbox=bbox,
+                    score=rng.randint(0, 10) / 10))
+    coco_gt = COCO()
+    coco_gt.dataset = dict(
+        images=images, categories=categories, annotations=anns)
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_gt.createIndex()
+        coco_dt = coco_gt.loadRes(dets)
+    return coco_gt, coco_dt
+
+
+def _evaluate(coco_gt, coco_dt, use_cats=1, num_workers=1, **params):
+    coco_eval = cocoeval.COCOeval(coco_gt, coco_dt, 'bbox')
+    coco_eval.params.maxDets = [1, 10, 30]
+    coco_eval.params.useCats = use_cats
+    for key, value in params.items():
+        setattr(coco_eval.params, key, value)
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_eval.evaluate(num_workers=num_workers)
+        coco_eval.accumulate()
+        coco_eval.summarize()
+    return coco_eval
+
+
+def _assert_eval_imgs_equal(eval_imgs, expected_eval_imgs):
+    assert len(eval_imgs) == len(expected_eval_imgs)
+    for eval_img, expected in zip(eval_imgs, expected_eval_imgs):
+        if expected is None:
+            assert eval_img is None
+            continue
+        assert eval_img.keys() == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, np.ndarray):
+                np.testing.assert_array_equal(eval_img[key], value)
+            else:
+                assert eval_img[key] == value
+
+
+@pytest.mark.parametrize('use_cats', [1, 0])
+@pytest.mark.parametrize('seed', range(5))
+def test_fast_match(seed, use_cats):
+    coco_gt, coco_dt = _random_coco(seed)
+    loop_eval = _evaluate(coco_gt, coco_dt, use_cats, useFastMatch=0)
+    fast_eval = _evaluate(coco_gt, coco_dt, use_cats, useFastMatch=1)
+    _assert_eval_imgs_equal(fast_eval.evalImgs, loop_eval.evalImgs)
+    np.testing.assert_array_equal(fast_eval.stats, loop_eval.stats)
+    assert (fast_eval.stats[[0, 2]] > 0).all()
+
+
+@pytest.mark.parametrize('use_cats', [1, 0])
+def test_evaluate_num_workers(use_cats):
+    coco_gt, coco_dt = _random_coco(0, num_imgs=11)
+    serial_eval = _evaluate(coco_gt, coco_dt, use_cats)
+    parallel_eval = _evaluate(coco_gt, coco_dt, use_cats, num_workers=2)
+    _assert_eval_imgs_equal(parallel_eval.evalImgs, serial_eval.evalImgs)
+    assert parallel_eval.ious.keys() == serial_eval.ious.keys()
+    for key, ious in serial_eval.ious.items():
+        np.testing.assert_array_equal(parallel_eval.ious[key], ious)
+    np.testing.assert_array_equal(parallel_eval.stats, serial_eval.stats)
+    for key in ['precision', 'recall', 'scores', 'olrp']:
+        np.testing.assert_array_equal(parallel_eval.eval[key],
+                                      serial_eval.eval[key])
+
+
+@pytest.mark.parametrize('use_cats', [1, 0])
+@pytest.mark.parametrize('seed', range(5))
+def test_fast_accumulate(seed, use_cats):
+    coco_gt, coco_dt = _random_coco(seed)
+    loop_eval = _evaluate(coco_gt, coco_dt, use_cats, useFastAccumulate=0)
+    fast_eval = _evaluate(coco_gt, coco_dt, use_cats, useFastAccumulate=1)
+    for key in [
+            'precision', 'recall', 'scores', 'olrp_loc', 'olrp_fp', 'olrp_fn',
+            'olrp', 'lrp_opt_thr'
+    ]:
+        np.testing.assert_array_equal(fast_eval.eval[key],
+                                      loop_eval.eval[key])
+    np.testing.assert_array_equal(fast_eval.stats, loop_eval.stats)
+
+    # detections of no category, gts of no detection
+    coco_eval = cocoeval.COCOeval(coco_gt, coco_dt, 'bbox')
+    coco_eval.params.catIds = coco_eval.params.catIds + [100]
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_eval.evaluate()
+        coco_eval.params.useFastAccumulate = 0
+        coco_eval.accumulate(with_lrp=False)
+        expected = copy.deepcopy(coco_eval.eval)
+        coco_eval.params.useFastAccumulate = 1
+        coco_eval.accumulate(with_lrp=False)
+    for key in ['precision', 'recall', 'scores', 'olrp']:
+        np.testing.assert_array_equal(coco_eval.eval[key], expected[key])
+
+
+@pytest.mark.parametrize('use_cats', [1, 0])
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_load_res_arrays(use_cats, num_workers):
+    coco_gt, coco_dt = _random_coco(1, num_imgs=11)
+    dets = coco_dt.dataset['annotations']
+    with contextlib.redirect_stdout(io.StringIO()):
+        array_dt = coco_gt.loadResArrays(
+            [det['image_id'] for det in dets],
+            [det['category_id'] for det in dets],
+            np.array([det['bbox'] for det in dets]),
+            [det['score'] for det in dets])
+    assert len(array_dt.anns) == 0
+    expected = _evaluate(coco_gt, coco_dt, use_cats)
+    array_eval = _evaluate(
+        coco_gt, array_dt, use_cats, num_workers=num_workers)
+    assert all(
+        isinstance(dts, cocoeval.DtColumns)
+        for dts in array_eval._dts.values() if len(dts))
+    _assert_eval_imgs_equal(array_eval.evalImgs, expected.evalImgs)
+    np.testing.assert_array_equal(array_eval.stats, expected.stats)
+
+    # only the results of params.imgIds are evaluated
+    img_ids = coco_gt.getImgIds()[::2]
+    expected = _evaluate(coco_gt, coco_dt, use_cats, imgIds=img_ids)
+    array_eval = _evaluate(coco_gt, array_dt, use_cats, imgIds=img_ids)
+    _assert_eval_imgs_equal(array_eval.evalImgs, expected.evalImgs)
+    np.testing.assert_array_equal(array_eval.stats, expected.stats)
+
+    coco_eval = cocoeval.COCOeval(coco_gt, array_dt, 'segm')
+    with pytest.raises(Exception, match='only support bbox'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            coco_eval.evaluate()
+
+
+def test_load_res_arrays_pycocotools_gt():
+    pycocotools_coco = pytest.importorskip('pycocotools.coco')
+    coco_gt, coco_dt = _random_coco(2)
+    gt = pycocotools_coco.COCO()
+    gt.dataset = copy.deepcopy(coco_gt.dataset)
+    dets = coco_dt.dataset['annotations']
+    arrays = ([det['image_id'] for det in dets],
+              [det['category_id'] for det in dets],
+              np.array([det['bbox'] for det in dets]),
+              [det['score'] for det in dets])
+    with contextlib.redirect_stdout(io.StringIO()):
+        gt.createIndex()
+        array_dt = coco.loadResArrays(gt, *arrays)
+    # the gt is only read, a pycocotools COCO is enough
+    assert isinstance(array_dt, COCO)
+    assert array_dt.getImgIds() == coco_gt.getImgIds()
+    res_arrays = coco.makeResArrays(coco_gt, *arrays)
+    assert res_arrays.keys() == array_dt.resArrays.keys()
+    for key, column in res_arrays.items():
+        np.testing.assert_array_equal(array_dt.resArrays[key], column)
+    np.testing.assert_array_equal(
+        _evaluate(coco_gt, array_dt).stats,
+        _evaluate(coco_gt, coco_dt).stats)
+
+    with pytest.raises(AssertionError, match='current coco set'):
+        coco.makeResArrays(gt, [0], [1], np.ones((1, 4)), [1.])
@@ -4,6 +4,8 @@ import pytest
 import torch
 
 from mmdet.core import BboxOverlaps2D, bbox_overlaps
+from mmdet.core.bbox.iou_calculators import (BboxDistanceMetric,
+                                             SparseBboxOverlaps)
 from mmdet.core.evaluation.bbox_overlaps import \
     bbox_overlaps as recall_overlaps
 
@@ -132,3 +134,140 @@ def test_voc_recall_overlaps():
     ious = recall_overlaps(bboxes1, bboxes2, 'iou', use_legacy_coordinate=True)
     assert ious.shape == (num_bbox, num_bbox)
     assert np.all(ious >= -1) and np.all(ious <= 1)
+
+
+def _distance_overlaps(bboxes1, bboxes2, mode, eps=1e-6, constant=12.7):
+    """Pairwise definitions of the metric_calculator modes."""
+    b1, b2 = bboxes1[:, None], bboxes2[None]
+    wh1, wh2 = b1[..., 2:] - b1[..., :2], b2[..., 2:] - b2[..., :2]
+    overlap = (torch.min(b1[..., 2:], b2[..., 2:]) -
+               torch.max(b1[..., :2], b2[..., :2])).clamp(min=0).prod(-1)
+    union = wh1.prod(-1) + wh2.prod(-1) - overlap + eps
+    ious = overlap / union
+    enclose = (torch.max(b1[..., 2:], b2[..., 2:]) -
+               torch.min(b1[..., :2], b2[..., :2])).clamp(min=0)
+    center_distance = ((b1[..., :2] + b1[..., 2:]) / 2 -
+                       (b2[..., :2] + b2[..., 2:]) / 2).pow(2).sum(-1) + eps
+    if mode in ['iou', 'iof']:
+        return ious
+    if mode in ['giou', 'normalized_giou']:
+        enclose_area = enclose.prod(-1)
+        gious = ious - (enclose_area - union) / enclose_area
+        return gious if mode == 'giou' else (1 + gious) / 2
+    if mode == 'diou':
+        return ious - center_distance / enclose.pow(2).sum(-1)
+    if mode == 'ciou':
+        v = 4 / np.pi**2 * (torch.atan(wh2[..., 0] / wh2[..., 1]) -
+                            torch.atan(wh1[..., 0] / wh1[..., 1]))**2
+        return (ious - center_distance / enclose.pow(2).sum(-1) -
+                v**2 / (1 - ious + v).clamp(min=eps)).clamp(min=-1, max=1)
+    if mode == 'nwd':
+        wh_distance = (wh1 - wh2).pow(2).sum(-1) / 4
+        return torch.exp(-torch.sqrt(center_distance + wh_distance) / constant)
+    return torch.exp(-torch.sqrt(center_distance) / constant)
+
+
+@pytest.mark.parametrize('mode', [
+    'iou', 'iof', 'giou', 'normalized_giou', 'diou', 'ciou', 'nwd', 'dotd'
+])
+def test_distance_metric_modes(mode):
+    torch.manual_seed(0)
+    xy = torch.rand(30, 2) * 200
+    bboxes1 = torch.cat((xy, xy + torch.rand(30, 2) * 30 + 1), dim=1)
+    xy = torch.rand(40, 2) * 200
+    bboxes2 = torch.cat((xy, xy + torch.rand(40, 2) * 30 + 1), dim=1)
+    bboxes2[:5] = bboxes1[:5]
+
+    self = BboxDistanceMetric()
+    overlaps = self(bboxes1, bboxes2, mode=mode)
+    assert overlaps.shape == (30, 40)
+    assert torch.allclose(
+        overlaps,
+        _distance_overlaps(bboxes1, bboxes2, mode),
+        rtol=1e-5,
+        atol=1e-6)
+
+    # is_aligned gives the diagonal, also with batch dims and scores
+    aligned = self(bboxes1, bboxes2[:30], mode=mode, is_aligned=True)
+    assert aligned.shape == (30, )
+    assert torch.allclose(aligned, overlaps[:, :30].diagonal(), atol=1e-6)
+    scores = torch.rand(2, 30, 1)
+    aligned = self(
+        torch.cat((bboxes1.expand(2, 30, 4), scores), dim=-1),
+        torch.cat((bboxes2[:30].expand(2, 30, 4), scores), dim=-1),
+        mode=mode,
+        is_aligned=True)
+    assert aligned.shape == (2, 30)
+    assert torch.allclose(aligned[1], overlaps[:, :30].diagonal(), atol=1e-6)
+    batch_overlaps = self(
+        bboxes1.expand(2, 3, 30, 4), bboxes2.expand(2, 3, 40, 4), mode=mode)
+    assert batch_overlaps.shape == (2, 3, 30, 40)
+    assert torch.allclose(batch_overlaps[1, 2], overlaps)
+
+    assert self(bboxes1[:0], bboxes2, mode=mode).shape == (0, 40)
+    assert self(
+        bboxes1[:0], bboxes2[:0], mode=mode, is_aligned=True).shape == (0, )
+
+
+@pytest.mark.parametrize('mode', ['nwd', 'dotd', 'iou'])
+def test_bbox_overlaps_topk(mode):
+    torch.manual_seed(0)
+    xy = torch.rand(500, 2) * 200
+    bboxes = torch.cat((xy, xy + torch.rand(500, 2) * 30 + 1), dim=1)
+    xy = torch.rand(20, 2) * 200
+    gt_bboxes = torch.cat((xy, xy + torch.rand(20, 2) * 30 + 1), dim=1)
+    ignore_mask = torch.rand(500) > 0.9
+
+    self = BboxDistanceMetric()
+    overlaps = self(gt_bboxes, bboxes, mode=mode)
+    overlaps[:, ignore_mask] = -1
+    # tiles of 3 bboxes (20 gts x 3)
+    topk_overlaps, topk_inds, max_overlaps, argmax_overlaps = self.topk(
+        gt_bboxes, bboxes, 5, mode=mode, tile_size=60,
+        ignore_mask=ignore_mask)
+    expected_topk_overlaps, _ = overlaps.topk(5, dim=1)
+    assert torch.allclose(topk_overlaps, expected_topk_overlaps)
+    assert torch.allclose(
+        overlaps.gather(1, topk_inds), expected_topk_overlaps)
+    expected_max_overlaps, _ = overlaps.max(dim=0)
+    assert torch.allclose(max_overlaps, expected_max_overlaps)
+    assert torch.allclose(
+        overlaps.gather(0, argmax_overlaps[None])[0], expected_max_overlaps)
+
+    # k is clamped to the number of bboxes
+    topk_overlaps, topk_inds, max_overlaps, _ = self.topk(
+        gt_bboxes, bboxes[:2], 5, mode=mode)
+    assert topk_inds.shape == (20, 2)
+    assert max_overlaps.shape == (2, )
+    topk_overlaps, topk_inds, max_overlaps, _ = self.topk(
+        gt_bboxes[:0], bboxes, 5, mode=mode)
+    assert topk_inds.shape == (0, 5)
+    assert max_overlaps.shape == (500, )
+
+
+def test_sparse_bbox_overlaps():
+    torch.manual_seed(0)
+    # integer boxes give touching boxes, i.e. zero overlaps
+    xy = torch.randint(0, 100, (500, 2)).float()
+    bboxes = torch.cat((xy, xy + torch.randint(1, 20, (500, 2)),
+                        torch.rand(500, 1)),
+                       dim=1)
+    xy = torch.randint(0, 100, (40, 2)).float()
+    gt_bboxes = torch.cat((xy, xy + torch.randint(1, 20, (40, 2))), dim=1)
+    # a large gt is not on the left of the boxes after it in x1
+    gt_bboxes[0] = torch.Tensor([0, 0, 120, 5])
+
+    self = SparseBboxOverlaps(gt_bboxes)
+    gt_inds, bbox_inds, overlaps = self(bboxes)
+    dense_overlaps = bbox_overlaps(gt_bboxes, bboxes[:, :4])
+    expected_gt_inds, expected_bbox_inds = dense_overlaps.nonzero(
+        as_tuple=True)
+    assert len(overlaps) == len(expected_gt_inds)
+    assert torch.equal(overlaps, dense_overlaps[gt_inds, bbox_inds])
+    # the pairs are grouped by bbox
+    assert (bbox_inds[1:] >= bbox_inds[:-1]).all()
+
+    gt_inds, bbox_inds, overlaps = self(bboxes[:0])
+    assert overlaps.shape == (0, )
+    gt_inds, bbox_inds, overlaps = SparseBboxOverlaps(gt_bboxes[:0])(bboxes)
+    assert gt_inds.shape == bbox_inds.shape == overlaps.shape == (0, )
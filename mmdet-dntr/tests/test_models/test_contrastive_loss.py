@@ -0,0 +1,32 @@
+import pytest
+import torch
+
+from mmdet.models.detectors.two_stage import Contrastive_Loss
+
+
+def _dummy_feats(batch_size, size=16):
+    x_b = [torch.rand(batch_size, 3, size * 4, size * 4)]
+    x = []
+    for i in range(5):
+        feat_size = max(size // 2**i, 1)
+        if i < 4:
+            x_b.append(torch.rand(batch_size, 256 * 2**i, feat_size,
+                                  feat_size))
+        x.append(torch.rand(batch_size, 256, feat_size, feat_size))
+    return x_b, x
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 3])
+def test_contrastive_loss_impl(batch_size):
+    torch.manual_seed(batch_size)
+    with pytest.raises(AssertionError):
+        Contrastive_Loss(impl='einsum')
+
+    contrastive_loss = Contrastive_Loss(impl='loop').eval()
+    x_b, x = _dummy_feats(batch_size)
+    geo_loss, sem_loss = contrastive_loss(x_b, x)
+
+    contrastive_loss.impl = 'matrix'
+    matrix_geo_loss, matrix_sem_loss = contrastive_loss(x_b, x)
+    assert torch.allclose(geo_loss, matrix_geo_loss, rtol=1e-5, atol=1e-5)
+    assert torch.allclose(sem_loss, matrix_sem_loss, rtol=1e-5, atol=1e-5)
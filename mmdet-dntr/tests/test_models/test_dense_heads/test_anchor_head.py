@@ -68,3 +68,57 @@ def test_anchor_head_loss():
     onegt_box_loss = sum(one_gt_losses['loss_bbox'])
     assert onegt_cls_loss.item() > 0, 'cls loss should be non-zero'
     assert onegt_box_loss.item() > 0, 'box loss should be non-zero'
+
+
+def test_anchor_head_candidate_assign():
+    """Tests the anchor head assigning the anchors near each gt only."""
+    s = 256
+    img_metas = [{
+        'img_shape': (s - 30, s, 3),
+        'scale_factor': 1,
+        'pad_shape': (s, s, 3)
+    }]
+
+    def build_head(candidate_radius):
+        cfg = mmcv.Config(
+            dict(
+                assigner=dict(
+                    type='RankingAssigner',
+                    ignore_iof_thr=-1,
+                    iou_calculator=dict(type='BboxDistanceMetric'),
+                    assign_metric='nwd',
+                    topk=3,
+                    candidate_radius=candidate_radius),
+                sampler=dict(
+                    type='RandomSampler',
+                    num=256,
+                    pos_fraction=0.5,
+                    neg_pos_ub=-1,
+                    add_gt_as_proposals=False),
+                allowed_border=0,
+                pos_weight=-1,
+                debug=False))
+        return AnchorHead(num_classes=4, in_channels=1, train_cfg=cfg)
+
+    self = build_head(None)
+    sparse = build_head(24)
+    sparse.load_state_dict(self.state_dict())
+    feat = [
+        torch.rand(1, 1, s // (2**(i + 2)), s // (2**(i + 2)))
+        for i in range(len(self.anchor_generator.strides))
+    ]
+    cls_scores, bbox_preds = self.forward(feat)
+    gt_bboxes = [
+        torch.Tensor([[23.6, 23.8, 38.6, 31.8], [100.2, 150.7, 108.1, 157.],
+                      [3., 200., 9., 211.], [20., 30., 220., 180.]])
+    ]
+    gt_labels = [torch.LongTensor([2, 0, 1, 3])]
+    torch.manual_seed(0)
+    losses = self.loss(cls_scores, bbox_preds, gt_bboxes, gt_labels,
+                       img_metas)
+    torch.manual_seed(0)
+    sparse_losses = sparse.loss(cls_scores, bbox_preds, gt_bboxes, gt_labels,
+                                img_metas)
+    for key in ['loss_cls', 'loss_bbox']:
+        assert torch.allclose(sum(losses[key]), sum(sparse_losses[key]))
+    assert sum(losses['loss_bbox']).item() > 0
@@ -0,0 +1,161 @@
+import mmcv
+import pytest
+import torch
+
+from mmdet.core import bbox_overlaps
+from mmdet.models.dense_heads import RPNHead
+
+
+def _build_rpn_head(batch_targets=False, **assigner_cfg):
+    cfg = mmcv.Config(
+        dict(
+            assigner=dict(
+                type='RankingAssigner',
+                ignore_iof_thr=0.5,
+                iou_calculator=dict(type='BboxDistanceMetric'),
+                assign_metric='nwd',
+                topk=3,
+                **assigner_cfg),
+            sampler=dict(
+                type='RandomSampler',
+                num=256,
+                pos_fraction=0.5,
+                neg_pos_ub=-1,
+                add_gt_as_proposals=False),
+            allowed_border=0,
+            pos_weight=-1,
+            batch_targets=batch_targets,
+            debug=False))
+    return RPNHead(in_channels=1, train_cfg=cfg)
+
+
+@pytest.mark.parametrize('assigner_cfg', [
+    dict(),
+    dict(tile_size=2**14),
+    dict(gpu_assign_thr=20),
+    dict(candidate_radius=24)
+])
+def test_rpn_head_batch_targets(assigner_cfg):
+    """Tests the batched targets equal the per-image ones."""
+    s = 256
+    img_metas = [{
+        'img_shape': (s, s, 3),
+        'scale_factor': 1,
+        'pad_shape': (s, s, 3)
+    }, {
+        'img_shape': (s - 50, s - 20, 3),
+        'scale_factor': 1,
+        'pad_shape': (s, s, 3)
+    }, {
+        'img_shape': (s, s, 3),
+        'scale_factor': 1,
+        'pad_shape': (s, s, 3)
+    }]
+    self = _build_rpn_head(**assigner_cfg)
+    batch = _build_rpn_head(batch_targets=True, **assigner_cfg)
+    featmap_sizes = [(s // 2**(i + 2), s // 2**(i + 2)) for i in range(5)]
+    anchor_list, valid_flag_list = self.get_anchors(
+        featmap_sizes, img_metas, device='cpu')
+    torch.manual_seed(0)
+    gt_bboxes = []
+    # less than 128 positives per image, all of them are sampled
+    for num_gts in [12, 30, 0]:
+        xy = torch.rand(num_gts, 2) * 200
+        gt_bboxes.append(
+            torch.cat((xy, xy + torch.rand(num_gts, 2) * 30 + 2), dim=1))
+    gt_bboxes_ignore = [torch.Tensor([[0, 0, 60, 60]]), None, None]
+
+    targets = self.get_targets(
+        anchor_list,
+        valid_flag_list,
+        gt_bboxes,
+        img_metas,
+        gt_bboxes_ignore_list=gt_bboxes_ignore,
+        featmap_sizes=featmap_sizes)
+    batch_targets = batch.get_targets(
+        anchor_list,
+        valid_flag_list,
+        gt_bboxes,
+        img_metas,
+        gt_bboxes_ignore_list=gt_bboxes_ignore,
+        featmap_sizes=featmap_sizes)
+    (labels, label_weights, bbox_targets, bbox_weights, num_total_pos,
+     num_total_neg) = [
+         torch.cat(t, dim=1) if isinstance(t, list) else t for t in targets
+     ]
+    (batch_labels, batch_label_weights, batch_bbox_targets,
+     batch_bbox_weights, batch_num_total_pos, batch_num_total_neg) = [
+         torch.cat(t, dim=1) if isinstance(t, list) else t
+         for t in batch_targets
+     ]
+    assert torch.equal(labels, batch_labels)
+    assert torch.allclose(bbox_targets, batch_bbox_targets)
+    assert torch.equal(bbox_weights, batch_bbox_weights)
+    assert num_total_pos == batch_num_total_pos
+    assert num_total_neg == batch_num_total_neg
+    # the same number of negatives, randomly picked among the same ones
+    pos_mask = labels == 0
+    assert torch.equal(label_weights[pos_mask], batch_label_weights[pos_mask])
+    assert torch.equal((label_weights > 0).sum(dim=1),
+                       (batch_label_weights > 0).sum(dim=1))
+    assert pos_mask.sum() > 0
+
+    feat = [torch.rand(3, 1, h, w) for h, w in featmap_sizes]
+    cls_scores, bbox_preds = batch.forward(feat)
+    losses = batch.loss(cls_scores, bbox_preds, gt_bboxes, img_metas,
+                        gt_bboxes_ignore)
+    assert sum(losses['loss_rpn_bbox']).item() > 0
+
+
+def test_rpn_head_proposal_pruning():
+    s = 128
+    img_metas = [{
+        'img_shape': (s, s, 3),
+        'scale_factor': 1,
+        'pad_shape': (s, s, 3)
+    }]
+    self = _build_rpn_head()
+    torch.manual_seed(0)
+    featmap_sizes = [(s // 2**(i + 2), s // 2**(i + 2)) for i in range(5)]
+    num_priors = self.num_base_priors
+    cls_scores = [torch.randn(1, num_priors, h, w) for h, w in featmap_sizes]
+    bbox_preds = [
+        torch.randn(1, num_priors * 4, h, w) * 0.2 for h, w in featmap_sizes
+    ]
+
+    def get_proposals(**cfg):
+        test_cfg = mmcv.Config(
+            dict(
+                nms_pre=100,
+                max_per_img=1000,
+                nms=dict(type='nms', iou_threshold=0.7),
+                min_bbox_size=0))
+        test_cfg.update(cfg)
+        return self.get_bboxes(
+            cls_scores, bbox_preds, img_metas=img_metas, cfg=test_cfg)[0]
+
+    proposals = get_proposals()
+    assert torch.equal(proposals, get_proposals(nms_pre=[100] * 5))
+    assert torch.equal(proposals,
+                       get_proposals(nms_pre={i: 100
+                                              for i in range(5)}))
+    # the levels missing from the dict keep all their boxes
+    assert len(get_proposals(nms_pre={0: 10})) > len(proposals)
+
+    floor_proposals = get_proposals(score_thr=0.6)
+    assert (floor_proposals[:, 4] > 0.6).all()
+    assert torch.equal(floor_proposals,
+                       proposals[proposals[:, 4] > 0.6][:len(floor_proposals)])
+
+    # fast nms keeps a subset of the boxes kept by the standard nms
+    fast_proposals = get_proposals(level_fast_nms=True)
+    assert 0 < len(fast_proposals) <= len(proposals)
+    assert (fast_proposals[1:, 4] <= fast_proposals[:-1, 4]).all()
+    assert (bbox_overlaps(fast_proposals[:, :4], proposals[:, :4]).max(
+        dim=1)[0] > 0.9999).all()
+    assert len(get_proposals(level_fast_nms=True, max_per_img=5)) == 5
+    # nothing is suppressed without overlaps above the threshold
+    assert torch.equal(
+        get_proposals(nms=dict(type='nms', iou_threshold=1.)),
+        get_proposals(
+            nms=dict(type='nms', iou_threshold=1.), level_fast_nms=True))
@@ -399,6 +399,32 @@ def test_two_stage_forward(cfg_file):
                 (0, detector.roi_head.bbox_head.fc_cls.out_features))
 
 
+def test_dntr_simple_test_cpu():
+    model = _get_detector_cfg('aitod-dntr/aitod_DNTR_mask.py')
+    model.pretrained = None
+    model.neck.rfp_backbone.pretrained = None
+    # keep the proposal count small on CPU
+    model.test_cfg.rpn.nms_pre = 100
+    model.test_cfg.rpn.max_per_img = 100
+
+    from mmdet.models import build_detector
+    detector = build_detector(model)
+    detector.eval()
+    roi_head = detector.roi_head
+    assert len(list(roi_head.cls_token.parameters())) == roi_head.num_stages
+    assert 'roi_head.cls_token.0' in detector.state_dict()
+    assert 'contrastive_loss.channel_transfer.0.weight' in \
+        detector.state_dict()
+
+    mm_inputs = _demo_mm_inputs((1, 3, 128, 128), num_items=[3])
+    imgs = mm_inputs.pop('imgs')
+    img_metas = mm_inputs.pop('img_metas')
+    with torch.no_grad():
+        results = detector.simple_test(imgs, img_metas)
+    assert len(results) == 1
+    assert len(results[0]) == roi_head.bbox_head[-1].num_classes
+
+
 @pytest.mark.parametrize(
     'cfg_file', ['ghm/retinanet_ghm_r50_fpn_1x_coco.py', 'ssd/ssd300_coco.py'])
 def test_single_stage_forward_cpu(cfg_file):
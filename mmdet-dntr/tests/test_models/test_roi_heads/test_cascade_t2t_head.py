@@ -0,0 +1,273 @@
+from os.path import dirname, join
+
+import numpy as np
+import pytest
+import torch
+from mmcv import Config
+
+from mmdet.models.builder import build_head
+from mmdet.models.roi_heads.cascade_roi_head_cas_t2t_new_jit_mask import \
+    T2T_stage_core
+
+
+def _build_t2t_roi_head(head_cfg=None, **test_cfg):
+    """Build the roi head of the DNTR config with an updated test_cfg."""
+    config_dpath = join(dirname(dirname(dirname(dirname(__file__)))),
+                        'configs')
+    config = Config.fromfile(
+        join(config_dpath, 'aitod-dntr/aitod_DNTR_mask.py'))
+    roi_head = config.model.roi_head
+    roi_head.update(head_cfg or dict())
+    roi_head.update(train_cfg=config.model.train_cfg.rcnn)
+    roi_head.update(test_cfg=config.model.test_cfg.rcnn)
+    roi_head.test_cfg.update(test_cfg)
+    return build_head(roi_head).eval()
+
+
+def _demo_inputs(num_imgs=2, num_rois=20, img_size=64):
+    feats = tuple(
+        torch.rand(num_imgs, 256, img_size // stride, img_size // stride)
+        for stride in [4, 8, 16, 32, 64])
+    proposal_list = []
+    for _ in range(num_imgs):
+        x1y1 = torch.rand(num_rois, 2) * img_size / 2
+        wh = torch.rand(num_rois, 2) * img_size / 2 + 1
+        scores = torch.rand(num_rois, 1)
+        proposal_list.append(torch.cat([x1y1, x1y1 + wh, scores], dim=1))
+    img_metas = [
+        dict(
+            img_shape=(img_size, img_size, 3),
+            ori_shape=(img_size, img_size, 3),
+            scale_factor=np.array([1., 1., 1., 1.], dtype=np.float32))
+        for _ in range(num_imgs)
+    ]
+    return feats, proposal_list, img_metas
+
+
+def test_stage_keep_inds():
+    roi_head = _build_t2t_roi_head()
+    cls_score = torch.tensor([[0., 0., 4.], [4., 0., 0.], [0., 2., 0.],
+                              [1., 0., 0.]])
+    keep = roi_head._stage_keep_inds(cls_score, dict(max_num=2))
+    assert keep.tolist() == [1, 2]
+    keep = roi_head._stage_keep_inds(cls_score, dict(score_thr=0.6))
+    assert keep.tolist() == [1, 2, 3]
+    # the best RoI always survives
+    keep = roi_head._stage_keep_inds(cls_score, dict(score_thr=0.99))
+    assert keep.tolist() == [1]
+    keep = roi_head._stage_keep_inds(cls_score[:0], dict(score_thr=0.5))
+    assert keep.numel() == 0
+
+
+def test_simple_test_stage_roi_pruning():
+    feats, proposal_list, img_metas = _demo_inputs()
+    roi_head = _build_t2t_roi_head()
+    torch.manual_seed(0)
+    with torch.no_grad():
+        results = roi_head.simple_test(feats, proposal_list, img_metas)
+
+    # pruning nothing gives the same detections
+    roi_head.test_cfg.stage_roi_pruning = dict(max_num=1000, score_thr=0.)
+    torch.manual_seed(0)
+    with torch.no_grad():
+        pruned_results = roi_head.simple_test(feats, proposal_list,
+                                              img_metas)
+    for result, pruned_result in zip(results, pruned_results):
+        for dets, pruned_dets in zip(result, pruned_result):
+            assert np.allclose(dets, pruned_dets)
+
+    roi_head.test_cfg.stage_roi_pruning = dict(max_num=5, score_thr=0.1)
+    with torch.no_grad():
+        pruned_results = roi_head.simple_test(feats, proposal_list,
+                                              img_metas)
+    assert len(pruned_results) == len(img_metas)
+    for result in pruned_results:
+        assert len(result) == roi_head.bbox_head[-1].num_classes
+
+
+def test_bbox_forward_roi_chunk_size():
+    feats, proposal_list, _ = _demo_inputs(num_rois=37)
+    rois = torch.cat([
+        torch.cat([p.new_full((len(p), 1), i), p[:, :4]], dim=1)
+        for i, p in enumerate(proposal_list)
+    ])
+    roi_head = _build_t2t_roi_head()
+    torch.manual_seed(0)
+    with torch.no_grad():
+        results = roi_head._bbox_forward(0, feats, rois)
+
+    # the last chunk of 73 has one RoI, it is merged into the first one
+    for roi_chunk_size in [16, 25, 73]:
+        roi_head.roi_chunk_size = roi_chunk_size
+        torch.manual_seed(0)
+        with torch.no_grad():
+            chunk_results = roi_head._bbox_forward(0, feats, rois)
+        assert torch.equal(results['cls_score'], chunk_results['cls_score'])
+        assert torch.equal(results['bbox_pred'], chunk_results['bbox_pred'])
+
+    with pytest.raises(AssertionError):
+        _build_t2t_roi_head(dict(roi_chunk_size=4))
+
+
+def test_mask_task_tokens():
+    task_token = torch.rand(3, 9, 128)
+    task_attn = torch.rand(3, 8)
+    mask_task_tokens = T2T_stage_core.mask_task_tokens
+    assert mask_task_tokens(task_token, task_attn, 1.) is task_token
+
+    masked = mask_task_tokens(task_token, task_attn, 0.5)
+    assert masked.shape == task_token.shape
+    assert torch.equal(masked[:, 0], task_token[:, 0])
+    kept = masked[:, 1:].abs().sum(dim=-1) > 0
+    assert kept.sum(dim=1).tolist() == [4, 4, 4]
+    top4 = task_attn.topk(4, dim=1)[1]
+    assert kept.gather(1, top4).all()
+
+
+def test_bbox_forward_token_keep_rate():
+    feats, proposal_list, _ = _demo_inputs()
+    rois = torch.cat([
+        torch.cat([p.new_full((len(p), 1), i), p[:, :4]], dim=1)
+        for i, p in enumerate(proposal_list)
+    ])
+    roi_head = _build_t2t_roi_head()
+    torch.manual_seed(0)
+    with torch.no_grad():
+        results = roi_head._bbox_forward(1, feats, rois)
+
+    roi_head.test_cfg.token_keep_rate = [0.5, 1., 0.5]
+    torch.manual_seed(0)
+    with torch.no_grad():
+        same_results = roi_head._bbox_forward(1, feats, rois)
+    assert torch.equal(results['cls_score'], same_results['cls_score'])
+    assert torch.equal(results['bbox_pred'], same_results['bbox_pred'])
+
+    roi_head.test_cfg.token_keep_rate = 0.25
+    torch.manual_seed(0)
+    with torch.no_grad():
+        masked_results = roi_head._bbox_forward(1, feats, rois)
+    assert masked_results['cls_score'].shape == results['cls_score'].shape
+    assert not torch.equal(results['cls_score'], masked_results['cls_score'])
+
+    # token masking is only used at test time
+    roi_head.train()
+    assert roi_head._token_keep_rate(1) == 1.
+
+
+@pytest.mark.parametrize('head_type', [
+    'Cascade_t2t_new_jit_mask_RoIHead', 'Cascade_t2t_evit_RoIHead'
+])
+def test_bbox_forward_sdpa_attn_impl(head_type):
+    feats, proposal_list, _ = _demo_inputs()
+    rois = torch.cat([
+        torch.cat([p.new_full((len(p), 1), i), p[:, :4]], dim=1)
+        for i, p in enumerate(proposal_list)
+    ])
+    roi_head = _build_t2t_roi_head(dict(type=head_type))
+    sdpa_roi_head = _build_t2t_roi_head(
+        dict(type=head_type, attn_impl='sdpa'))
+    sdpa_roi_head.load_state_dict(roi_head.state_dict())
+    for stage in range(roi_head.num_stages):
+        torch.manual_seed(stage)
+        with torch.no_grad():
+            results = roi_head._bbox_forward(stage, feats, rois)
+        torch.manual_seed(stage)
+        with torch.no_grad():
+            sdpa_results = sdpa_roi_head._bbox_forward(stage, feats, rois)
+        for key in ['cls_score', 'bbox_pred']:
+            assert torch.allclose(
+                results[key], sdpa_results[key], rtol=1e-4, atol=1e-4)
+
+
+def test_t2t_eager_core_cache():
+    feats, proposal_list, img_metas = _demo_inputs()
+    roi_head = _build_t2t_roi_head()
+    with torch.no_grad():
+        roi_head.simple_test(feats, proposal_list, img_metas)
+        roi_head.simple_test(feats, proposal_list, img_metas)
+    assert len(roi_head._t2t_cores) == roi_head.num_stages
+    t2t_core = roi_head._get_t2t_core(0, None, None)
+    assert t2t_core is roi_head._t2t_cores[(0, 1., 'eager', True)]
+    # the cached core shares the modules and their mode with the roi head
+    assert t2t_core.token_to_token is roi_head.token_to_token[0]
+    roi_head.train()
+    assert t2t_core.token_to_token.training
+    assert roi_head._get_t2t_core(0, None, None) is t2t_core
+
+
+@pytest.mark.parametrize('backend', ['jit', 'compile'])
+def test_t2t_backend(backend):
+    if backend == 'compile' and not hasattr(torch, 'compile'):
+        pytest.skip('torch.compile needs torch>=2.0')
+    feats, proposal_list, img_metas = _demo_inputs()
+    roi_head = _build_t2t_roi_head()
+    torch.manual_seed(0)
+    with torch.no_grad():
+        results = roi_head.simple_test(feats, proposal_list, img_metas)
+
+    roi_head.test_cfg.t2t_backend = backend
+    # the eager backend of dynamo keeps the test fast
+    roi_head.test_cfg.t2t_compile_cfg = dict(backend='eager')
+    torch.manual_seed(0)
+    with torch.no_grad():
+        core_results = roi_head.simple_test(feats, proposal_list, img_metas)
+    num_cores = sum(key[2] == backend for key in roi_head._t2t_cores)
+    assert num_cores == roi_head.num_stages
+    for result, core_result in zip(results, core_results):
+        for dets, core_dets in zip(result, core_result):
+            assert np.allclose(dets, core_dets, atol=1e-5)
+
+    # the cores are reused for other numbers of RoIs
+    rois = torch.cat([proposal_list[0].new_zeros(7, 1),
+                      proposal_list[0][:7, :4]], dim=1)
+    torch.manual_seed(1)
+    with torch.no_grad():
+        core_results = roi_head._bbox_forward(1, feats, rois)
+    roi_head.test_cfg.t2t_backend = 'eager'
+    torch.manual_seed(1)
+    with torch.no_grad():
+        results = roi_head._bbox_forward(1, feats, rois)
+    num_cores = sum(key[2] == backend for key in roi_head._t2t_cores)
+    assert num_cores == roi_head.num_stages
+    for key in ['cls_score', 'bbox_pred']:
+        assert torch.allclose(results[key], core_results[key], atol=1e-5)
+
+
+def test_forward_train_tiled_assigner():
+    feats, proposal_list, img_metas = _demo_inputs(num_rois=50)
+    gt_bboxes = [p[:8, :4] + torch.rand(8, 4) for p in proposal_list]
+    gt_labels = [torch.randint(0, 8, (8, )) for _ in proposal_list]
+    roi_head = _build_t2t_roi_head().train()
+    torch.manual_seed(0)
+    losses = roi_head.forward_train(feats, img_metas, proposal_list,
+                                    gt_bboxes, gt_labels)
+
+    for assigner in roi_head.bbox_assigner:
+        # stream the gts one by one without the CPU fallback
+        assigner.tile_size = 1
+        assigner.gpu_assign_thr = 4
+    torch.manual_seed(0)
+    tiled_losses = roi_head.forward_train(feats, img_metas, proposal_list,
+                                          gt_bboxes, gt_labels)
+    assert losses.keys() == tiled_losses.keys()
+    for name, value in losses.items():
+        assert torch.allclose(value, tiled_losses[name])
+
+
+def test_forward_train_sparse_assigner():
+    feats, proposal_list, img_metas = _demo_inputs(num_rois=50)
+    gt_bboxes = [p[:8, :4] + torch.rand(8, 4) for p in proposal_list]
+    gt_labels = [torch.randint(0, 8, (8, )) for _ in proposal_list]
+    roi_head = _build_t2t_roi_head().train()
+    torch.manual_seed(0)
+    losses = roi_head.forward_train(feats, img_metas, proposal_list,
+                                    gt_bboxes, gt_labels)
+
+    for assigner in roi_head.bbox_assigner:
+        assigner.sparse = True
+    torch.manual_seed(0)
+    sparse_losses = roi_head.forward_train(feats, img_metas, proposal_list,
+                                           gt_bboxes, gt_labels)
+    assert losses.keys() == sparse_losses.keys()
+    for name, value in losses.items():
+        assert torch.allclose(value, sparse_losses[name])
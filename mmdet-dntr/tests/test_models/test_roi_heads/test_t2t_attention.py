@@ -0,0 +1,57 @@
+import pytest
+import torch
+
+from mmdet.models.roi_heads.cascade_roi_head_cas_t2t_new_jit_mask import \
+    Token_Pair_Attention
+from mmdet.models.roi_heads.cascade_roi_head_cas_t2t_topk import Attention
+from mmdet.models.roi_heads.t2t_models.token_transformer_mask import \
+    Attention as T2TAttention
+
+
+def _check_attn_impl(explicit_attn, sdpa_attn, x, **kwargs):
+    sdpa_attn.load_state_dict(explicit_attn.state_dict())
+    x_sdpa = x.clone().requires_grad_()
+    x = x.clone().requires_grad_()
+    outs = explicit_attn(x, **kwargs)
+    sdpa_outs = sdpa_attn(x_sdpa, **kwargs)
+    if isinstance(outs, torch.Tensor):
+        outs, sdpa_outs = (outs, ), (sdpa_outs, )
+    for out, sdpa_out in zip(outs, sdpa_outs):
+        if isinstance(out, torch.Tensor):
+            assert torch.allclose(out, sdpa_out, atol=1e-5)
+        else:
+            assert out == sdpa_out
+    outs[0].sum().backward()
+    sdpa_outs[0].sum().backward()
+    assert torch.allclose(x.grad, x_sdpa.grad, atol=1e-5)
+
+
+def test_token_pair_attention_impl():
+    torch.manual_seed(0)
+    with pytest.raises(AssertionError):
+        Token_Pair_Attention(128, attn_impl='flash')
+    x = torch.rand(7, 18, 128)
+    _check_attn_impl(
+        Token_Pair_Attention(128, num_heads=8),
+        Token_Pair_Attention(128, num_heads=8, attn_impl='sdpa'), x)
+
+
+@pytest.mark.parametrize('mask', [True, False])
+def test_t2t_attention_impl(mask):
+    torch.manual_seed(0)
+    x = torch.rand(7, 66, 256)
+    _check_attn_impl(
+        T2TAttention(256, in_dim=100, mask=mask),
+        T2TAttention(256, in_dim=100, mask=mask, attn_impl='sdpa'), x)
+
+
+def test_evit_attention_impl():
+    torch.manual_seed(0)
+    x = torch.rand(7, 17, 128)
+    _check_attn_impl(
+        Attention(128, num_heads=8),
+        Attention(128, num_heads=8, attn_impl='sdpa'), x)
+    # token pruning needs the attention probabilities of the cls token
+    _check_attn_impl(
+        Attention(128, num_heads=8, keep_rate=0.5),
+        Attention(128, num_heads=8, keep_rate=0.5, attn_impl='sdpa'), x)
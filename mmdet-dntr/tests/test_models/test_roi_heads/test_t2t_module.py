@@ -0,0 +1,84 @@
+import random
+
+import torch
+
+from mmdet.models.roi_heads.t2t_models.t2t_vit import T2T_module
+
+
+def _concat_shuffle(x, index):
+    """The four-way concat previously used by T2T_module.forward."""
+    x = x.transpose(1, 2).reshape(-1, 16, 256, 9).transpose(0, 3)
+    x = torch.cat((x[index[0]], x[index[1]], x[index[2]], x[index[3]]),
+                  dim=1)
+    return x.transpose(0, 3).reshape(-1, 64, 256 * 9)
+
+
+def test_t2t_shuffle_gather_index():
+    x = torch.rand(5, 256 * 9, 16)
+    for _ in range(3):
+        index = [list(range(9)), list(range(8, -1, -1)),
+                 list(range(9)), list(range(9))]
+        for i in range(1, 4):
+            random.shuffle(index[i])
+        gather_index = T2T_module._gather_index(index, 16, 256)
+        shuffled = x.flatten(1).index_select(1, gather_index).view(5, 64, -1)
+        assert torch.equal(shuffled, _concat_shuffle(x, index))
+
+
+def test_t2t_shuffle_index():
+    t2t_module = T2T_module(
+        img_size=7,
+        tokens_type='transformer',
+        in_chans=256,
+        embed_dim=128,
+        token_dim=100,
+        shuffle_seed=3)
+    index = t2t_module.get_shuffle_index()
+    assert index.shape == (4, 9)
+    assert index[0].tolist() == list(range(9))
+    assert (index.sort(dim=1)[0] == torch.arange(9)).all()
+
+    # the same seed draws the same shuffles
+    other_module = T2T_module(
+        img_size=7,
+        tokens_type='transformer',
+        in_chans=256,
+        embed_dim=128,
+        token_dim=100,
+        shuffle_seed=3)
+    assert torch.equal(index, other_module.get_shuffle_index())
+
+    t2t_module.eval()
+    assert t2t_module.get_shuffle_index() is not t2t_module.identity_index
+    t2t_module.shuffle_in_eval = False
+    assert t2t_module.get_shuffle_index() is t2t_module.identity_index
+    t2t_module.train()
+    assert t2t_module.get_shuffle_index() is not t2t_module.identity_index
+
+
+def test_t2t_forward_identity_layout():
+    t2t_module = T2T_module(
+        img_size=7,
+        tokens_type='transformer',
+        in_chans=256,
+        embed_dim=128,
+        token_dim=100,
+        shuffle_in_eval=False).eval()
+    x = torch.rand(3, 256, 7, 7)
+    cls_token = torch.rand(3, 1, 256 * 9)
+    bbox_token = torch.rand(3, 1, 256 * 9)
+    with torch.no_grad():
+        outs = t2t_module(
+            x,
+            random_shuffle_forward=True,
+            cls_token=cls_token,
+            bbox_token=bbox_token)
+        expected = t2t_module(
+            x,
+            random_shuffle_forward=True,
+            cls_token=cls_token,
+            bbox_token=bbox_token,
+            shuffle_index=[list(range(9))] * 4)
+    assert outs[0].shape == (3, 64, 128)
+    for out, expected_out in zip(outs, expected):
+        assert torch.equal(out, expected_out)
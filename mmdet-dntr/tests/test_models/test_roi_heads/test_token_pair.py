@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import torch
+
+from mmdet.models.roi_heads.cascade_roi_head_cas_t2t_new_jit_mask import \
+    Token_pair_block
+from mmdet.models.roi_heads.evit.helpers import pair_token_idx
+
+
+def _gpu_pair(token_compare, index, B, N):
+    """The python loop previously used by Token_pair_block."""
+    idx = np.zeros([B, N - 2], dtype=np.int64)
+    for b in range(B):
+        box_token_cnt = 0
+        cls_token_cnt = 15
+        for j in index[b]:
+            if token_compare[b, j]:
+                idx[b, box_token_cnt] = int(j)
+                box_token_cnt += 1
+            else:
+                idx[b, cls_token_cnt] = int(j)
+                cls_token_cnt -= 1
+    return idx
+
+
+@pytest.mark.parametrize('num_rois', [1, 7, 300])
+def test_pair_token_idx(num_rois):
+    torch.manual_seed(num_rois)
+    cls_attn = torch.rand(num_rois, 16)
+    box_attn = torch.rand(num_rois, 16)
+    # all-box and all-cls rows are the edge cases of the split
+    box_attn[0] = cls_attn[0] + 1
+    if num_rois > 1:
+        box_attn[1] = cls_attn[1] - 1
+    _, index = torch.sort(cls_attn + box_attn, descending=True)
+    token_compare = torch.gt(box_attn, cls_attn)
+
+    idx = pair_token_idx(token_compare, index)
+    expected = _gpu_pair(token_compare.numpy(), index.numpy(), num_rois, 18)
+    assert idx.dtype == index.dtype
+    assert idx.device == index.device
+    assert np.array_equal(idx.numpy(), expected)
+
+
+def test_token_pair_block_forward():
+    torch.manual_seed(0)
+    block = Token_pair_block(dim=128, num_heads=8).eval()
+    general_token = torch.rand(5, 16, 128)
+    cls_token = torch.rand(5, 1, 128)
+    box_token = torch.rand(5, 1, 128)
+    with torch.no_grad():
+        cls_task_token, box_task_token = block(
+            general_token=general_token,
+            cls_token=cls_token,
+            box_token=box_token)
+    assert cls_task_token.shape == (5, 9, 128)
+    assert box_task_token.shape == (5, 9, 128)
@@ -307,6 +307,74 @@ def test_strides():
     assert torch.equal(anchors[0], expected_anchors)
 
 
+def test_window_prior_inds():
+    from mmdet.core import AnchorGenerator
+
+    self = AnchorGenerator([(4, 6), 8], [0.5, 1., 2.], [8], center_offset=0.5)
+    featmap_sizes = [(10, 15), (8, 8)]
+    anchors = torch.cat(self.grid_priors(featmap_sizes, device='cpu'))
+    centers = (anchors[:, :2] + anchors[:, 2:]) / 2
+    points = torch.Tensor([[0., 0.], [30.3, 17.9], [59., 70.], [-20., 5.]])
+    inds = self.window_prior_inds(points, featmap_sizes, 10, device='cpu')
+    assert inds.size(0) == 4
+    for point, point_inds in zip(points, inds):
+        point_inds = point_inds[point_inds >= 0]
+        # all anchors within the radius, increasing without duplicates
+        dists = (centers - point).abs().max(dim=1)[0]
+        assert set(torch.nonzero(dists <= 10).view(-1).tolist()) <= set(
+            point_inds.tolist())
+        assert (point_inds[1:] > point_inds[:-1]).all()
+        assert (dists[point_inds] <= 10 + 8).all()
+
+    # an image without gts
+    empty_inds = self.window_prior_inds(
+        points[:0], featmap_sizes, 10, device='cpu')
+    assert empty_inds.shape == (0, inds.size(1))
+
+
+def test_anchor_generator_cache():
+    from mmdet.core import AnchorGenerator
+
+    featmap_sizes = [(10, 15), (5, 8)]
+    self = AnchorGenerator([8, 16], [0.5, 1., 2.], [8], cache_size=2)
+    uncached = AnchorGenerator([8, 16], [0.5, 1., 2.], [8])
+    anchors = self.grid_priors(featmap_sizes, device='cpu')
+    assert all(
+        torch.equal(a, b) for a, b in zip(
+            anchors, uncached.grid_priors(featmap_sizes, device='cpu')))
+    # the tensors are reused, the list is new
+    cached = self.grid_priors(
+        [torch.Size(size) for size in featmap_sizes], device='cpu')
+    assert cached is not anchors
+    assert all(a is b for a, b in zip(anchors, cached))
+    assert uncached.grid_priors(featmap_sizes, device='cpu')[0] is not \
+        uncached.grid_priors(featmap_sizes, device='cpu')[0]
+    # the dtype is part of the key
+    assert self.grid_priors(
+        featmap_sizes, dtype=torch.float64,
+        device='cpu')[0].dtype == torch.float64
+
+    flags = self.valid_flags(featmap_sizes, (70, 120, 3), device='cpu')
+    assert all(
+        torch.equal(a, b) for a, b in zip(
+            flags,
+            uncached.valid_flags(featmap_sizes, (70, 120, 3), device='cpu')))
+    assert self.valid_flags(featmap_sizes, (70, 120), device='cpu')[0] is \
+        flags[0]
+    assert self.valid_flags(featmap_sizes, (80, 120), device='cpu')[0] is \
+        not flags[0]
+    # only the 2 most recently used results are kept
+    assert len(self._cache) == 2
+    assert self.valid_flags(featmap_sizes, (70, 120), device='cpu')[0] is \
+        flags[0]
+    assert self.grid_priors(featmap_sizes, device='cpu')[0] is not anchors[0]
+
+    self.clear_cache()
+    assert len(self._cache) == 0
+    assert self.valid_flags(featmap_sizes, (70, 120), device='cpu')[0] is \
+        not flags[0]
+
+
 def test_ssd_anchor_generator():
     from mmdet.core.anchor import build_anchor_generator
     if torch.cuda.is_available():
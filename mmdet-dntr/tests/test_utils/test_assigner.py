@@ -8,11 +8,13 @@ CommandLine:
 import pytest
 import torch
 
+from mmdet.core import SparseBboxOverlaps
 from mmdet.core.bbox.assigners import (ApproxMaxIoUAssigner,
                                        CenterRegionAssigner, HungarianAssigner,
                                        MaskHungarianAssigner, MaxIoUAssigner,
-                                       PointAssigner, SimOTAAssigner,
-                                       TaskAlignedAssigner, UniformAssigner)
+                                       PointAssigner, RankingAssigner,
+                                       SimOTAAssigner, TaskAlignedAssigner,
+                                       UniformAssigner)
 
 
 def test_max_iou_assigner():
@@ -155,6 +157,123 @@ def test_max_iou_assigner_with_empty_boxes_and_gt():
     assert len(assign_result.gt_inds) == 0
 
 
+
+def _loop_max_iou_assign(self, overlaps):
+    """The former per-gt loop of the low quality matches."""
+    max_overlaps, argmax_overlaps = overlaps.max(dim=0)
+    gt_max_overlaps, gt_argmax_overlaps = overlaps.max(dim=1)
+    gt_inds = overlaps.new_full((overlaps.size(1), ), -1, dtype=torch.long)
+    gt_inds[(max_overlaps >= 0) & (max_overlaps < self.neg_iou_thr)] = 0
+    pos_inds = max_overlaps >= self.pos_iou_thr
+    gt_inds[pos_inds] = argmax_overlaps[pos_inds] + 1
+    if self.match_low_quality:
+        for i in range(overlaps.size(0)):
+            if gt_max_overlaps[i] >= self.min_pos_iou:
+                if self.gt_max_assign_all:
+                    gt_inds[overlaps[i, :] == gt_max_overlaps[i]] = i + 1
+                else:
+                    gt_inds[gt_argmax_overlaps[i]] = i + 1
+    return gt_inds
+
+
+@pytest.mark.parametrize('match_low_quality', [True, False])
+@pytest.mark.parametrize('gt_max_assign_all', [True, False])
+def test_max_iou_assigner_tiled(match_low_quality, gt_max_assign_all):
+    torch.manual_seed(0)
+    # integer boxes give ties in the overlaps
+    xy = torch.randint(0, 60, (300, 2)).float()
+    bboxes = torch.cat((xy, xy + torch.randint(2, 20, (300, 2))), dim=1)
+    xy = torch.randint(0, 60, (70, 2)).float()
+    gt_bboxes = torch.cat((xy, xy + torch.randint(2, 20, (70, 2))), dim=1)
+    gt_bboxes = torch.cat((gt_bboxes, gt_bboxes[:5]))
+    gt_labels = torch.randint(0, 8, (75, ))
+    gt_bboxes_ignore = torch.Tensor([[0, 0, 15, 15]])
+    kwargs = dict(
+        pos_iou_thr=0.5,
+        neg_iou_thr=0.4,
+        min_pos_iou=0.1,
+        ignore_iof_thr=0.5,
+        match_low_quality=match_low_quality,
+        gt_max_assign_all=gt_max_assign_all)
+    self = MaxIoUAssigner(**kwargs)
+    assign_result = self.assign(bboxes, gt_bboxes, gt_bboxes_ignore,
+                                gt_labels)
+    overlaps = self.iou_calculator(gt_bboxes, bboxes)
+    overlaps[:, self.iou_calculator(bboxes, gt_bboxes_ignore,
+                                    mode='iof').max(dim=1)[0] > 0.5] = -1
+    assert torch.equal(assign_result.gt_inds,
+                       _loop_max_iou_assign(self, overlaps))
+    assert (assign_result.gt_inds > 0).any()
+
+    for tile_size in [1, 3000, 10**6]:
+        tiled = MaxIoUAssigner(
+            tile_size=tile_size, gpu_assign_thr=10, **kwargs)
+        tiled_result = tiled.assign(bboxes, gt_bboxes, gt_bboxes_ignore,
+                                    gt_labels)
+        assert torch.equal(assign_result.gt_inds, tiled_result.gt_inds)
+        assert torch.equal(assign_result.max_overlaps,
+                           tiled_result.max_overlaps)
+        assert torch.equal(assign_result.labels, tiled_result.labels)
+
+    tiled_result = tiled.assign(bboxes, gt_bboxes[:0], gt_labels=gt_labels[:0])
+    assert (tiled_result.gt_inds == 0).all()
+    tiled_result = tiled.assign(bboxes[:0], gt_bboxes, gt_labels=gt_labels)
+    assert tiled_result.gt_inds.numel() == 0
+
+
+@pytest.mark.parametrize('match_low_quality', [True, False])
+@pytest.mark.parametrize('gt_max_assign_all', [True, False])
+def test_max_iou_assigner_sparse(match_low_quality, gt_max_assign_all):
+    torch.manual_seed(0)
+    # integer boxes give ties in the overlaps
+    xy = torch.randint(0, 60, (300, 2)).float()
+    bboxes = torch.cat((xy, xy + torch.randint(2, 20, (300, 2))), dim=1)
+    xy = torch.randint(0, 60, (70, 2)).float()
+    gt_bboxes = torch.cat((xy, xy + torch.randint(2, 20, (70, 2))), dim=1)
+    gt_bboxes = torch.cat((gt_bboxes, gt_bboxes[:5]))
+    gt_labels = torch.randint(0, 8, (75, ))
+    gt_bboxes_ignore = torch.Tensor([[0, 0, 15, 15]])
+    kwargs = dict(
+        pos_iou_thr=0.5,
+        neg_iou_thr=0.4,
+        min_pos_iou=0.1,
+        ignore_iof_thr=0.5,
+        match_low_quality=match_low_quality,
+        gt_max_assign_all=gt_max_assign_all)
+    assign_result = MaxIoUAssigner(**kwargs).assign(bboxes, gt_bboxes,
+                                                    gt_bboxes_ignore,
+                                                    gt_labels)
+    sparse = MaxIoUAssigner(sparse=True, gpu_assign_thr=10, **kwargs)
+    # the gt side is built once and reused by several sets of bboxes
+    gt_overlaps = SparseBboxOverlaps(gt_bboxes)
+    for _ in range(2):
+        sparse_result = sparse.assign(
+            bboxes,
+            gt_bboxes,
+            gt_bboxes_ignore,
+            gt_labels,
+            gt_overlaps=gt_overlaps)
+        assert torch.equal(assign_result.gt_inds, sparse_result.gt_inds)
+        assert torch.equal(assign_result.max_overlaps,
+                           sparse_result.max_overlaps)
+        assert torch.equal(assign_result.labels, sparse_result.labels)
+    assert (sparse_result.gt_inds > 0).any()
+    # a bbox without any overlap
+    sparse_result = sparse.assign(
+        torch.Tensor([[100, 100, 110, 110]]), gt_bboxes, gt_labels=gt_labels)
+    assert sparse_result.gt_inds.tolist() == [0]
+    assert sparse_result.max_overlaps.tolist() == [0]
+
+    sparse_result = sparse.assign(
+        bboxes, gt_bboxes[:0], gt_labels=gt_labels[:0])
+    assert (sparse_result.gt_inds == 0).all()
+    sparse_result = sparse.assign(bboxes[:0], gt_bboxes, gt_labels=gt_labels)
+    assert sparse_result.gt_inds.numel() == 0
+
+    with pytest.raises(AssertionError):
+        MaxIoUAssigner(0.5, 0.5, sparse=True)
+
+
 def test_point_assigner():
     self = PointAssigner()
     points = torch.FloatTensor([  # [x, y, stride]
@@ -660,3 +779,222 @@ def test_mask_hungarian_match_assigner():
         dice_cost=dict(type='DiceCost', weight=0.0, pred_act=True, eps=1.0))
     with pytest.raises(AssertionError):
         self = MaskHungarianAssigner(**assigner_cfg)
+
+
+def _ranking_assign_loop(overlaps, topk):
+    """The per-gt loop previously used by RankingAssigner."""
+    max_overlaps, _ = overlaps.max(dim=0)
+    gt_max_overlaps, _ = overlaps.topk(topk, dim=1)
+    assigned_gt_inds = overlaps.new_full((overlaps.size(1), ),
+                                         -1,
+                                         dtype=torch.long)
+    assigned_gt_inds[(max_overlaps >= 0) & (max_overlaps < 0.3)] = 0
+    for i in range(overlaps.size(0)):
+        for j in range(topk):
+            assigned_gt_inds[overlaps[i, :] == gt_max_overlaps[i, j]] = i + 1
+    return assigned_gt_inds
+
+
+@pytest.mark.parametrize('num_gts,topk', [(1, 1), (10, 3), (200, 9)])
+def test_ranking_assigner_topk(num_gts, topk):
+    torch.manual_seed(num_gts)
+    self = RankingAssigner(topk=topk)
+    # random overlaps have no ties, so the loop and the scatter agree
+    overlaps = torch.rand(num_gts, 1000)
+    gt_labels = torch.randint(0, 8, (num_gts, ))
+    assign_result = self.assign_wrt_ranking(overlaps, gt_labels)
+    expected_gt_inds = _ranking_assign_loop(overlaps, topk)
+    assert torch.equal(assign_result.gt_inds, expected_gt_inds)
+    pos_inds = expected_gt_inds > 0
+    assert torch.equal(assign_result.labels[pos_inds],
+                       gt_labels[expected_gt_inds[pos_inds] - 1])
+    assert (assign_result.labels[~pos_inds] == -1).all()
+
+
+def test_ranking_assigner_tie_break():
+    self = RankingAssigner(topk=2)
+    overlaps = torch.FloatTensor([
+        [0.9, 0.1, 0.5, 0.5],
+        [0.8, 0.7, 0.1, 0.1],
+    ])
+    assign_result = self.assign_wrt_ranking(overlaps)
+    # the first bbox is in the top-k of both gts and goes to the last gt
+    assert assign_result.gt_inds[0] == 2
+    assert assign_result.gt_inds[1] == 2
+    # the first gt takes only one of its tied bboxes
+    assert (assign_result.gt_inds[2:] == 1).sum() == 1
+
+    # fewer bboxes than topk
+    self = RankingAssigner(topk=9)
+    assign_result = self.assign_wrt_ranking(overlaps)
+    assert torch.equal(assign_result.gt_inds, torch.LongTensor([2, 2, 2, 2]))
+
+
+def test_ranking_assigner_tiled():
+    torch.manual_seed(0)
+    xy = torch.rand(2000, 2) * 400
+    bboxes = torch.cat((xy, xy + torch.rand(2000, 2) * 30 + 1), dim=1)
+    xy = torch.rand(50, 2) * 400
+    gt_bboxes = torch.cat((xy, xy + torch.rand(50, 2) * 30 + 1), dim=1)
+    gt_labels = torch.randint(0, 8, (50, ))
+    gt_bboxes_ignore = torch.Tensor([[0, 0, 100, 100]])
+    iou_calculator = dict(type='BboxDistanceMetric')
+    with pytest.raises(AssertionError):
+        RankingAssigner(tile_size=1000)
+
+    self = RankingAssigner(
+        ignore_iof_thr=0.5,
+        iou_calculator=iou_calculator,
+        assign_metric='nwd',
+        topk=3)
+    tiled = RankingAssigner(
+        ignore_iof_thr=0.5,
+        iou_calculator=iou_calculator,
+        assign_metric='nwd',
+        topk=3,
+        tile_size=50 * 128)
+    assign_result = self.assign(bboxes, gt_bboxes, gt_bboxes_ignore,
+                                gt_labels)
+    tiled_result = tiled.assign(bboxes, gt_bboxes, gt_bboxes_ignore,
+                                gt_labels)
+    assert torch.equal(assign_result.gt_inds, tiled_result.gt_inds)
+    assert torch.equal(assign_result.labels, tiled_result.labels)
+    assert torch.allclose(assign_result.max_overlaps,
+                          tiled_result.max_overlaps)
+
+    tiled_result = tiled.assign(bboxes, gt_bboxes[:0])
+    assert (tiled_result.gt_inds == 0).all()
+    tiled_result = tiled.assign(bboxes[:0], gt_bboxes)
+    assert tiled_result.gt_inds.numel() == 0
+
+
+@pytest.mark.parametrize('assign_metric', ['nwd', 'dotd'])
+def test_ranking_assigner_candidates(assign_metric):
+    from mmdet.core.anchor import AnchorGenerator
+    anchor_generator = AnchorGenerator(
+        strides=[4, 8, 16, 32, 64], ratios=[0.5, 1.0, 2.0], scales=[8])
+    featmap_sizes = [(64 // 2**i, 64 // 2**i) for i in range(5)]
+    flat_anchors = torch.cat(
+        anchor_generator.grid_priors(featmap_sizes, device='cpu'))
+    # drop the anchors crossing the border as allowed_border=0 does
+    inside_flags = (flat_anchors[:, :2] >= 0).all(dim=1) & (
+        flat_anchors[:, 2:] <= 256).all(dim=1)
+    bboxes = flat_anchors[inside_flags]
+
+    torch.manual_seed(0)
+    xy = torch.rand(40, 2) * 240
+    wh = torch.rand(40, 2) * 20 + 2
+    # a large gt whose top-k is outside its window
+    gt_bboxes = torch.cat((torch.cat((xy, xy + wh), dim=1),
+                           torch.Tensor([[0, 0, 250, 250]])))
+    gt_labels = torch.randint(0, 8, (41, ))
+    gt_bboxes_ignore = torch.Tensor([[0, 0, 60, 60]])
+    candidate_inds = anchor_generator.window_prior_inds(
+        (gt_bboxes[:, :2] + gt_bboxes[:, 2:]) / 2,
+        featmap_sizes,
+        radius=24,
+        device='cpu')
+    inside_inds = inside_flags.long().cumsum(0) - 1
+    inside_inds[~inside_flags] = -1
+    candidate_inds = torch.where(candidate_inds >= 0,
+                                 inside_inds[candidate_inds.clamp(min=0)],
+                                 candidate_inds)
+
+    iou_calculator = dict(type='BboxDistanceMetric')
+    with pytest.raises(AssertionError):
+        RankingAssigner(candidate_radius=24)
+    with pytest.raises(AssertionError):
+        RankingAssigner(
+            iou_calculator=iou_calculator,
+            assign_metric=assign_metric,
+            candidate_radius=8)
+    for tile_size in [None, 4096]:
+        self = RankingAssigner(
+            ignore_iof_thr=0.5,
+            iou_calculator=iou_calculator,
+            assign_metric=assign_metric,
+            topk=3)
+        sparse = RankingAssigner(
+            ignore_iof_thr=0.5,
+            iou_calculator=iou_calculator,
+            assign_metric=assign_metric,
+            topk=3,
+            tile_size=tile_size,
+            candidate_radius=24)
+        assign_result = self.assign(bboxes, gt_bboxes, gt_bboxes_ignore,
+                                    gt_labels)
+        sparse_result = sparse.assign(
+            bboxes,
+            gt_bboxes,
+            gt_bboxes_ignore,
+            gt_labels,
+            candidate_inds=candidate_inds)
+        assert torch.equal(assign_result.gt_inds, sparse_result.gt_inds)
+        assert torch.equal(assign_result.labels, sparse_result.labels)
+        assert (assign_result.gt_inds > 0).sum() > 0
+        # the overlaps are exact wherever they decide the assignment
+        max_overlaps = assign_result.max_overlaps
+        exact = (max_overlaps >= 0.3) | (max_overlaps < 0)
+        assert torch.allclose(max_overlaps[exact],
+                              sparse_result.max_overlaps[exact])
+
+    sparse_result = sparse.assign(
+        bboxes, gt_bboxes[:0], candidate_inds=candidate_inds[:0])
+    assert (sparse_result.gt_inds == 0).all()
+
+
+@pytest.mark.parametrize('assign_metric', ['iou', 'nwd'])
+@pytest.mark.parametrize(
+    'assigner_cfg',
+    [
+        dict(),
+        # the 20 gts image on its own, the others in two chunks
+        dict(tile_size=4000),
+        # the 20 gts image on the CPU
+        dict(gpu_assign_thr=10)
+    ])
+def test_ranking_assigner_batch(assign_metric, assigner_cfg):
+    self = RankingAssigner(
+        ignore_iof_thr=0.5,
+        iou_calculator=dict(type='BboxDistanceMetric'),
+        assign_metric=assign_metric,
+        topk=3,
+        **assigner_cfg)
+    torch.manual_seed(0)
+    xy = torch.rand(300, 2) * 240
+    bboxes = torch.cat((xy, xy + torch.rand(300, 2) * 30 + 2), dim=1)
+    bbox_valid = torch.rand(3, 300) > 0.2
+    gt_bboxes_list = []
+    for num_gts in [7, 0, 20]:
+        xy = torch.rand(num_gts, 2) * 240
+        gt_bboxes_list.append(
+            torch.cat((xy, xy + torch.rand(num_gts, 2) * 30 + 2), dim=1))
+    gt_labels_list = [torch.randint(0, 8, (len(g), )) for g in gt_bboxes_list]
+    gt_bboxes_ignore = [torch.Tensor([[0, 0, 60, 60]]), None, None]
+
+    gt_bboxes = torch.zeros(3, 20, 4)
+    gt_labels = torch.zeros(3, 20, dtype=torch.long)
+    gt_valid = torch.zeros(3, 20, dtype=torch.bool)
+    for i, (g, labels) in enumerate(zip(gt_bboxes_list, gt_labels_list)):
+        gt_bboxes[i, :len(g)] = g
+        gt_labels[i, :len(g)] = labels
+        gt_valid[i, :len(g)] = True
+    gt_inds, max_overlaps, labels = self.assign_batch(
+        bboxes.expand(3, 300, 4),
+        gt_bboxes,
+        gt_valid,
+        bbox_valid=bbox_valid,
+        gt_bboxes_ignore=gt_bboxes_ignore,
+        gt_labels=gt_labels)
+    assert gt_inds.shape == max_overlaps.shape == labels.shape == (3, 300)
+    for i in range(3):
+        valid = bbox_valid[i]
+        assign_result = self.assign(bboxes[valid], gt_bboxes_list[i],
+                                    gt_bboxes_ignore[i], gt_labels_list[i])
+        assert torch.equal(gt_inds[i, valid], assign_result.gt_inds)
+        assert torch.equal(labels[i, valid], assign_result.labels)
+        assert torch.allclose(max_overlaps[i, valid],
+                              assign_result.max_overlaps)
+        assert (gt_inds[i, ~valid] == -1).all()
+    assert (gt_inds[1, bbox_valid[1]] == 0).all()
+    assert (gt_inds > 0).sum() > 0
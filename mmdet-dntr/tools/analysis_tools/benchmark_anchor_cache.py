@@ -0,0 +1,135 @@
+import argparse
+import time
+
+import mmcv
+import torch
+
+from mmdet.models.dense_heads import RPNHead
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the anchor cache of AnchorGenerator in the '
+        'target and proposal computation of the DNTR rpn head')
+    parser.add_argument(
+        '--batch-size', type=int, default=2, help='images per iteration')
+    parser.add_argument(
+        '--num-gts', type=int, default=50, help='number of gts per image')
+    parser.add_argument(
+        '--img-size', type=int, default=800, help='size of the square image')
+    parser.add_argument(
+        '--repeat-num', type=int, default=10, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cpu', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(fn, repeat_num, is_cuda):
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up, it also fills the cache
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000, result
+
+
+def build_rpn_head(cache_size):
+    # the rpn head of configs/aitod-dntr/aitod_DNTR_mask.py
+    train_cfg = mmcv.Config(
+        dict(
+            assigner=dict(
+                type='RankingAssigner',
+                ignore_iof_thr=-1,
+                gpu_assign_thr=512,
+                iou_calculator=dict(type='BboxDistanceMetric'),
+                assign_metric='nwd',
+                topk=3),
+            sampler=dict(
+                type='RandomSampler',
+                num=256,
+                pos_fraction=0.5,
+                neg_pos_ub=-1,
+                add_gt_as_proposals=False),
+            allowed_border=0,
+            pos_weight=-1,
+            debug=False))
+    test_cfg = mmcv.Config(
+        dict(
+            nms_pre=3000,
+            max_per_img=3000,
+            nms=dict(type='nms', iou_threshold=0.7),
+            min_bbox_size=0))
+    return RPNHead(
+        in_channels=256,
+        feat_channels=256,
+        anchor_generator=dict(
+            type='AnchorGenerator',
+            scales=[8],
+            ratios=[0.5, 1.0, 2.0],
+            strides=[4, 8, 16, 32, 64],
+            cache_size=cache_size),
+        train_cfg=train_cfg,
+        test_cfg=test_cfg).eval()
+
+
+def main():
+    args = parse_args()
+    is_cuda = torch.device(args.device).type == 'cuda'
+    featmap_sizes = [(-(-args.img_size // stride), ) * 2
+                     for stride in [4, 8, 16, 32, 64]]
+    img_metas = [
+        dict(
+            img_shape=(args.img_size, args.img_size, 3),
+            pad_shape=(args.img_size, args.img_size, 3),
+            scale_factor=1.) for _ in range(args.batch_size)
+    ]
+    gt_bboxes = []
+    for _ in range(args.batch_size):
+        # tiny objects as in AI-TOD
+        xy = torch.rand(args.num_gts, 2, device=args.device) * (
+            args.img_size - 32)
+        wh = torch.rand(args.num_gts, 2, device=args.device) * 28 + 2
+        gt_bboxes.append(torch.cat((xy, xy + wh), dim=1))
+    uncached = build_rpn_head(0).to(args.device)
+    cls_scores = [
+        torch.rand(args.batch_size, 3, h, w, device=args.device)
+        for h, w in featmap_sizes
+    ]
+    bbox_preds = [
+        torch.rand(args.batch_size, 12, h, w, device=args.device) * 0.1
+        for h, w in featmap_sizes
+    ]
+
+    def get_targets(head):
+        anchor_list, valid_flag_list = head.get_anchors(
+            featmap_sizes, img_metas, device=args.device)
+        return head.get_targets(anchor_list, valid_flag_list, gt_bboxes,
+                                img_metas)
+
+    def get_bboxes(head):
+        with torch.no_grad():
+            return head.get_bboxes(cls_scores, bbox_preds, img_metas=img_metas)
+
+    print(f'{"step":>12} {"uncached (ms)":>14} {"cached (ms)":>12} '
+          f'{"saved (ms)":>11}')
+    for name, fn in [('get_anchors', lambda h: h.get_anchors(
+            featmap_sizes, img_metas, device=args.device)),
+                     ('get_targets', get_targets),
+                     ('get_bboxes', get_bboxes)]:
+        cached = build_rpn_head(4).to(args.device)
+        uncached_time, _ = measure(lambda: fn(uncached), args.repeat_num,
+                                   is_cuda)
+        cached_time, _ = measure(lambda: fn(cached), args.repeat_num,
+                                 is_cuda)
+        print(f'{name:>12} {uncached_time:>14.2f} {cached_time:>12.2f} '
+              f'{uncached_time - cached_time:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.models.roi_heads.cascade_roi_head_cas_t2t_new_jit_mask import \
+    Token_Pair_Attention
+from mmdet.models.roi_heads.cascade_roi_head_cas_t2t_topk import Attention
+from mmdet.models.roi_heads.t2t_models.token_transformer_mask import \
+    Attention as T2TAttention
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Throughput of the explicit and sdpa attention backends '
+        'of the T2T attention modules')
+    parser.add_argument(
+        '--num-rois',
+        type=int,
+        nargs='+',
+        default=[512, 2048, 6000],
+        help='numbers of RoIs to benchmark')
+    parser.add_argument(
+        '--repeat-num', type=int, default=10, help='number of repeat times')
+    parser.add_argument(
+        '--backward',
+        action='store_true',
+        help='also time the backward pass')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def build_modules(attn_impl):
+    """The attention modules of the T2T cascade head with their shapes."""
+    return {
+        'T2T Attention': (T2TAttention(
+            256 * 9, in_dim=100, mask=True, attn_impl=attn_impl), 66, 256 * 9),
+        'Token_Pair_Attention': (Token_Pair_Attention(
+            128, num_heads=8, attn_impl=attn_impl), 18, 128),
+        # cls token, 16 cls and 16 box tokens of Cascade_t2t_evit_RoIHead
+        'EViT Attention': (Attention(
+            128, num_heads=8, keep_rate=0.5, attn_impl=attn_impl), 33, 128),
+    }
+
+
+def measure(module, x, repeat_num, backward):
+    is_cuda = x.is_cuda
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        with torch.set_grad_enabled(backward):
+            out = module(x)
+            if not isinstance(out, torch.Tensor):
+                out = out[0]
+            if backward:
+                out.sum().backward()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000
+
+
+def main():
+    args = parse_args()
+    explicit_modules = build_modules('explicit')
+    sdpa_modules = build_modules('sdpa')
+    print(f'{"module":<22} {"rois":>6} {"explicit (ms)":>14} '
+          f'{"sdpa (ms)":>10}')
+    for name, (explicit_module, num_tokens, dim) in explicit_modules.items():
+        sdpa_module = sdpa_modules[name][0]
+        sdpa_module.load_state_dict(explicit_module.state_dict())
+        explicit_module.to(args.device).train(args.backward)
+        sdpa_module.to(args.device).train(args.backward)
+        for num_rois in args.num_rois:
+            x = torch.rand(num_rois, num_tokens, dim, device=args.device)
+            times = [
+                measure(module, x, args.repeat_num, args.backward)
+                for module in (explicit_module, sdpa_module)
+            ]
+            print(f'{name:<22} {num_rois:>6} {times[0]:>14.2f} '
+                  f'{times[1]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
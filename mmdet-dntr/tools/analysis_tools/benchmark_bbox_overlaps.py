@@ -0,0 +1,125 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.core.bbox.iou_calculators.metric_calculator import bbox_overlaps
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the former broadcast bbox_overlaps of '
+        'metric_calculator against the per-mode kernels')
+    parser.add_argument(
+        '--modes',
+        nargs='+',
+        default=['iou', 'giou', 'nwd', 'dotd'],
+        choices=['iou', 'giou', 'nwd', 'dotd'],
+        help='modes to benchmark')
+    parser.add_argument(
+        '--num-gts', type=int, default=100, help='number of gts')
+    parser.add_argument(
+        '--num-bboxes',
+        type=int,
+        default=200000,
+        help='number of anchors, ~200k for an 800x800 image')
+    parser.add_argument(
+        '--repeat-num', type=int, default=5, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def broadcast_overlaps(bboxes1, bboxes2, mode, eps=1e-6, constant=12.7,
+                       weight=2):
+    """The former bbox_overlaps, the iou terms are computed for every
+    mode."""
+    area1 = (bboxes1[..., 2] - bboxes1[..., 0]) * (
+        bboxes1[..., 3] - bboxes1[..., 1])
+    area2 = (bboxes2[..., 2] - bboxes2[..., 0]) * (
+        bboxes2[..., 3] - bboxes2[..., 1])
+    lt = torch.max(bboxes1[..., :, None, :2], bboxes2[..., None, :, :2])
+    rb = torch.min(bboxes1[..., :, None, 2:], bboxes2[..., None, :, 2:])
+    wh = (rb - lt).clamp(min=0)
+    overlap = wh[..., 0] * wh[..., 1]
+    union = area1[..., None] + area2[..., None, :] - overlap + eps
+    if mode == 'giou':
+        enclosed_lt = torch.min(bboxes1[..., :, None, :2],
+                                bboxes2[..., None, :, :2])
+        enclosed_rb = torch.max(bboxes1[..., :, None, 2:],
+                                bboxes2[..., None, :, 2:])
+    eps = union.new_tensor([eps])
+    union = torch.max(union, eps)
+    ious = overlap / union
+    if mode == 'iou':
+        return ious
+    if mode == 'giou':
+        enclose_wh = (enclosed_rb - enclosed_lt).clamp(min=0)
+        enclose_area = torch.max(enclose_wh[..., 0] * enclose_wh[..., 1], eps)
+        return ious - (enclose_area - union) / enclose_area
+
+    center1 = (bboxes1[..., :, None, :2] + bboxes1[..., :, None, 2:]) / 2
+    center2 = (bboxes2[..., None, :, :2] + bboxes2[..., None, :, 2:]) / 2
+    whs = center1[..., :2] - center2[..., :2]
+    center_distance = whs[..., 0] * whs[..., 0] + whs[..., 1] * whs[
+        ..., 1] + eps
+    if mode == 'dotd':
+        return torch.exp(-torch.sqrt(center_distance) / constant)
+
+    w1 = bboxes1[..., :, None, 2] - bboxes1[..., :, None, 0] + eps
+    h1 = bboxes1[..., :, None, 3] - bboxes1[..., :, None, 1] + eps
+    w2 = bboxes2[..., None, :, 2] - bboxes2[..., None, :, 0] + eps
+    h2 = bboxes2[..., None, :, 3] - bboxes2[..., None, :, 1] + eps
+    wh_distance = ((w1 - w2)**2 + (h1 - h2)**2) / (weight**2)
+    return torch.exp(-torch.sqrt(center_distance + wh_distance) / constant)
+
+
+def measure(fn, repeat_num, is_cuda):
+    if is_cuda:
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    peak_mem = torch.cuda.max_memory_allocated() / 1024**2 if is_cuda \
+        else float('nan')
+    return elapsed / repeat_num * 1000, peak_mem, result
+
+
+def random_bboxes(num, device):
+    xy = torch.rand(num, 2, device=device) * 800
+    return torch.cat((xy, xy + torch.rand(num, 2, device=device) * 40 + 1),
+                     dim=1)
+
+
+def main():
+    args = parse_args()
+    gt_bboxes = random_bboxes(args.num_gts, args.device)
+    bboxes = random_bboxes(args.num_bboxes, args.device)
+    is_cuda = bboxes.is_cuda
+    print(f'{"mode":>6} {"broadcast (ms)":>15} {"per-mode (ms)":>14} '
+          f'{"broadcast (MB)":>15} {"per-mode (MB)":>14} {"max diff":>10}')
+    for mode in args.modes:
+        old_time, old_mem, old_overlaps = measure(
+            lambda: broadcast_overlaps(gt_bboxes, bboxes, mode),
+            args.repeat_num, is_cuda)
+        del old_overlaps
+        new_time, new_mem, overlaps = measure(
+            lambda: bbox_overlaps(gt_bboxes, bboxes, mode), args.repeat_num,
+            is_cuda)
+        max_diff = (overlaps -
+                    broadcast_overlaps(gt_bboxes, bboxes, mode)).abs().max()
+        print(f'{mode:>6} {old_time:>15.2f} {new_time:>14.2f} '
+              f'{old_mem:>15.0f} {new_mem:>14.0f} {max_diff:>10.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.core.anchor import AnchorGenerator
+from mmdet.core.bbox.assigners import RankingAssigner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the dense and the candidate window '
+        'assignment of RankingAssigner with the NWD metric')
+    parser.add_argument(
+        '--num-gts',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000, 3000],
+        help='numbers of gts to benchmark')
+    parser.add_argument(
+        '--img-size', type=int, default=800, help='size of the square image')
+    parser.add_argument(
+        '--radius',
+        type=float,
+        default=24,
+        help='candidate_radius of the assigner in pixels')
+    parser.add_argument('--topk', type=int, default=3, help='topk')
+    parser.add_argument(
+        '--repeat-num', type=int, default=5, help='number of repeat times')
+    parser.add_argument(
+        '--skip-dense',
+        type=int,
+        default=None,
+        help='do not time the dense assignment from this number of gts on, '
+        'its overlap matrix may not fit in memory')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(fn, repeat_num, is_cuda):
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000, result
+
+
+def main():
+    args = parse_args()
+    # the anchors of the DNTR rpn head
+    anchor_generator = AnchorGenerator(
+        strides=[4, 8, 16, 32, 64], ratios=[0.5, 1.0, 2.0], scales=[8])
+    featmap_sizes = [(-(-args.img_size // stride), ) * 2
+                     for stride in [4, 8, 16, 32, 64]]
+    bboxes = torch.cat(
+        anchor_generator.grid_priors(featmap_sizes, device=args.device))
+    assigner_cfg = dict(
+        iou_calculator=dict(type='BboxDistanceMetric'),
+        assign_metric='nwd',
+        topk=args.topk)
+    dense = RankingAssigner(**assigner_cfg)
+    sparse = RankingAssigner(candidate_radius=args.radius, **assigner_cfg)
+    is_cuda = bboxes.is_cuda
+
+    def sparse_assign(gt_bboxes):
+        centers = (gt_bboxes[:, :2] + gt_bboxes[:, 2:]) / 2
+        candidate_inds = anchor_generator.window_prior_inds(
+            centers, featmap_sizes, args.radius, device=args.device)
+        return sparse.assign(
+            bboxes, gt_bboxes, candidate_inds=candidate_inds)
+
+    print(f'{bboxes.size(0)} anchors')
+    print(f'{"gts":>6} {"dense (ms)":>12} {"window (ms)":>12} '
+          f'{"same gt_inds":>13}')
+    for num_gts in args.num_gts:
+        # tiny objects as in AI-TOD
+        xy = torch.rand(num_gts, 2, device=args.device) * args.img_size
+        wh = torch.rand(num_gts, 2, device=args.device) * 28 + 2
+        gt_bboxes = torch.cat((xy, xy + wh), dim=1)
+        dense_time, same = float('nan'), '-'
+        sparse_time, sparse_result = measure(lambda: sparse_assign(gt_bboxes),
+                                             args.repeat_num, is_cuda)
+        if args.skip_dense is None or num_gts < args.skip_dense:
+            dense_time, dense_result = measure(
+                lambda: dense.assign(bboxes, gt_bboxes), args.repeat_num,
+                is_cuda)
+            same = str(
+                torch.equal(dense_result.gt_inds, sparse_result.gt_inds))
+        print(f'{num_gts:>6} {dense_time:>12.2f} {sparse_time:>12.2f} '
+              f'{same:>13}')
+
+
+if __name__ == '__main__':
+    main()
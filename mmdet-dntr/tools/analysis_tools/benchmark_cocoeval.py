@@ -0,0 +1,108 @@
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+from aitodpycocotools.coco import COCO
+from aitodpycocotools.cocoeval import COCOeval
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the greedy matching and the parallel '
+        'evaluation of the AI-TOD COCOeval')
+    parser.add_argument(
+        '--num-imgs', type=int, default=10, help='number of images')
+    parser.add_argument(
+        '--num-gts', type=int, default=300, help='number of gts per image')
+    parser.add_argument(
+        '--num-dets',
+        type=int,
+        default=1500,
+        help='number of detections per image')
+    parser.add_argument(
+        '--num-workers',
+        type=int,
+        nargs='+',
+        default=[],
+        help='numbers of processes of the parallel evaluations to time')
+    parser.add_argument(
+        '--skip-loop',
+        action='store_true',
+        help='do not time the reference loop')
+    return parser.parse_args()
+
+
+def random_coco(num_imgs, num_gts, num_dets, seed=0):
+    """Tiny objects as in AI-TOD, most detections near a gt."""
+    rng = np.random.RandomState(seed)
+    images = [dict(id=i, width=800, height=800) for i in range(num_imgs)]
+    categories = [dict(id=i, name=str(i)) for i in range(1, 9)]
+    anns, dets = [], []
+    for img in images:
+        xy = rng.rand(num_gts, 2) * 780
+        wh = rng.rand(num_gts, 2) * 30 + 2
+        labels = rng.randint(1, 9, num_gts)
+        for bbox, label in zip(np.hstack((xy, wh)).tolist(), labels):
+            anns.append(
+                dict(
+                    id=len(anns) + 1,
+                    image_id=img['id'],
+                    category_id=int(label),
+                    bbox=bbox,
+                    area=bbox[2] * bbox[3],
+                    iscrowd=0))
+        inds = rng.randint(num_gts, size=num_dets)
+        bboxes = np.hstack((xy[inds] + rng.randn(num_dets, 2) * 2,
+                            wh[inds] * (1 + rng.randn(num_dets, 2) * 0.1)))
+        # a third of the detections are background
+        bboxes[::3, :2] = rng.rand(len(bboxes[::3]), 2) * 780
+        for bbox, label, score in zip(bboxes.tolist(), labels[inds],
+                                      rng.rand(num_dets)):
+            dets.append(
+                dict(
+                    image_id=img['id'],
+                    category_id=int(label),
+                    bbox=bbox,
+                    score=float(score)))
+    coco_gt = COCO()
+    coco_gt.dataset = dict(
+        images=images, categories=categories, annotations=anns)
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_gt.createIndex()
+        coco_dt = coco_gt.loadRes(dets)
+    return coco_gt, coco_dt
+
+
+def main():
+    args = parse_args()
+    coco_gt, coco_dt = random_coco(args.num_imgs, args.num_gts, args.num_dets)
+    print(f'{args.num_imgs} images, {args.num_gts} gts and {args.num_dets} '
+          'detections per image')
+    runs = [('loop', 0, 1), ('numpy', 1, 1)] + [
+        (f'numpy, {num_workers} workers', 1, num_workers)
+        for num_workers in args.num_workers
+    ]
+    stats = dict()
+    for name, use_fast_match, num_workers in runs:
+        if name == 'loop' and args.skip_loop:
+            continue
+        coco_eval = COCOeval(coco_gt, coco_dt, 'bbox')
+        coco_eval.params.useFastMatch = use_fast_match
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            coco_eval.evaluate(num_workers=num_workers)
+            elapsed = time.perf_counter() - start
+            coco_eval.accumulate()
+            coco_eval.summarize()
+        stats[name] = coco_eval.stats
+        print(f'{name:>20} evaluate {elapsed:>8.2f} s')
+    print('same stats:',
+          all(
+              np.array_equal(s, stats['numpy'], equal_nan=True)
+              for s in stats.values()))
+
+
+if __name__ == '__main__':
+    main()
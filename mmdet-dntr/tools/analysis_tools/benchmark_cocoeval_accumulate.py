@@ -0,0 +1,90 @@
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+from aitodpycocotools.cocoeval import COCOeval, Params
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark COCOeval.accumulate of the AI-TOD cocoapi on '
+        'synthetic per image results')
+    parser.add_argument(
+        '--num-imgs',
+        type=int,
+        default=14000,
+        help='number of images, 14k for the AI-TOD test set')
+    parser.add_argument(
+        '--num-dets',
+        type=int,
+        default=300,
+        help='number of detections per image, spread over the categories')
+    parser.add_argument(
+        '--num-gts', type=int, default=80, help='number of gts per image')
+    parser.add_argument(
+        '--skip-loop',
+        action='store_true',
+        help='do not time the reference loop')
+    return parser.parse_args()
+
+
+def random_eval_imgs(params, num_dets, num_gts, pool_size=64, seed=0):
+    """evalImgs as built by evaluate(), the images reuse a pool of random
+    results to save memory."""
+    rng = np.random.RandomState(seed)
+    T = len(params.iouThrs)
+    pool = []
+    for _ in range(pool_size):
+        ious = rng.rand(num_dets)
+        # a detection matched at a threshold is matched at the lower ones
+        matched = (ious[None] >= params.iouThrs[:, None]) & (
+            rng.rand(num_dets) < 0.6)
+        pool.append(
+            dict(
+                dtMatches=matched * rng.randint(1, 1000, num_dets),
+                dtIgnore=np.repeat(rng.rand(1, num_dets) < 0.05, T, axis=0),
+                dtIoUs=matched * ious,
+                dtScores=rng.rand(num_dets).tolist(),
+                gtIgnore=(rng.rand(num_gts) < 0.05).astype(int)))
+    return [
+        pool[rng.randint(pool_size)]
+        for _ in range(len(params.catIds) * len(params.areaRng) *
+                       len(params.imgIds))
+    ]
+
+
+def main():
+    args = parse_args()
+    coco_eval = COCOeval(iouType='bbox')
+    params = coco_eval.params
+    params.imgIds = list(range(args.num_imgs))
+    params.catIds = list(range(1, 9))
+    num_cats = len(params.catIds)
+    coco_eval.evalImgs = random_eval_imgs(params, args.num_dets // num_cats,
+                                          args.num_gts // num_cats)
+    coco_eval._paramsEval = params
+    print(f'{args.num_imgs} images, {args.num_dets} detections and '
+          f'{args.num_gts} gts per image')
+    evals = dict()
+    for name, use_fast_accumulate in [('loop', 0), ('numpy', 1)]:
+        if name == 'loop' and args.skip_loop:
+            continue
+        coco_eval.params.useFastAccumulate = use_fast_accumulate
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            coco_eval.accumulate()
+            elapsed = time.perf_counter() - start
+        evals[name] = coco_eval.eval
+        print(f'{name:>6} accumulate {elapsed:>8.2f} s')
+    if len(evals) == 2:
+        same = all(
+            np.array_equal(evals['loop'][key], evals['numpy'][key],
+                           equal_nan=True) for key in
+            ['precision', 'recall', 'scores', 'olrp', 'lrp_opt_thr'])
+        print('same results:', same)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import contextlib
+import io
+import json
+import os.path as osp
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from aitodpycocotools.coco import COCO
+from aitodpycocotools.cocoeval import COCOeval
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark loading the results into the AI-TOD COCOeval '
+        'through a json file or as arrays')
+    parser.add_argument(
+        '--num-imgs', type=int, default=1000, help='number of images')
+    parser.add_argument(
+        '--num-dets',
+        type=int,
+        default=3000,
+        help='number of detections per image')
+    parser.add_argument(
+        '--trace-memory',
+        action='store_true',
+        help='report the peak memory, tracing slows down the json loading')
+    return parser.parse_args()
+
+
+def random_results(num_imgs, num_dets, seed=0):
+    """Gt images and categories with the columns of random detections."""
+    rng = np.random.RandomState(seed)
+    images = [dict(id=i, width=800, height=800) for i in range(num_imgs)]
+    categories = [dict(id=i, name=str(i)) for i in range(1, 9)]
+    coco_gt = COCO()
+    coco_gt.dataset = dict(
+        images=images, categories=categories, annotations=[])
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_gt.createIndex()
+    num = num_imgs * num_dets
+    img_ids = np.repeat(np.arange(num_imgs), num_dets)
+    cat_ids = rng.randint(1, 9, num)
+    bboxes = np.hstack((rng.rand(num, 2) * 780, rng.rand(num, 2) * 30 + 2))
+    scores = rng.rand(num)
+    return coco_gt, (img_ids, cat_ids, bboxes, scores)
+
+
+def load_json(coco_gt, arrays, tmp_dir):
+    """results2json, then COCO.loadRes of the file."""
+    img_ids, cat_ids, bboxes, scores = arrays
+    dets = [
+        dict(image_id=img_id, category_id=cat_id, bbox=bbox, score=score)
+        for img_id, cat_id, bbox, score in zip(img_ids.tolist(
+        ), cat_ids.tolist(), bboxes.tolist(), scores.tolist())
+    ]
+    res_file = osp.join(tmp_dir, 'results.bbox.json')
+    with open(res_file, 'w') as f:
+        json.dump(dets, f)
+    del dets
+    return coco_gt.loadRes(res_file)
+
+
+def load_arrays(coco_gt, arrays, tmp_dir):
+    return coco_gt.loadResArrays(*arrays)
+
+
+def main():
+    args = parse_args()
+    coco_gt, arrays = random_results(args.num_imgs, args.num_dets)
+    print(f'{args.num_imgs} images, {args.num_dets} detections per image')
+    for name, load in (('json', load_json), ('arrays', load_arrays)):
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                contextlib.redirect_stdout(io.StringIO()):
+            if args.trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            coco_dt = load(coco_gt, arrays, tmp_dir)
+            coco_eval = COCOeval(coco_gt, coco_dt, 'bbox')
+            coco_eval._prepare()
+            elapsed = time.perf_counter() - start
+            if args.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        msg = f'{name:>8} load and prepare {elapsed:>8.2f} s'
+        if args.trace_memory:
+            msg += f', peak {peak / 2**20:>8.1f} MiB'
+        print(msg)
+        del coco_eval, coco_dt
+
+
+if __name__ == '__main__':
+    main()
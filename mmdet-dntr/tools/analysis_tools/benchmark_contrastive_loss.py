@@ -0,0 +1,80 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.models.detectors.two_stage import Contrastive_Loss
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the loop and matrix Contrastive_Loss')
+    parser.add_argument(
+        '--batch-sizes',
+        type=int,
+        nargs='+',
+        default=[2, 4, 8, 16],
+        help='batch sizes to benchmark')
+    parser.add_argument(
+        '--feat-size',
+        type=int,
+        default=8,
+        help='spatial size of the largest feature map, kept small so that '
+        'the encoders do not dominate the timing')
+    parser.add_argument(
+        '--repeat-num', type=int, default=10, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def dummy_feats(batch_size, size, device):
+    x_b = [torch.rand(batch_size, 3, size * 4, size * 4, device=device)]
+    x = []
+    for i in range(5):
+        feat_size = max(size // 2**i, 1)
+        if i < 4:
+            x_b.append(
+                torch.rand(
+                    batch_size,
+                    256 * 2**i,
+                    feat_size,
+                    feat_size,
+                    device=device))
+        x.append(
+            torch.rand(batch_size, 256, feat_size, feat_size, device=device))
+    return x_b, x
+
+
+def measure(contrastive_loss, x_b, x, repeat_num):
+    is_cuda = x[0].is_cuda
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        geo_loss, sem_loss = contrastive_loss(x_b, x)
+        (geo_loss + sem_loss).backward()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000
+
+
+def main():
+    args = parse_args()
+    contrastive_loss = Contrastive_Loss().to(args.device)
+    print(f'{"batch":>6} {"loop (ms)":>12} {"matrix (ms)":>12}')
+    for batch_size in args.batch_sizes:
+        x_b, x = dummy_feats(batch_size, args.feat_size, args.device)
+        times = []
+        for impl in ('loop', 'matrix'):
+            contrastive_loss.impl = impl
+            times.append(measure(contrastive_loss, x_b, x, args.repeat_num))
+        print(f'{batch_size:>6} {times[0]:>12.2f} {times[1]:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
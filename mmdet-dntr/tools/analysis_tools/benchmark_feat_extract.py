@@ -0,0 +1,102 @@
+import argparse
+import resource
+import time
+
+import torch
+from mmcv import Config, DictAction
+
+from mmdet.models import build_detector
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the feature extraction of the contrastive '
+        'branch in TwoStageDetector.forward_train')
+    parser.add_argument('config', help='config file path')
+    parser.add_argument(
+        '--mode',
+        choices=['legacy', 'single', 'both'],
+        default='both',
+        help='legacy: three backbone passes per iteration as before, '
+        'single: one pass through extract_feat(return_backbone_feat=True). '
+        'On CPU run the modes in separate processes to compare peak RSS')
+    parser.add_argument(
+        '--batch-size', type=int, default=2, help='synthetic batch size')
+    parser.add_argument(
+        '--img-size', type=int, default=256, help='synthetic image size')
+    parser.add_argument(
+        '--repeat-num', type=int, default=5, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    parser.add_argument(
+        '--cfg-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the used config, the key-value pair '
+        'in xxx=yyy format will be merged into config file.')
+    return parser.parse_args()
+
+
+def legacy_step(model, img):
+    model.extract_feat(img)
+    x_b = model.backbone(img)
+    x = model.extract_feat(img)
+    return x_b, x
+
+
+def single_step(model, img):
+    return model.extract_feat(img, return_backbone_feat=True)
+
+
+def measure(model, img, step, repeat_num):
+    is_cuda = img.is_cuda
+    if is_cuda:
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        start = time.perf_counter()
+        x_b, x = step(model, img)
+        geo_loss, sem_loss = model.contrastive_loss(x_b, x)
+        loss = geo_loss + sem_loss + sum(feat.mean() for feat in x)
+        loss.backward()
+        model.zero_grad()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    if is_cuda:
+        peak_mem = torch.cuda.max_memory_allocated() / 1024**2
+    else:
+        peak_mem = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed / repeat_num * 1000, peak_mem
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    if args.cfg_options is not None:
+        cfg.merge_from_dict(args.cfg_options)
+    cfg.model.pretrained = None
+    cfg.model.neck.get('rfp_backbone', {}).pop('pretrained', None)
+    model = build_detector(cfg.model).to(args.device)
+    model.train()
+
+    img = torch.rand(
+        args.batch_size,
+        3,
+        args.img_size,
+        args.img_size,
+        device=args.device)
+    steps = dict(legacy=legacy_step, single=single_step)
+    modes = ['legacy', 'single'] if args.mode == 'both' else [args.mode]
+    mem_name = 'max allocated' if img.is_cuda else 'peak RSS'
+    for mode in modes:
+        time_ms, peak_mem = measure(model, img, steps[mode], args.repeat_num)
+        print(f'{mode:>8}: {time_ms:.1f} ms/iter, '
+              f'{mem_name} {peak_mem:.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import contextlib
+import io
+import os.path as osp
+import pickle
+import tempfile
+import time
+
+import mmcv
+import numpy as np
+import torch.nn as nn
+from torch.utils.data import DataLoader
+
+from mmdet.apis import single_gpu_test
+from mmdet.core import IncrementalCocoEvaluator
+from mmdet.datasets import AITODDataset
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark evaluating the results during the test loop '
+        'against evaluating them after it')
+    parser.add_argument(
+        '--num-imgs', type=int, default=50, help='number of images')
+    parser.add_argument(
+        '--num-gts', type=int, default=300, help='number of gts per image')
+    parser.add_argument(
+        '--num-dets',
+        type=int,
+        default=1500,
+        help='number of detections per image')
+    parser.add_argument(
+        '--batch-size', type=int, default=2, help='images per batch')
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.5,
+        help='simulated inference time of a batch in seconds')
+    return parser.parse_args()
+
+
+class SleepModel(nn.Module):
+    """Waits as a model running on a gpu and returns the given results."""
+
+    def __init__(self, results, latency):
+        super().__init__()
+        self.results = results
+        self.latency = latency
+
+    def forward(self, idx, return_loss=False, rescale=True):
+        time.sleep(self.latency)
+        return [self.results[i] for i in idx.tolist()]
+
+
+def random_dataset(tmp_dir, num_imgs, num_gts, num_dets, seed=0):
+    """Tiny objects as in AI-TOD, most detections near a gt."""
+    rng = np.random.RandomState(seed)
+    num_classes = len(AITODDataset.CLASSES)
+    images = [
+        dict(id=i, width=800, height=800, file_name=f'{i}.png')
+        for i in range(num_imgs)
+    ]
+    categories = [
+        dict(id=i, name=name)
+        for i, name in enumerate(AITODDataset.CLASSES, 1)
+    ]
+    anns, results = [], []
+    for img in images:
+        xy = rng.rand(num_gts, 2) * 780
+        wh = rng.rand(num_gts, 2) * 30 + 2
+        labels = rng.randint(num_classes, size=num_gts)
+        for bbox, label in zip(np.hstack((xy, wh)).tolist(), labels):
+            anns.append(
+                dict(
+                    id=len(anns) + 1,
+                    image_id=img['id'],
+                    category_id=int(label) + 1,
+                    bbox=bbox,
+                    area=bbox[2] * bbox[3],
+                    iscrowd=0))
+        inds = rng.randint(num_gts, size=num_dets)
+        det_xy = xy[inds] + rng.randn(num_dets, 2) * 2
+        det_wh = wh[inds] * (1 + rng.randn(num_dets, 2) * 0.1)
+        bboxes = np.hstack((det_xy, det_xy + det_wh, rng.rand(num_dets, 1)))
+        results.append([
+            bboxes[labels[inds] == label].astype(np.float32)
+            for label in range(num_classes)
+        ])
+    ann_file = osp.join(tmp_dir, 'annotations.json')
+    mmcv.dump(
+        dict(images=images, categories=categories, annotations=anns),
+        ann_file)
+    with contextlib.redirect_stdout(io.StringIO()):
+        dataset = AITODDataset(ann_file=ann_file, pipeline=[], test_mode=True)
+    return dataset, results
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset, results = random_dataset(tmp_dir, args.num_imgs,
+                                          args.num_gts, args.num_dets)
+        model = SleepModel(results, args.latency)
+        data_loader = DataLoader([dict(idx=i) for i in range(len(dataset))],
+                                 batch_size=args.batch_size)
+        print(f'{args.num_imgs} images, {args.num_gts} gts and '
+              f'{args.num_dets} detections per image, {args.latency} s per '
+              f'batch of {args.batch_size}')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            outputs = single_gpu_test(model, data_loader)
+            tested = time.perf_counter()
+            eval_results = dataset.evaluate(outputs, use_arrays=True)
+            end = time.perf_counter()
+        print(f'{"after the test":>16} test {tested - start:>7.2f} s, '
+              f'evaluate {end - tested:>7.2f} s, results '
+              f'{len(pickle.dumps(outputs)) / 2**20:>7.1f} MiB')
+
+        evaluator = IncrementalCocoEvaluator(dataset)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            records = single_gpu_test(model, data_loader, evaluator=evaluator)
+            tested = time.perf_counter()
+            stream_results = evaluator.evaluate(records)
+            end = time.perf_counter()
+        print(f'{"during the test":>16} test {tested - start:>7.2f} s, '
+              f'evaluate {end - tested:>7.2f} s, records '
+              f'{len(pickle.dumps(records)) / 2**20:>7.1f} MiB')
+        print('same metrics:', stream_results == eval_results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.core import assign_and_sample
+from mmdet.core.bbox.assigners import MaxIoUAssigner
+from mmdet.core.bbox.samplers import RandomSampler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the default and the tiled MaxIoUAssigner of '
+        'the three DNTR cascade stages')
+    parser.add_argument(
+        '--num-gts',
+        type=int,
+        nargs='+',
+        default=[100, 1000, 3000],
+        help='numbers of gts to benchmark')
+    parser.add_argument(
+        '--num-proposals',
+        type=int,
+        default=3000,
+        help='number of proposals per image, max_per_img of the rpn')
+    parser.add_argument(
+        '--num-imgs', type=int, default=2, help='images per iteration')
+    parser.add_argument(
+        '--tile-size', type=int, default=2**22, help='tile_size')
+    parser.add_argument(
+        '--repeat-num', type=int, default=5, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(fn, repeat_num, is_cuda):
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000, result
+
+
+def random_bboxes(num, device):
+    # tiny objects as in AI-TOD
+    xy = torch.rand(num, 2, device=device) * 768
+    return torch.cat((xy, xy + torch.rand(num, 2, device=device) * 28 + 2),
+                     dim=1)
+
+
+def build_stages(tile_size=None):
+    """The assigners and samplers of the rcnn stages of the DNTR config."""
+    stages = []
+    for iou_thr in [0.5, 0.6, 0.7]:
+        assigner = MaxIoUAssigner(
+            pos_iou_thr=iou_thr,
+            neg_iou_thr=iou_thr,
+            min_pos_iou=iou_thr,
+            match_low_quality=False,
+            ignore_iof_thr=-1,
+            gpu_assign_thr=256,
+            tile_size=tile_size)
+        sampler = RandomSampler(
+            num=512,
+            pos_fraction=0.25,
+            neg_pos_ub=-1,
+            add_gt_as_proposals=True)
+        stages.append((assigner, sampler))
+    return stages
+
+
+def main():
+    args = parse_args()
+    is_cuda = torch.device(args.device).type == 'cuda'
+    default_stages = build_stages()
+    tiled_stages = build_stages(args.tile_size)
+    print(f'{"gts":>6} {"assign (ms)":>12} {"tiled (ms)":>11} '
+          f'{"3 stages (ms)":>14} {"tiled (ms)":>11} {"same":>5}')
+    for num_gts in args.num_gts:
+        gt_bboxes = [
+            random_bboxes(num_gts, args.device) for _ in range(args.num_imgs)
+        ]
+        gt_labels = [
+            torch.randint(0, 8, (num_gts, ), device=args.device)
+            for _ in range(args.num_imgs)
+        ]
+        # proposals around the gts
+        proposal_list = []
+        for gts in gt_bboxes:
+            inds = torch.randint(
+                0, num_gts, (args.num_proposals, ), device=args.device)
+            proposal_list.append(gts[inds] + torch.randn(
+                args.num_proposals, 4, device=args.device) * 3)
+
+        assigner, tiled_assigner = default_stages[0][0], tiled_stages[0][0]
+        assign_time, result = measure(
+            lambda: assigner.assign(proposal_list[0], gt_bboxes[0]),
+            args.repeat_num, is_cuda)
+        tiled_time, tiled_result = measure(
+            lambda: tiled_assigner.assign(proposal_list[0], gt_bboxes[0]),
+            args.repeat_num, is_cuda)
+        same = torch.equal(result.gt_inds, tiled_result.gt_inds)
+
+        def run_stages(stages):
+            return [
+                assign_and_sample(assigner, sampler, proposal_list, gt_bboxes,
+                                  gt_labels) for assigner, sampler in stages
+            ]
+
+        stages_time, _ = measure(lambda: run_stages(default_stages),
+                                 args.repeat_num, is_cuda)
+        tiled_stages_time, _ = measure(lambda: run_stages(tiled_stages),
+                                       args.repeat_num, is_cuda)
+        print(f'{num_gts:>6} {assign_time:>12.2f} {tiled_time:>11.2f} '
+              f'{stages_time:>14.2f} {tiled_stages_time:>11.2f} '
+              f'{str(same):>5}')
+
+
+if __name__ == '__main__':
+    main()
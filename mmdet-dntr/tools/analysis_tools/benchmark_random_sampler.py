@@ -0,0 +1,85 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.core.bbox.samplers import RandomSampler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the full permutation of the former '
+        'RandomSampler.random_choice against the partial shuffle and the '
+        'batch sampling')
+    parser.add_argument(
+        '--gallery-size',
+        type=int,
+        default=200000,
+        help='number of negative anchors of an image')
+    parser.add_argument(
+        '--num', type=int, default=256, help='number of samples')
+    parser.add_argument(
+        '--num-imgs', type=int, default=2, help='number of images')
+    parser.add_argument(
+        '--repeat-num', type=int, default=20, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(fn, repeat_num, is_cuda):
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000, result
+
+
+def randperm_choice(gallery, num):
+    """The former random_choice."""
+    perm = torch.randperm(gallery.numel())[:num].to(device=gallery.device)
+    return gallery[perm]
+
+
+def main():
+    args = parse_args()
+    is_cuda = torch.device(args.device).type == 'cuda'
+    sampler = RandomSampler(
+        num=args.num, pos_fraction=0., add_gt_as_proposals=False)
+    # negatives only, all but a few anchors of each image
+    gt_inds = torch.zeros(
+        args.num_imgs, args.gallery_size, dtype=torch.long, device=args.device)
+    gt_inds[:, :100] = 1
+
+    def per_image(choice):
+        # the galleries are built as in _sample_neg
+        return [
+            choice(torch.nonzero(inds == 0).squeeze(1), args.num)
+            for inds in gt_inds
+        ]
+
+    generator = torch.Generator()
+    results = [
+        ('randperm', lambda: per_image(randperm_choice)),
+        ('partial shuffle',
+         lambda: per_image(lambda g, n: sampler.random_choice(g, n))),
+        ('partial shuffle + generator', lambda: per_image(
+            lambda g, n: sampler.random_choice(g, n, generator))),
+        ('sample_batch', lambda: sampler.sample_batch(gt_inds)),
+    ]
+    print(f'{args.num_imgs} images, {args.gallery_size} anchors, '
+          f'{args.num} samples')
+    for name, fn in results:
+        elapsed, _ = measure(fn, args.repeat_num, is_cuda)
+        print(f'{name:>28} {elapsed:>8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
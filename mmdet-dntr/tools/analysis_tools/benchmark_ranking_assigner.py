@@ -0,0 +1,82 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.core.bbox.assigners import RankingAssigner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the top-k assignment of RankingAssigner')
+    parser.add_argument(
+        '--num-gts',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000, 3000],
+        help='numbers of gts to benchmark')
+    parser.add_argument(
+        '--num-bboxes',
+        type=int,
+        default=200000,
+        help='number of anchors, ~200k for an 800x800 image')
+    parser.add_argument('--topk', type=int, default=3, help='topk')
+    parser.add_argument(
+        '--repeat-num', type=int, default=5, help='number of repeat times')
+    parser.add_argument(
+        '--skip-loop',
+        action='store_true',
+        help='do not time the former per-gt loop, it is slow for many gts')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def loop_assign(overlaps, topk):
+    """The per-gt loop previously used by RankingAssigner."""
+    max_overlaps, _ = overlaps.max(dim=0)
+    gt_max_overlaps, _ = overlaps.topk(topk, dim=1)
+    assigned_gt_inds = overlaps.new_full((overlaps.size(1), ),
+                                         -1,
+                                         dtype=torch.long)
+    assigned_gt_inds[(max_overlaps >= 0) & (max_overlaps < 0.3)] = 0
+    for i in range(overlaps.size(0)):
+        for j in range(topk):
+            assigned_gt_inds[overlaps[i, :] == gt_max_overlaps[i, j]] = i + 1
+    return assigned_gt_inds
+
+
+def measure(fn, overlaps, repeat_num):
+    is_cuda = overlaps.is_cuda
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        fn(overlaps)
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000
+
+
+def main():
+    args = parse_args()
+    assigner = RankingAssigner(topk=args.topk)
+    print(f'{"gts":>6} {"loop (ms)":>12} {"scatter (ms)":>13}')
+    for num_gts in args.num_gts:
+        overlaps = torch.rand(
+            num_gts, args.num_bboxes, device=args.device)
+        loop_time = float('nan')
+        if not args.skip_loop:
+            loop_time = measure(lambda o: loop_assign(o, args.topk),
+                                overlaps, args.repeat_num)
+        scatter_time = measure(assigner.assign_wrt_ranking, overlaps,
+                               args.repeat_num)
+        print(f'{num_gts:>6} {loop_time:>12.2f} {scatter_time:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
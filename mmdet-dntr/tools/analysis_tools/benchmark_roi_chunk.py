@@ -0,0 +1,80 @@
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import torch
+from mmcv import Config
+
+from mmdet.models.builder import build_head
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Peak memory and time of the T2T cascade head '
+        '_bbox_forward for different roi_chunk_size')
+    parser.add_argument('config', help='config file with a T2T roi_head')
+    parser.add_argument(
+        '--chunk-sizes',
+        type=int,
+        nargs='+',
+        default=[0, 2048, 1024, 512],
+        help='roi_chunk_size values to compare, 0 means no chunking')
+    parser.add_argument(
+        '--num-rois', type=int, default=6000, help='number of RoIs')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(cfg, chunk_size, num_rois, device, queue):
+    roi_head = cfg.model.roi_head
+    roi_head.update(test_cfg=cfg.model.test_cfg.rcnn)
+    roi_head.roi_chunk_size = chunk_size or None
+    roi_head = build_head(roi_head).to(device).eval()
+
+    img_size = 800
+    feats = [
+        torch.rand(1, 256, img_size // stride, img_size // stride,
+                   device=device) for stride in [4, 8, 16, 32]
+    ]
+    x1y1 = torch.rand(num_rois, 2, device=device) * img_size * 0.9
+    wh = torch.rand(num_rois, 2, device=device) * 32 + 2
+    rois = torch.cat([x1y1.new_zeros(num_rois, 1), x1y1, x1y1 + wh], dim=1)
+
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.perf_counter()
+    with torch.no_grad():
+        roi_head._bbox_forward(0, feats, rois)
+    if device.startswith('cuda'):
+        torch.cuda.synchronize()
+        peak_mem = torch.cuda.max_memory_allocated() / 1024**2
+    else:
+        peak_mem = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put(((time.perf_counter() - start) * 1000, peak_mem))
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    mem_name = 'max allocated' if args.device.startswith('cuda') else \
+        'peak RSS'
+    # one process per setting, the peak RSS of a process never goes down
+    ctx = mp.get_context('spawn')
+    print(f'{"chunk size":>10} {"time (ms)":>10} {mem_name + " (MB)":>20}')
+    for chunk_size in args.chunk_sizes:
+        queue = ctx.Queue()
+        proc = ctx.Process(
+            target=measure,
+            args=(cfg, chunk_size, args.num_rois, args.device, queue))
+        proc.start()
+        time_ms, peak_mem = queue.get()
+        proc.join()
+        name = chunk_size if chunk_size > 0 else 'none'
+        print(f'{name:>10} {time_ms:>10.1f} {peak_mem:>20.0f}')
+
+
+if __name__ == '__main__':
+    main()
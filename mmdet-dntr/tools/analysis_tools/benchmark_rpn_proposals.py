@@ -0,0 +1,142 @@
+import argparse
+import time
+
+import mmcv
+import torch
+
+from mmdet.core import bbox_overlaps
+from mmdet.core.evaluation import eval_recalls
+from mmdet.models.dense_heads import RPNHead
+
+# proposal settings compared to the rpn test_cfg of the DNTR config
+SETTINGS = [
+    ('baseline', dict()),
+    ('level nms_pre', dict(nms_pre=[3000, 2000, 500, 200, 100])),
+    ('score_thr 0.05', dict(score_thr=0.05)),
+    ('level fast nms', dict(level_fast_nms=True)),
+    ('all', dict(
+        nms_pre=[3000, 2000, 500, 200, 100],
+        score_thr=0.05,
+        level_fast_nms=True)),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the recall and latency of the proposal '
+        'pruning options of the DNTR rpn head on synthetic AI-TOD like '
+        'images')
+    parser.add_argument(
+        '--num-imgs', type=int, default=8, help='number of images')
+    parser.add_argument(
+        '--num-gts', type=int, default=50, help='number of gts per image')
+    parser.add_argument(
+        '--img-size', type=int, default=800, help='size of the square image')
+    parser.add_argument(
+        '--repeat-num', type=int, default=3, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(fn, repeat_num, is_cuda):
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000, result
+
+
+def build_rpn_head():
+    return RPNHead(
+        in_channels=256,
+        feat_channels=256,
+        anchor_generator=dict(
+            type='AnchorGenerator',
+            scales=[8],
+            ratios=[0.5, 1.0, 2.0],
+            strides=[4, 8, 16, 32, 64]),
+        test_cfg=mmcv.Config(
+            dict(
+                nms_pre=3000,
+                max_per_img=3000,
+                nms=dict(type='nms', iou_threshold=0.7),
+                min_bbox_size=0))).eval()
+
+
+def synthetic_outputs(head, featmap_sizes, gt_bboxes):
+    """Head outputs that score and regress the anchors near the gts.
+
+    The objectness logit grows with the best IoU of the anchor and the
+    regression points to that gt, both with noise.
+    """
+    anchors = head.prior_generator.grid_priors(
+        featmap_sizes, device=gt_bboxes.device)
+    cls_scores, bbox_preds = [], []
+    for level_anchors, (h, w) in zip(anchors, featmap_sizes):
+        ious = bbox_overlaps(gt_bboxes, level_anchors)
+        max_ious, argmax_ious = ious.max(dim=0)
+        logits = 20 * (max_ious - 0.15) + torch.randn_like(max_ious) * 1.5
+        deltas = head.bbox_coder.encode(level_anchors,
+                                        gt_bboxes[argmax_ious])
+        deltas = deltas * (max_ious[:, None] > 0.05) + torch.randn_like(
+            deltas) * 0.1
+        cls_scores.append(logits.view(1, h, w, -1).permute(0, 3, 1, 2))
+        bbox_preds.append(deltas.view(1, h, w, -1).permute(0, 3, 1, 2))
+    return cls_scores, bbox_preds
+
+
+def main():
+    args = parse_args()
+    is_cuda = torch.device(args.device).type == 'cuda'
+    head = build_rpn_head().to(args.device)
+    featmap_sizes = [(-(-args.img_size // stride), ) * 2
+                     for stride in [4, 8, 16, 32, 64]]
+    img_metas = [
+        dict(
+            img_shape=(args.img_size, args.img_size, 3),
+            pad_shape=(args.img_size, args.img_size, 3),
+            scale_factor=1.)
+    ]
+    torch.manual_seed(0)
+    inputs = []
+    for _ in range(args.num_imgs):
+        # tiny objects as in AI-TOD
+        xy = torch.rand(args.num_gts, 2, device=args.device) * (
+            args.img_size - 32)
+        wh = torch.rand(args.num_gts, 2, device=args.device) * 14 + 2
+        gt_bboxes = torch.cat((xy, xy + wh), dim=1)
+        inputs.append((gt_bboxes,
+                       synthetic_outputs(head, featmap_sizes, gt_bboxes)))
+
+    proposal_nums = [100, 300, 1500]
+    print(f'{"setting":>16} {"latency (ms)":>13} ' +
+          ' '.join(f'{f"R@{num}":>7}' for num in proposal_nums))
+    for name, cfg in SETTINGS:
+        test_cfg = head.test_cfg.copy()
+        test_cfg.update(cfg)
+        elapsed, proposals = 0., []
+        for gt_bboxes, (cls_scores, bbox_preds) in inputs:
+            with torch.no_grad():
+                img_time, img_proposals = measure(
+                    lambda: head.get_bboxes(
+                        cls_scores, bbox_preds, img_metas=img_metas,
+                        cfg=test_cfg)[0], args.repeat_num, is_cuda)
+            elapsed += img_time
+            proposals.append(img_proposals.cpu().numpy())
+        recalls = eval_recalls([gt.cpu().numpy() for gt, _ in inputs],
+                               proposals, proposal_nums, 0.5,
+                               logger='silent')
+        print(f'{name:>16} {elapsed / len(inputs):>13.2f} ' +
+              ' '.join(f'{recall:>7.3f}' for recall in recalls[:, 0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import time
+
+import mmcv
+import torch
+
+from mmdet.models.dense_heads import RPNHead
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the per-image and the batched target '
+        'computation of the DNTR rpn head')
+    parser.add_argument(
+        '--batch-sizes',
+        type=int,
+        nargs='+',
+        default=[1, 2, 4, 8, 16],
+        help='batch sizes to benchmark')
+    parser.add_argument(
+        '--num-gts', type=int, default=50, help='number of gts per image')
+    parser.add_argument(
+        '--img-size', type=int, default=800, help='size of the square image')
+    parser.add_argument(
+        '--tile-size',
+        type=int,
+        default=None,
+        help='tile_size of the assigner, it also bounds the overlaps of the '
+        'images assigned together')
+    parser.add_argument(
+        '--repeat-num', type=int, default=5, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(fn, repeat_num, is_cuda):
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000, result
+
+
+def build_rpn_head(batch_targets, tile_size=None):
+    # the train_cfg.rpn of configs/aitod-dntr/aitod_DNTR_mask.py
+    train_cfg = mmcv.Config(
+        dict(
+            assigner=dict(
+                type='RankingAssigner',
+                ignore_iof_thr=-1,
+                gpu_assign_thr=512,
+                iou_calculator=dict(type='BboxDistanceMetric'),
+                assign_metric='nwd',
+                tile_size=tile_size,
+                topk=3),
+            sampler=dict(
+                type='RandomSampler',
+                num=256,
+                pos_fraction=0.5,
+                neg_pos_ub=-1,
+                add_gt_as_proposals=False),
+            allowed_border=0,
+            pos_weight=-1,
+            batch_targets=batch_targets,
+            debug=False))
+    return RPNHead(
+        in_channels=256,
+        feat_channels=256,
+        anchor_generator=dict(
+            type='AnchorGenerator',
+            scales=[8],
+            ratios=[0.5, 1.0, 2.0],
+            strides=[4, 8, 16, 32, 64]),
+        train_cfg=train_cfg)
+
+
+def main():
+    args = parse_args()
+    per_image = build_rpn_head(False, args.tile_size)
+    batched = build_rpn_head(True, args.tile_size)
+    featmap_sizes = [(-(-args.img_size // stride), ) * 2
+                     for stride in [4, 8, 16, 32, 64]]
+    is_cuda = torch.device(args.device).type == 'cuda'
+    print(f'{"batch":>6} {"per-image (ms)":>15} {"batched (ms)":>13} '
+          f'{"same num_pos":>13}')
+    for batch_size in args.batch_sizes:
+        img_metas = [
+            dict(
+                img_shape=(args.img_size, args.img_size, 3),
+                pad_shape=(args.img_size, args.img_size, 3))
+            for _ in range(batch_size)
+        ]
+        anchor_list, valid_flag_list = per_image.get_anchors(
+            featmap_sizes, img_metas, device=args.device)
+        gt_bboxes = []
+        for _ in range(batch_size):
+            # tiny objects as in AI-TOD
+            xy = torch.rand(args.num_gts, 2, device=args.device) * (
+                args.img_size - 32)
+            wh = torch.rand(args.num_gts, 2, device=args.device) * 28 + 2
+            gt_bboxes.append(torch.cat((xy, xy + wh), dim=1))
+
+        per_image_time, targets = measure(
+            lambda: per_image.get_targets(anchor_list, valid_flag_list,
+                                          gt_bboxes, img_metas),
+            args.repeat_num, is_cuda)
+        batched_time, batched_targets = measure(
+            lambda: batched.get_targets(anchor_list, valid_flag_list,
+                                        gt_bboxes, img_metas),
+            args.repeat_num, is_cuda)
+        same = targets[4] == batched_targets[4]
+        print(f'{batch_size:>6} {per_image_time:>15.2f} '
+              f'{batched_time:>13.2f} {str(same):>13}')
+
+
+if __name__ == '__main__':
+    main()
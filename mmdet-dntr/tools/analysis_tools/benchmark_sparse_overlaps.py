@@ -0,0 +1,107 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.core import SparseBboxOverlaps, build_gt_overlaps
+from mmdet.core.bbox.assigners import MaxIoUAssigner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the dense and the sparse MaxIoUAssigner over '
+        'the stages of a cascade')
+    parser.add_argument(
+        '--num-gts',
+        type=int,
+        nargs='+',
+        default=[100, 1000, 3000],
+        help='numbers of gts to benchmark')
+    parser.add_argument(
+        '--num-proposals',
+        type=int,
+        default=2000,
+        help='number of proposals per stage')
+    parser.add_argument(
+        '--img-size', type=int, default=800, help='size of the square image')
+    parser.add_argument(
+        '--repeat-num', type=int, default=5, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(fn, repeat_num, is_cuda):
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000, result
+
+
+def main():
+    args = parse_args()
+    # the rcnn assigners of the DNTR config
+    thrs = [0.5, 0.6, 0.7]
+    dense = [
+        MaxIoUAssigner(thr, thr, min_pos_iou=thr, match_low_quality=False)
+        for thr in thrs
+    ]
+    sparse = [
+        MaxIoUAssigner(
+            thr, thr, min_pos_iou=thr, match_low_quality=False, sparse=True)
+        for thr in thrs
+    ]
+    is_cuda = torch.device(args.device).type == 'cuda'
+
+    def random_bboxes(num):
+        # tiny objects as in AI-TOD
+        xy = torch.rand(num, 2, device=args.device) * args.img_size
+        wh = torch.rand(num, 2, device=args.device) * 28 + 2
+        return torch.cat((xy, xy + wh), dim=1)
+
+    def cascade_assign(assigners, gt_bboxes, stage_proposals):
+        gt_overlaps = build_gt_overlaps(assigners, [gt_bboxes])
+        results = []
+        for assigner, proposals in zip(assigners, stage_proposals):
+            kwargs = dict(gt_overlaps=gt_overlaps[0]) if assigner.sparse \
+                else dict()
+            results.append(assigner.assign(proposals, gt_bboxes, **kwargs))
+        return results
+
+    print(f'{"gts":>6} {"pairs":>8} {"dense (ms)":>12} {"sparse (ms)":>12} '
+          f'{"same gt_inds":>13}')
+    for num_gts in args.num_gts:
+        gt_bboxes = random_bboxes(num_gts)
+        # the proposals get closer to the gts over the stages
+        stage_proposals = []
+        for jitter in [8, 4, 2]:
+            inds = torch.randint(
+                num_gts, (args.num_proposals, ), device=args.device)
+            stage_proposals.append(
+                torch.cat((gt_bboxes[inds] + torch.randn(
+                    args.num_proposals, 4, device=args.device) * jitter,
+                           gt_bboxes)))
+        num_pairs = len(SparseBboxOverlaps(gt_bboxes)(stage_proposals[0])[0])
+        dense_time, dense_results = measure(
+            lambda: cascade_assign(dense, gt_bboxes, stage_proposals),
+            args.repeat_num, is_cuda)
+        sparse_time, sparse_results = measure(
+            lambda: cascade_assign(sparse, gt_bboxes, stage_proposals),
+            args.repeat_num, is_cuda)
+        same = all(
+            torch.equal(d.gt_inds, s.gt_inds)
+            for d, s in zip(dense_results, sparse_results))
+        print(f'{num_gts:>6} {num_pairs:>8} {dense_time:>12.2f} '
+              f'{sparse_time:>12.2f} {str(same):>13}')
+
+
+if __name__ == '__main__':
+    main()
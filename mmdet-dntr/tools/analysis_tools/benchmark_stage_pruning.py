@@ -0,0 +1,121 @@
+import argparse
+import copy
+import time
+
+import torch
+from mmcv import Config, DictAction
+from mmcv.parallel import MMDataParallel
+from mmcv.runner import load_checkpoint
+
+from mmdet.datasets import (build_dataloader, build_dataset,
+                            replace_ImageToTensor)
+from mmdet.models import build_detector
+from mmdet.utils import update_data_root
+from tools.test import truncate_dataset
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Latency/AP tradeoff of the inter-stage RoI pruning '
+        'of the cascade heads (test_cfg.rcnn.stage_roi_pruning)')
+    parser.add_argument('config', help='test config file path')
+    parser.add_argument('checkpoint', help='checkpoint file')
+    parser.add_argument(
+        '--max-nums',
+        type=int,
+        nargs='+',
+        default=[-1, 1000, 500, 300],
+        help='max RoIs passed to the next stage, -1 means no top-k')
+    parser.add_argument(
+        '--score-thrs',
+        type=float,
+        nargs='+',
+        default=[0.],
+        help='foreground score floors for the RoIs of the next stage')
+    parser.add_argument(
+        '--max-samples',
+        type=int,
+        default=None,
+        help='only evaluate the first N images of the test set')
+    parser.add_argument(
+        '--metric', default='bbox', help='evaluation metric of the dataset')
+    parser.add_argument(
+        '--cfg-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the used config, the key-value pair '
+        'in xxx=yyy format will be merged into config file.')
+    return parser.parse_args()
+
+
+def run_setting(cfg, checkpoint, dataset, data_loader, pruning):
+    cfg = copy.deepcopy(cfg)
+    if pruning is not None:
+        cfg.model.test_cfg.rcnn.stage_roi_pruning = pruning
+    model = build_detector(cfg.model)
+    load_checkpoint(model, checkpoint, map_location='cpu')
+    model = MMDataParallel(model.cuda(), device_ids=[0])
+    model.eval()
+
+    # skip the first images, they are slow
+    num_warmup = 5
+    pure_inf_time = 0
+    results = []
+    for i, data in enumerate(data_loader):
+        torch.cuda.synchronize()
+        start_time = time.perf_counter()
+        with torch.no_grad():
+            result = model(return_loss=False, rescale=True, **data)
+        torch.cuda.synchronize()
+        if i >= num_warmup:
+            pure_inf_time += time.perf_counter() - start_time
+        results.extend(result)
+    num_timed = max(len(results) - num_warmup, 1)
+    metrics = dataset.evaluate(results, metric=cfg.metric)
+    return pure_inf_time / num_timed * 1000, metrics
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    update_data_root(cfg)
+    if args.cfg_options is not None:
+        cfg.merge_from_dict(args.cfg_options)
+    cfg.model.pretrained = None
+    cfg.model.train_cfg = None
+    cfg.metric = args.metric
+    cfg.data.test.test_mode = True
+    cfg.data.test.pipeline = replace_ImageToTensor(cfg.data.test.pipeline)
+
+    dataset = build_dataset(cfg.data.test)
+    if args.max_samples is not None:
+        truncate_dataset(dataset, args.max_samples)
+    data_loader = build_dataloader(
+        dataset,
+        samples_per_gpu=1,
+        workers_per_gpu=cfg.data.workers_per_gpu,
+        dist=False,
+        shuffle=False)
+
+    settings = [('none', None)]
+    for max_num in args.max_nums:
+        for score_thr in args.score_thrs:
+            if max_num < 0 and score_thr <= 0:
+                continue
+            settings.append((f'max_num={max_num}, score_thr={score_thr}',
+                             dict(max_num=max_num, score_thr=score_thr)))
+
+    rows = []
+    for name, pruning in settings:
+        time_ms, metrics = run_setting(cfg, args.checkpoint, dataset,
+                                       data_loader, pruning)
+        rows.append((name, time_ms, metrics.get(f'{args.metric}_mAP', -1)))
+        print(f'{name}: {time_ms:.1f} ms / img, metrics: {metrics}')
+
+    print(f'\n{"pruning":<36} {"ms / img":>10} {"mAP":>8}')
+    for name, time_ms, mAP in rows:
+        print(f'{name:<36} {time_ms:>10.1f} {mAP:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
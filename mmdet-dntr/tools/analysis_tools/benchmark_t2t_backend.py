@@ -0,0 +1,71 @@
+import argparse
+import time
+
+import torch
+from mmcv import Config
+
+from mmdet.models.builder import build_head
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Latency of the T2T path of a cascade stage for the '
+        'eager, jit and compile backends (test_cfg.rcnn.t2t_backend)')
+    parser.add_argument('config', help='config file with a T2T roi_head')
+    parser.add_argument(
+        '--backends',
+        nargs='+',
+        default=['eager', 'jit', 'compile'],
+        help='backends to compare')
+    parser.add_argument(
+        '--num-rois',
+        type=int,
+        nargs='+',
+        default=[512, 2048],
+        help='numbers of RoIs to benchmark')
+    parser.add_argument(
+        '--repeat-num', type=int, default=10, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def measure(roi_head, bbox_feats, repeat_num):
+    is_cuda = bbox_feats.is_cuda
+    elapsed = 0.
+    # the first iterations trace or compile the core
+    num_warmup = 2
+    for i in range(repeat_num + num_warmup):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        shuffle_index = roi_head.token_to_token[0].get_shuffle_index()
+        with torch.no_grad():
+            roi_head._t2t_forward(0, bbox_feats, shuffle_index)
+        if is_cuda:
+            torch.cuda.synchronize()
+        if i >= num_warmup:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    roi_head = cfg.model.roi_head
+    roi_head.update(test_cfg=cfg.model.test_cfg.rcnn)
+    roi_head = build_head(roi_head).to(args.device).eval()
+
+    print(f'{"rois":>6}' + ''.join(f'{b + " (ms)":>16}'
+                                   for b in args.backends))
+    for num_rois in args.num_rois:
+        bbox_feats = torch.rand(num_rois, 256, 7, 7, device=args.device)
+        times = []
+        for backend in args.backends:
+            roi_head.test_cfg.t2t_backend = backend
+            times.append(measure(roi_head, bbox_feats, args.repeat_num))
+        print(f'{num_rois:>6}' + ''.join(f'{t:>16.2f}' for t in times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import time
+
+import torch
+
+from mmdet.models.roi_heads.t2t_models.t2t_vit import T2T_module
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the token shuffle of T2T_module')
+    parser.add_argument(
+        '--num-rois',
+        type=int,
+        nargs='+',
+        default=[512, 2048, 6000],
+        help='numbers of RoIs to benchmark')
+    parser.add_argument(
+        '--repeat-num', type=int, default=10, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def concat_shuffle(x, index):
+    """The four-way concat previously used by T2T_module.forward."""
+    x = x.transpose(1, 2).reshape(-1, 16, 256, 9).transpose(0, 3)
+    x = torch.cat((x[index[0]], x[index[1]], x[index[2]], x[index[3]]),
+                  dim=1)
+    return x.transpose(0, 3).reshape(-1, 64, 256 * 9)
+
+
+def gather_shuffle(t2t_module, x):
+    index = t2t_module.get_shuffle_index()
+    B, C, L = x.shape
+    if index is t2t_module.identity_index:
+        gather_index = t2t_module.identity_gather_index
+    else:
+        gather_index = t2t_module._gather_index(index, L, C // 9, x.device)
+    return x.flatten(1).index_select(1, gather_index).view(B, 4 * L, C)
+
+
+def measure(fn, repeat_num, is_cuda):
+    elapsed = 0.
+    for i in range(repeat_num + 1):
+        if is_cuda:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        fn()
+        if is_cuda:
+            torch.cuda.synchronize()
+        # the first iteration is a warm-up
+        if i > 0:
+            elapsed += time.perf_counter() - start
+    return elapsed / repeat_num * 1000
+
+
+def main():
+    args = parse_args()
+    is_cuda = args.device.startswith('cuda')
+    t2t_module = T2T_module(
+        img_size=7,
+        tokens_type='transformer',
+        in_chans=256,
+        embed_dim=128,
+        token_dim=100).to(args.device)
+    print(f'{"rois":>6} {"concat (ms)":>12} {"gather (ms)":>12} '
+          f'{"identity (ms)":>14}')
+    for num_rois in args.num_rois:
+        # unfolded RoI features, [num_rois, 256 * 9, 16]
+        x = torch.rand(num_rois, 256 * 9, 16, device=args.device)
+        index = [t.tolist() for t in t2t_module.get_shuffle_index()]
+        times = [measure(lambda: concat_shuffle(x, index), args.repeat_num,
+                         is_cuda)]
+        t2t_module.shuffle_in_eval = True
+        times.append(
+            measure(lambda: gather_shuffle(t2t_module, x), args.repeat_num,
+                    is_cuda))
+        t2t_module.eval().shuffle_in_eval = False
+        times.append(
+            measure(lambda: gather_shuffle(t2t_module, x), args.repeat_num,
+                    is_cuda))
+        t2t_module.train()
+        print(f'{num_rois:>6} {times[0]:>12.2f} {times[1]:>12.2f} '
+              f'{times[2]:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
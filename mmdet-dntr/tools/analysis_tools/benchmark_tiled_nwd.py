@@ -0,0 +1,88 @@
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+import torch
+
+from mmdet.core.bbox.assigners import RankingAssigner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Peak memory and time of RankingAssigner with NWD '
+        'overlaps, full matrix vs tiles')
+    parser.add_argument(
+        '--num-gts',
+        type=int,
+        nargs='+',
+        default=[100, 1000, 5000],
+        help='numbers of gts to benchmark')
+    parser.add_argument(
+        '--num-bboxes',
+        type=int,
+        default=200000,
+        help='number of anchors, ~200k for an 800x800 image')
+    parser.add_argument(
+        '--tile-size',
+        type=int,
+        default=2**22,
+        help='max number of gt-anchor overlaps of a tile')
+    parser.add_argument(
+        '--device', default='cuda', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def random_bboxes(num, img_size, device):
+    xy = torch.rand(num, 2, device=device) * img_size
+    wh = torch.rand(num, 2, device=device) * 32 + 2
+    return torch.cat([xy, xy + wh], dim=1)
+
+
+def measure(num_gts, num_bboxes, tile_size, device, queue):
+    assigner = RankingAssigner(
+        iou_calculator=dict(type='BboxDistanceMetric'),
+        assign_metric='nwd',
+        topk=3,
+        tile_size=tile_size)
+    bboxes = random_bboxes(num_bboxes, 800, device)
+    gt_bboxes = random_bboxes(num_gts, 800, device)
+
+    is_cuda = device.startswith('cuda')
+    if is_cuda:
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.perf_counter()
+    assigner.assign(bboxes, gt_bboxes)
+    if is_cuda:
+        torch.cuda.synchronize()
+        peak_mem = torch.cuda.max_memory_allocated() / 1024**2
+    else:
+        peak_mem = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put(((time.perf_counter() - start) * 1000, peak_mem))
+
+
+def main():
+    args = parse_args()
+    mem_name = 'max allocated' if args.device.startswith('cuda') else \
+        'peak RSS'
+    # one process per setting, the peak RSS of a process never goes down
+    ctx = mp.get_context('spawn')
+    print(f'{"gts":>6} {"mode":>6} {"time (ms)":>10} '
+          f'{mem_name + " (MB)":>20}')
+    for num_gts in args.num_gts:
+        for name, tile_size in (('full', None), ('tiled', args.tile_size)):
+            queue = ctx.Queue()
+            proc = ctx.Process(
+                target=measure,
+                args=(num_gts, args.num_bboxes, tile_size, args.device,
+                      queue))
+            proc.start()
+            time_ms, peak_mem = queue.get()
+            proc.join()
+            print(f'{num_gts:>6} {name:>6} {time_ms:>10.1f} '
+                  f'{peak_mem:>20.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import copy
+import time
+
+import torch
+from mmcv import Config, DictAction
+from mmcv.parallel import MMDataParallel
+from mmcv.runner import load_checkpoint
+
+from mmdet.datasets import (build_dataloader, build_dataset,
+                            replace_ImageToTensor)
+from mmdet.models import build_detector
+from mmdet.utils import update_data_root
+from tools.test import truncate_dataset
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Accuracy/throughput of the test-time token masking of '
+        'the T2T heads (test_cfg.rcnn.token_keep_rate)')
+    parser.add_argument('config', help='test config file path')
+    parser.add_argument('checkpoint', help='checkpoint file')
+    parser.add_argument(
+        '--keep-rates',
+        nargs='+',
+        default=['1.0', '0.75', '0.5', '1.0,0.75,0.5'],
+        help='keep rates to compare, either one rate for all stages or '
+        'comma separated rates per stage')
+    parser.add_argument(
+        '--max-samples',
+        type=int,
+        default=None,
+        help='only evaluate the first N images of the test set')
+    parser.add_argument(
+        '--metric', default='bbox', help='evaluation metric of the dataset')
+    parser.add_argument(
+        '--cfg-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the used config, the key-value pair '
+        'in xxx=yyy format will be merged into config file.')
+    return parser.parse_args()
+
+
+def run_setting(cfg, checkpoint, dataset, data_loader, keep_rate):
+    cfg = copy.deepcopy(cfg)
+    cfg.model.test_cfg.rcnn.token_keep_rate = keep_rate
+    model = build_detector(cfg.model)
+    load_checkpoint(model, checkpoint, map_location='cpu')
+    model = MMDataParallel(model.cuda(), device_ids=[0])
+    model.eval()
+
+    # skip the first images, they are slow
+    num_warmup = 5
+    pure_inf_time = 0
+    results = []
+    for i, data in enumerate(data_loader):
+        torch.cuda.synchronize()
+        start_time = time.perf_counter()
+        with torch.no_grad():
+            result = model(return_loss=False, rescale=True, **data)
+        torch.cuda.synchronize()
+        if i >= num_warmup:
+            pure_inf_time += time.perf_counter() - start_time
+        results.extend(result)
+    num_timed = max(len(results) - num_warmup, 1)
+    metrics = dataset.evaluate(results, metric=cfg.metric)
+    return num_timed / max(pure_inf_time, 1e-6), metrics
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    update_data_root(cfg)
+    if args.cfg_options is not None:
+        cfg.merge_from_dict(args.cfg_options)
+    cfg.model.pretrained = None
+    cfg.model.train_cfg = None
+    cfg.metric = args.metric
+    cfg.data.test.test_mode = True
+    cfg.data.test.pipeline = replace_ImageToTensor(cfg.data.test.pipeline)
+
+    dataset = build_dataset(cfg.data.test)
+    if args.max_samples is not None:
+        truncate_dataset(dataset, args.max_samples)
+    data_loader = build_dataloader(
+        dataset,
+        samples_per_gpu=1,
+        workers_per_gpu=cfg.data.workers_per_gpu,
+        dist=False,
+        shuffle=False)
+
+    rows = []
+    for name in args.keep_rates:
+        keep_rate = [float(rate) for rate in name.split(',')]
+        if len(keep_rate) == 1:
+            keep_rate = keep_rate[0]
+        fps, metrics = run_setting(cfg, args.checkpoint, dataset,
+                                   data_loader, keep_rate)
+        rows.append((name, fps, metrics.get(f'{args.metric}_mAP', -1)))
+        print(f'keep_rate={name}: {fps:.2f} img / s, metrics: {metrics}')
+
+    print(f'\n{"keep rate":<20} {"img / s":>10} {"mAP":>8}')
+    for name, fps, mAP in rows:
+        print(f'{name:<20} {fps:>10.2f} {mAP:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from mmdet.models.roi_heads.evit.helpers import pair_token_idx
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the token pairing of Token_pair_block')
+    parser.add_argument(
+        '--num-rois',
+        type=int,
+        nargs='+',
+        default=[512, 3000, 6000],
+        help='number of RoIs in a batch')
+    parser.add_argument(
+        '--repeat-num', type=int, default=20, help='number of repeat times')
+    parser.add_argument(
+        '--device', default='cpu', help='device used for the benchmark')
+    return parser.parse_args()
+
+
+def loop_pair(token_compare, index):
+    """Host round trip + python loop used before ``pair_token_idx``."""
+    device = index.device
+    index = index.cpu().numpy()
+    token_compare = token_compare.cpu().numpy()
+    B, G = index.shape
+    idx = np.zeros([B, G], dtype=np.int64)
+    for b in range(B):
+        box_token_cnt = 0
+        cls_token_cnt = G - 1
+        for j in index[b]:
+            if token_compare[b, j]:
+                idx[b, box_token_cnt] = int(j)
+                box_token_cnt += 1
+            else:
+                idx[b, cls_token_cnt] = int(j)
+                cls_token_cnt -= 1
+    return torch.from_numpy(idx).to(device)
+
+
+def measure(func, token_compare, index, repeat_num):
+    func(token_compare, index)
+    if index.is_cuda:
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeat_num):
+        func(token_compare, index)
+    if index.is_cuda:
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeat_num * 1000
+
+
+def main():
+    args = parse_args()
+    print(f'{"num_rois":>10} {"loop (ms)":>12} {"tensor (ms)":>12}')
+    for num_rois in args.num_rois:
+        cls_attn = torch.rand(num_rois, 16, device=args.device)
+        box_attn = torch.rand(num_rois, 16, device=args.device)
+        _, index = torch.sort(cls_attn + box_attn, descending=True)
+        token_compare = torch.gt(box_attn, cls_attn)
+        loop_time = measure(loop_pair, token_compare, index, args.repeat_num)
+        tensor_time = measure(pair_token_idx, token_compare, index,
+                              args.repeat_num)
+        print(f'{num_rois:>10} {loop_time:>12.3f} {tensor_time:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()